@@ -0,0 +1,137 @@
+"""
+Traffic capture replay for the Evalon AI service.
+
+Streams recorded sessions (POST /api/admin/captures/<session_id>) through
+a fresh FaceTracker and BatchFrameProcessor per capture, using the
+recorded raw detections and classifier output. No image decoding and
+no model inference are involved, so this measures the tracking and
+batch-decision path at full speed, and checks that the current code
+reaches the same batch decisions as production did.
+
+Captures are memory-mapped and processed in chunks, so files with
+millions of frames do not need to fit in memory.
+
+- frames/s: replayed frames per second (tracker update + add_frame)
+- agreement: closed batches whose classification and confirmed state
+  match the recording (differences point at behaviour changes since
+  the capture was taken, or at a tuning change being evaluated)
+
+Usage:
+    python benchmarks/capture_replay.py captures/ [more.evcap ...] [--repeat 3] [--show-diffs 10]
+"""
+
+import argparse
+import glob
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import face_detection_service as fds  # noqa: E402
+
+CHUNK = 65536
+
+
+def capture_paths(args_paths):
+    paths = []
+    for path in args_paths:
+        if os.path.isdir(path):
+            paths.extend(sorted(glob.glob(os.path.join(path, '*.evcap'))))
+        else:
+            paths.append(path)
+    return paths
+
+
+def replay(records, show_diffs: int):
+    """Replay one capture; returns (frames, batches, agreeing batches, seconds)"""
+    tracker = fds.FaceTracker()
+    processor = fds.BatchFrameProcessor(False)
+    classes = fds.BEHAVIOR_CLASSES
+    batches = agree = 0
+    started = time.perf_counter()
+    for start in range(0, len(records), CHUNK):
+        chunk = records[start:start + CHUNK]
+        timestamps = chunk['timestamp'].tolist()
+        hashes = chunk['frame_hash'].tolist()
+        detections = chunk['detections'].tolist()
+        boxes = chunk['boxes'].tolist()
+        detection_confidences = chunk['detection_confidence'].tolist()
+        poses = chunk['pose']
+        probabilities = chunk['probabilities'].tolist()
+        class_ids = chunk['classification'].tolist()
+        confidences = chunk['classification_confidence'].tolist()
+        weights = chunk['classification_weight'].tolist()
+        qualities = chunk['quality'].tolist()
+        flags = chunk['flags'].tolist()
+        batch_classes = chunk['batch_classification'].tolist()
+        confirmed = chunk['confirmed_state'].tolist()
+
+        for i in range(len(chunk)):
+            if flags[i] & fds.CAPTURE_FLAG_RESET:
+                tracker.reset()
+                processor.reset()
+                continue
+            quality = fds.QUALITY_REASONS[qualities[i] - 1] if qualities[i] else None
+            if quality:
+                face_count, face_confidences, gaze_away = 0, [], False
+            else:
+                n = detections[i]
+                active_faces, face_count, face_confidences = tracker.update(
+                    [tuple(box) for box in boxes[i][:n]], detection_confidences[i][:n], poses[i, :n])
+                gaze_away = active_faces[0].is_gaze_away() if active_faces else False
+            class_id = class_ids[i]
+            result = processor.add_frame(fds.FrameSample(
+                timestamps[i], face_count, face_confidences,
+                classes[class_id] if class_id >= 0 else None, confidences[i],
+                dict(zip(classes, probabilities[i])) if class_id >= 0 else {},
+                bool(flags[i] & fds.CAPTURE_FLAG_PHONE), format(hashes[i], '016x'), gaze_away, quality,
+                weights[i]))
+
+            if result is None:
+                continue
+            batches += 1
+            recorded = flags[i] & fds.CAPTURE_FLAG_BATCH_CLOSED
+            state = processor.confirmed_state
+            if recorded and batch_classes[i] == fds.BEHAVIOR_CLASS_IDS[result.dominant_classification] \
+                    and confirmed[i] == fds.BEHAVIOR_CLASS_IDS[state]:
+                agree += 1
+            elif show_diffs > 0:
+                show_diffs -= 1
+                was = (f"{classes[batch_classes[i]]}/{classes[confirmed[i]]}" if recorded
+                       else 'batch still open')
+                print(f"    record {start + i}: replay {result.dominant_classification}/{state}, recorded {was}")
+    return len(records), batches, agree, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('paths', nargs='+', help='Capture files (.evcap) or directories of them')
+    parser.add_argument('--repeat', type=int, default=1, help='Replay each capture this many times')
+    parser.add_argument('--show-diffs', type=int, default=5, help='Disagreeing batches to print per capture')
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+    fds.DEBUG_BATCH_PROCESSING = False
+
+    paths = capture_paths(args.paths)
+    if not paths:
+        sys.exit('No capture files found')
+    print(f"{'capture':<48}{'frames':>10}{'recorded':>10}{'batches':>9}{'agree':>8}{'frames/s':>11}")
+    total_frames = total_seconds = 0.0
+    for path in paths:
+        header, records, index = fds.load_capture(path)
+        if header['lazy_classification']:
+            print(f"{os.path.basename(path)}: captured with lazy classification (no per-frame CNN output), "
+                  f"classes are replayed as unclassified")
+        for _ in range(args.repeat):
+            frames, batches, agree, seconds = replay(records, args.show_diffs)
+            total_frames += frames
+            total_seconds += seconds
+            print(f"{os.path.basename(path)[:47]:<48}{frames:>10}{len(index):>10}{batches:>9}"
+                  f"{agree / batches if batches else 1.0:>8.1%}{frames / max(seconds, 1e-9):>11.0f}")
+    if len(paths) > 1 or args.repeat > 1:
+        print(f"{'total':<48}{int(total_frames):>10}{'':>27}{total_frames / max(total_seconds, 1e-9):>11.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+Classical-ML ensemble benchmark for the Evalon AI service.
+
+Measures the EnsembleEngine design choices:
+- Scoring cost per frame when rows are scored one at a time vs coalesced
+  into one predict_proba call per model (as the scoring thread does)
+- KNN query time with a KD-tree index vs brute-force search, as the
+  stored training set grows
+- Model load time: plain joblib load vs memory-mapped (mmap_mode='c')
+
+Usage:
+    python benchmarks/ensemble_benchmark.py [--samples 20000] [--rows 1,16,64,256]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import face_detection_service as fds  # noqa: E402
+
+
+def best_of(fn, repeat: int = 5) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--samples', type=int, default=20000, help='Training samples (KNN index size)')
+    parser.add_argument('--rows', default='1,16,64,256', help='Rows per scoring call')
+    args = parser.parse_args()
+    if not fds.SKLEARN_AVAILABLE:
+        sys.exit('scikit-learn is not installed')
+
+    X, y = fds.EnsembleEngine.synthetic_dataset(args.samples)
+    queries, _ = fds.EnsembleEngine.synthetic_dataset(max(int(r) for r in args.rows.split(',')), seed=1)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = fds.EnsembleEngine(path=os.path.join(tmp, 'ensemble.joblib'))
+        started = time.perf_counter()
+        engine.save(engine.fit(X, y))
+        print(f"Fitted on {len(y)} samples in {time.perf_counter() - started:.1f}s "
+              f"({os.path.getsize(engine.path) / 1024:.0f} KiB on disk)")
+
+        load_full = best_of(lambda: fds.joblib.load(engine.path))
+        load_mmap = best_of(lambda: fds.joblib.load(engine.path, mmap_mode='c'))
+        print(f"Load: full {load_full * 1000:.1f} ms, memory-mapped {load_mmap * 1000:.1f} ms")
+        engine.load()
+
+        print()
+        print(f"{'rows':>6}{'per-row ms/frame':>20}{'batched ms/frame':>20}{'speedup':>10}")
+        for rows in [int(r) for r in args.rows.split(',')]:
+            batch = queries[:rows]
+            per_row = best_of(lambda: [engine.predict_matrix(batch[i:i + 1]) for i in range(rows)], repeat=3)
+            batched = best_of(lambda: engine.predict_matrix(batch))
+            print(f"{rows:>6}{per_row / rows * 1000:>20.3f}{batched / rows * 1000:>20.3f}{per_row / batched:>9.1f}x")
+
+    print()
+    print(f"{'index size':>12}{'kd_tree ms':>12}{'brute ms':>12}   (KNN query of {len(queries)} rows)")
+    scaler = fds.StandardScaler().fit(X)
+    scaled_queries = scaler.transform(queries)
+    for size in sorted({1000, 5000, args.samples}):
+        scaled = scaler.transform(X[:size])
+        timings = []
+        for algorithm in ('kd_tree', 'brute'):
+            knn = fds.KNeighborsClassifier(n_neighbors=5, weights='distance', algorithm=algorithm).fit(scaled, y[:size])
+            timings.append(best_of(lambda: knn.predict_proba(scaled_queries)))
+        print(f"{size:>12}{timings[0] * 1000:>12.2f}{timings[1] * 1000:>12.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""
+Haar ROI-search benchmark for the Evalon AI service.
+
+Runs the Haar cascade fallback detector over a clip twice, once with
+full-frame scans only (baseline) and once with ROI-restricted search
+(RoiSearchState). Reports:
+- Per-frame detection time (mean / p95)
+- Multi-face recall: of the frames where the baseline's tracked face count
+  is >= 2, the fraction where the ROI mode also reports >= 2
+- Face-count agreement with the baseline over all frames
+
+Usage:
+    python benchmarks/haar_roi_benchmark.py --video webcam_recording.mp4
+    python benchmarks/haar_roi_benchmark.py --image face.jpg [--frames 300]
+      (builds a jittering clip from one still, with a second face pasted in
+       for the middle third of the clip)
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import face_detection_service as fds  # noqa: E402
+
+
+def clip_from_video(path: str, limit: int):
+    capture = cv2.VideoCapture(path)
+    frames = []
+    while len(frames) < limit:
+        ok, frame = capture.read()
+        if not ok:
+            break
+        frames.append(frame)
+    capture.release()
+    return frames
+
+
+def clip_from_image(path: str, count: int):
+    """Jittering webcam-like clip; a shrunken second copy appears in the middle third"""
+    still = cv2.imread(path)
+    h, w = still.shape[:2]
+    canvas_w = w * 2
+    frames = []
+    for i in range(count):
+        dx = int(6 * np.sin(i / 5.0))
+        dy = int(4 * np.cos(i / 7.0))
+        frame = np.full((h, canvas_w, 3), 90, np.uint8)
+        m = np.float32([[1, 0, w // 2 + dx], [0, 1, dy]])
+        cv2.warpAffine(still, m, (canvas_w, h), frame, borderMode=cv2.BORDER_TRANSPARENT)
+        if count // 3 <= i < 2 * count // 3:
+            small = cv2.resize(still, (w // 2, h // 2))
+            frame[h // 4:h // 4 + h // 2, canvas_w - w // 2:] = small
+        frames.append(frame)
+    return frames
+
+
+def run(frames, use_roi: bool):
+    detector = fds.FaceDetector()
+    if detector.detection_method != 'haar':
+        # Force the Haar path even where MediaPipe is installed
+        cascade_path = cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
+        detector.face_cascade = cv2.CascadeClassifier(cascade_path)
+        detector.detection_method = 'haar'
+    tracker = fds.FaceTracker()
+    roi_state = fds.RoiSearchState() if use_roi else None
+
+    times = []
+    counts = []
+    for frame in frames:
+        started = time.perf_counter()
+        boxes, confidences = detector.detect_faces_raw(frame, roi_state)
+        times.append(time.perf_counter() - started)
+        _, face_count, _ = tracker.update(boxes, confidences)
+        if roi_state is not None:
+            roi_state.hints = tracker.track_boxes()
+        counts.append(face_count)
+    return np.array(times), np.array(counts), roi_state
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--video')
+    source.add_argument('--image')
+    parser.add_argument('--frames', type=int, default=300)
+    args = parser.parse_args()
+
+    fds.HAAR_ROI_ENABLED = True
+    frames = clip_from_video(args.video, args.frames) if args.video else clip_from_image(args.image, args.frames)
+    if not frames:
+        sys.exit('No frames read')
+
+    base_times, base_counts, _ = run(frames, use_roi=False)
+    roi_times, roi_counts, roi_state = run(frames, use_roi=True)
+
+    multi = base_counts >= 2
+    recall = float(np.mean(roi_counts[multi] >= 2)) if multi.any() else float('nan')
+    agreement = float(np.mean(base_counts == roi_counts))
+
+    h, w = frames[0].shape[:2]
+    print(f"Frames: {len(frames)} ({w}x{h}), full-scan interval {fds.HAAR_FULL_SCAN_INTERVAL}")
+    print(f"{'mode':<10}{'mean ms':>10}{'p95 ms':>10}{'multi-face frames':>20}")
+    for name, times, counts in [('full', base_times, base_counts), ('roi', roi_times, roi_counts)]:
+        print(f"{name:<10}{times.mean() * 1000:>10.2f}{np.percentile(times, 95) * 1000:>10.2f}{int((counts >= 2).sum()):>20}")
+    print(f"Speedup: {base_times.mean() / roi_times.mean():.2f}x "
+          f"(ROI scans {roi_state.roi_scans}, full scans {roi_state.full_scans})")
+    print(f"Multi-face recall vs baseline: {recall:.1%} over {int(multi.sum())} frames")
+    print(f"Face-count agreement: {agreement:.1%}")
+
+
+if __name__ == '__main__':
+    main()
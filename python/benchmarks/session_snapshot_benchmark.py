@@ -0,0 +1,90 @@
+"""
+Session snapshot benchmark for the Evalon AI service.
+
+Populates a SessionManager with N mid-exam sessions (inertia, credibility,
+tracks with pose and center history) and measures the SessionSnapshotter:
+- Full snapshot (every session dirty) and incremental snapshot (a fraction
+  of sessions changed), reported per 1,000 sessions
+- Journal size per session
+- Restore time (journal read + CRC check + index) and the one-off
+  hydration cost paid by each session on its first request after restart
+
+Usage:
+    python benchmarks/session_snapshot_benchmark.py [--sessions 1000,5000,20000] [--dirty 0.1]
+"""
+
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import face_detection_service as fds  # noqa: E402
+
+
+def populate(manager, count: int, tracks: int, rng):
+    for i in range(count):
+        session = manager.get_session(f'exam-{i}')
+        session['frame_count'] = int(rng.integers(100, 5000))
+        session['last_face_count'] = 1
+        processor = session['batch_processor']
+        processor.confirmed_state = fds.BEHAVIOR_CLASSES[i % 3]
+        processor.pending_state = fds.BEHAVIOR_CLASSES[(i + 1) % 3]
+        processor.consecutive_state_batches = 1
+        processor.credibility_score = float(rng.uniform(50, 100))
+        processor.batch_count = session['frame_count'] // 25
+        boxes = [(int(x), 40, 120, 140) for x in rng.integers(0, 400, size=tracks)]
+        poses = rng.uniform(-20, 20, size=(tracks, 2))
+        for _ in range(fds.TRACK_CENTER_HISTORY_SIZE):
+            session['face_tracker'].update(boxes, [0.9] * tracks, poses)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sessions', default='1000,5000,20000', help='Session counts to test')
+    parser.add_argument('--tracks', type=int, default=2, help='Face tracks per session')
+    parser.add_argument('--dirty', type=float, default=0.1, help='Fraction of sessions changed between snapshots')
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+    rng = np.random.default_rng(0)
+
+    print(f"{'sessions':>9}{'full ms/1k':>12}{'incr ms/1k':>12}{'bytes/sess':>12}"
+          f"{'restore ms':>12}{'hydrate us/sess':>17}")
+    for count in [int(c) for c in args.sessions.split(',')]:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'sessions.bin')
+            manager = fds.SessionManager()
+            populate(manager, count, args.tracks, rng)
+            snapshotter = fds.SessionSnapshotter(manager, path)
+
+            started = time.perf_counter()
+            snapshotter.snapshot()
+            full = time.perf_counter() - started
+
+            changed = rng.choice(count, size=max(1, int(count * args.dirty)), replace=False)
+            for i in changed:
+                manager.get_session(f'exam-{i}')['frame_count'] += 1
+            started = time.perf_counter()
+            snapshotter.snapshot()
+            incremental = time.perf_counter() - started
+
+            restored_manager = fds.SessionManager()
+            started = time.perf_counter()
+            fds.SessionSnapshotter(restored_manager, path).restore()
+            restore = time.perf_counter() - started
+
+            started = time.perf_counter()
+            for i in range(count):
+                restored_manager.get_session(f'exam-{i}')
+            hydrate = time.perf_counter() - started
+
+            print(f"{count:>9}{full / count * 1e6:>12.1f}{incremental / count * 1e6:>12.1f}"
+                  f"{os.path.getsize(path) / count:>12.0f}{restore * 1000:>12.1f}{hydrate / count * 1e6:>17.1f}")
+
+
+if __name__ == '__main__':
+    main()
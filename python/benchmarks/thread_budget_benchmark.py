@@ -0,0 +1,122 @@
+"""
+Thread-budget sweep benchmark for the Evalon AI service.
+
+Runs the proctoring pipeline (decode -> detect -> track -> classify -> batch)
+from N concurrent request threads under several ThreadBudget allocations and
+reports throughput and latency for each. Every allocation runs in a fresh
+subprocess, because library thread pools can only be sized before they
+initialize.
+
+Usage:
+    python benchmarks/thread_budget_benchmark.py [--cores 16] [--concurrency 4,8,16] [--seconds 10]
+    python benchmarks/thread_budget_benchmark.py --split "opencv=2,tf_intra=4,tf_inter=1,mediapipe=2"
+"""
+
+import argparse
+import base64
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def default_splits(cores: int):
+    """A small grid of allocations around the service default"""
+    quarter = max(1, cores // 4)
+    eighth = max(1, cores // 8)
+    return [
+        '',  # service default
+        f'opencv={cores},tf_intra={cores},tf_inter={cores},mediapipe=1,workers={cores}',  # library defaults
+        f'opencv=1,tf_intra=1,tf_inter=1,mediapipe={quarter}',  # many narrow workers
+        f'opencv={eighth},tf_intra={cores // 2 or 1},tf_inter=1,mediapipe={eighth}',  # CNN-heavy
+        f'opencv={quarter},tf_intra={quarter},tf_inter=1,mediapipe={quarter}',  # balanced
+    ]
+
+
+def run_worker(concurrency: int, seconds: float):
+    """Child process: load the service under the env budget and hammer it"""
+    import cv2
+    import numpy as np
+    sys.path.insert(0, os.path.join(HERE, '..'))
+    import face_detection_service as fds
+    fds.create_app()
+    fds.init_worker()
+
+    fds.DEBUG_BATCH_PROCESSING = False
+    rng = np.random.default_rng(0)
+    images = []
+    for _ in range(8):
+        frame = rng.integers(0, 255, size=(480, 640, 3), dtype=np.uint8)
+        cv2.ellipse(frame, (320, 240), (80, 100), 0, 0, 360, (150, 170, 200), -1)
+        images.append(base64.b64encode(cv2.imencode('.jpg', frame)[1]).decode())
+
+    latencies = []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def loop(worker_id: int):
+        i = 0
+        local = []
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            frame = fds.decode_base64_image(images[i % len(images)])
+            fds.process_comprehensive_proctoring(frame, 0, False, 0.0, f'bench-{worker_id}')
+            local.append(time.perf_counter() - started)
+            i += 1
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=loop, args=(w,)) for w in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    latencies.sort()
+    print(json.dumps({
+        'frames': len(latencies),
+        'fps': len(latencies) / seconds,
+        'p50_ms': 1000 * latencies[len(latencies) // 2] if latencies else 0,
+        'p95_ms': 1000 * latencies[int(len(latencies) * 0.95)] if latencies else 0,
+        'allocation': fds.thread_budget.allocation,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cores', type=int, default=os.cpu_count() or 4)
+    parser.add_argument('--concurrency', default='4,8,16')
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--split', action='append', help='Allocation to test (repeatable)')
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(int(args.concurrency), args.seconds)
+        return
+
+    splits = args.split or default_splits(args.cores)
+    print(f"{'allocation':<62}{'conc':>6}{'fps':>9}{'p50 ms':>9}{'p95 ms':>9}")
+    for split in splits:
+        for concurrency in [int(c) for c in args.concurrency.split(',')]:
+            env = dict(os.environ, CPU_CORE_BUDGET=str(args.cores), THREAD_BUDGET_SPLIT=split)
+            env.pop('OMP_NUM_THREADS', None)
+            out = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--worker',
+                 '--concurrency', str(concurrency), '--seconds', str(args.seconds)],
+                env=env, capture_output=True, text=True)
+            lines = [line for line in out.stdout.splitlines() if line.startswith('{')]
+            if not lines:
+                print(f"{split or 'default':<62}{concurrency:>6}   failed: {out.stderr.strip()[-200:]}")
+                continue
+            result = json.loads(lines[-1])
+            label = ','.join(f'{k}={v}' for k, v in result['allocation'].items())
+            print(f"{label:<62}{concurrency:>6}{result['fps']:>9.1f}{result['p50_ms']:>9.1f}{result['p95_ms']:>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
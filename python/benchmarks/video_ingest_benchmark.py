@@ -0,0 +1,129 @@
+"""
+Video-chunk ingest benchmark for the Evalon AI service.
+
+Compares, per batch of BATCH_MAX_FRAMES frames:
+- Bytes on the wire: per-frame base64 JPEG (quality 0.8, as sent by
+  aiProctoringService.captureFrame) vs one base64 video segment
+- Decode throughput of sample_video_segment for each container
+
+Usage:
+    python benchmarks/video_ingest_benchmark.py [--video path] [--width 640] [--height 480]
+"""
+
+import argparse
+import base64
+import os
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import face_detection_service as fds  # noqa: E402
+
+SOURCE_FPS = 30.0
+
+# Container -> (file suffix, fourcc) for cv2.VideoWriter
+WRITERS = {
+    'avi': ('.avi', 'MJPG'),
+    'webm': ('.webm', 'VP80'),
+    'mp4': ('.mp4', 'mp4v'),
+}
+
+
+def synthetic_frames(count: int, width: int, height: int):
+    """Webcam-like frames: static background, moving head-sized blob, sensor noise"""
+    rng = np.random.default_rng(0)
+    yy, xx = np.mgrid[0:height, 0:width]
+    background = ((xx * 255 // width) // 2 + 60).astype(np.uint8)
+    frames = []
+    for i in range(count):
+        frame = np.dstack([background, background, background]).copy()
+        cx = width // 2 + int(20 * np.sin(i / 8.0))
+        cy = height // 2 + int(10 * np.cos(i / 11.0))
+        cv2.ellipse(frame, (cx, cy), (width // 8, height // 5), 0, 0, 360, (150, 170, 200), -1)
+        noise = rng.integers(-6, 7, size=frame.shape, dtype=np.int16)
+        frames.append(np.clip(frame.astype(np.int16) + noise, 0, 255).astype(np.uint8))
+    return frames
+
+
+def load_frames(path: str, count: int):
+    capture = cv2.VideoCapture(path)
+    frames = []
+    while len(frames) < count and capture.grab():
+        ok, frame = capture.retrieve()
+        if ok:
+            frames.append(frame)
+    capture.release()
+    return frames
+
+
+def jpeg_base64_bytes(frames) -> int:
+    """Total request payload for the current per-frame base64 JPEG path"""
+    total = 0
+    for frame in frames:
+        ok, buf = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 80])
+        total += len('data:image/jpeg;base64,') + len(base64.b64encode(buf.tobytes()))
+    return total
+
+
+def encode_segment(frames, container: str):
+    """Encode frames as one segment; returns raw bytes or None if unsupported"""
+    if container == 'mjpeg':
+        return b''.join(cv2.imencode('.jpg', f, [cv2.IMWRITE_JPEG_QUALITY, 80])[1].tobytes() for f in frames)
+    suffix, fourcc = WRITERS[container]
+    h, w = frames[0].shape[:2]
+    with tempfile.NamedTemporaryFile(suffix=suffix) as tmp:
+        writer = cv2.VideoWriter(tmp.name, cv2.VideoWriter_fourcc(*fourcc), SOURCE_FPS, (w, h))
+        if not writer.isOpened():
+            return None
+        for frame in frames:
+            writer.write(frame)
+        writer.release()
+        with open(tmp.name, 'rb') as f:
+            data = f.read()
+    return data or None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--video', help='Real webcam recording to use instead of synthetic frames')
+    parser.add_argument('--width', type=int, default=640)
+    parser.add_argument('--height', type=int, default=480)
+    parser.add_argument('--repeat', type=int, default=5, help='Decode iterations per container')
+    args = parser.parse_args()
+
+    # A batch window at the source rate; the server samples it down to VIDEO_SAMPLE_FPS
+    window = int(SOURCE_FPS * fds.BATCH_MAX_DURATION_SECONDS)
+    frames = load_frames(args.video, window) if args.video else synthetic_frames(window, args.width, args.height)
+    batch_frames = frames[::max(1, int(round(SOURCE_FPS / fds.VIDEO_SAMPLE_FPS)))][:fds.BATCH_MAX_FRAMES]
+
+    baseline = jpeg_base64_bytes(batch_frames)
+    print(f"Frames: {len(frames)} source @ {SOURCE_FPS:.0f} fps, {frames[0].shape[1]}x{frames[0].shape[0]}")
+    print(f"Baseline (per-frame base64 JPEG, {len(batch_frames)} requests): {baseline / 1024:.1f} KiB per batch")
+    print()
+    print(f"{'format':<8}{'KiB/batch':>12}{'vs JPEG':>10}{'sampled':>10}{'decode ms':>12}{'frames/s':>12}")
+
+    for container in ['mjpeg', 'avi', 'webm', 'mp4']:
+        data = encode_segment(frames, container)
+        if data is None:
+            print(f"{container:<8}{'(encoder unavailable)':>56}")
+            continue
+        wire = len(base64.b64encode(data))
+
+        elapsed = []
+        sampled = 0
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            out, _ = fds.sample_video_segment(data, container, fds.VIDEO_SAMPLE_FPS, SOURCE_FPS)
+            elapsed.append(time.perf_counter() - started)
+            sampled = len(out)
+        best = min(elapsed)
+        print(f"{container:<8}{wire / 1024:>12.1f}{wire / baseline:>9.0%}{sampled:>10}"
+              f"{best * 1000:>12.1f}{sampled / best if best > 0 else 0:>12.0f}")
+
+
+if __name__ == '__main__':
+    main()
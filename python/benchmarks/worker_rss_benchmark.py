@@ -0,0 +1,148 @@
+"""
+Per-worker memory benchmark for the Evalon AI service (Linux only).
+
+Forks 1..N worker processes the way gunicorn does and measures memory once
+every worker has initialized and processed a few frames, while all of
+them are alive:
+- preload: the master runs create_app() (init_shared) before forking, and
+  each worker runs init_worker() (gunicorn.conf.py, preload_app=True)
+- no-preload: each worker imports the service and runs both halves of the
+  initialization itself after the fork (plain `gunicorn module:app`)
+
+RSS counts shared pages in full for every process. PSS divides each shared
+page between the processes mapping it, and USS counts private pages only.
+Total PSS (master plus workers) is therefore the real footprint of the
+deployment.
+
+Usage:
+    python benchmarks/worker_rss_benchmark.py [--workers 1,2,4,8] [--frames 20]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def memory_kb(pid: int):
+    """(rss, pss, uss) in kB from /proc/<pid>/smaps_rollup"""
+    fields = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                fields[parts[0].rstrip(':')] = int(parts[1])
+    return fields['Rss'], fields['Pss'], fields['Private_Clean'] + fields['Private_Dirty']
+
+
+def worker_body(slot: int, frames: int):
+    """Child: initialize the worker half and push frames through the pipeline"""
+    import base64
+    import cv2
+    import numpy as np
+    import face_detection_service as fds
+
+    fds.create_app()
+    fds.init_worker(slot)
+    fds.DEBUG_BATCH_PROCESSING = False
+    rng = np.random.default_rng(slot)
+    for i in range(frames):
+        frame = rng.integers(0, 255, size=(480, 640, 3), dtype=np.uint8)
+        cv2.ellipse(frame, (320, 240), (80, 100), 0, 0, 360, (150, 170, 200), -1)
+        image = base64.b64encode(cv2.imencode('.jpg', frame)[1]).decode()
+        fds.process_comprehensive_proctoring(fds.decode_base64_image(image), 0, False, 0.0, f'bench-{slot}')
+
+
+def run_mode(preload: bool, workers: int, frames: int):
+    """One deployment: optional preload in this process, then fork workers"""
+    if preload:
+        sys.path.insert(0, os.path.join(HERE, '..'))
+        import face_detection_service as fds
+        fds.create_app()
+    else:
+        sys.path.insert(0, os.path.join(HERE, '..'))
+
+    ready_r, ready_w = os.pipe()
+    go_r, go_w = os.pipe()
+    pids = []
+    for slot in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            os.close(ready_r)
+            os.close(go_w)
+            try:
+                worker_body(slot, frames)
+                os.write(ready_w, b'1')
+            except Exception:
+                os.write(ready_w, b'0')
+            os.read(go_r, 1)  # Stay alive until the parent has measured everyone
+            os._exit(0)
+        pids.append(pid)
+    os.close(ready_w)
+    os.close(go_r)
+
+    ok = b''
+    while len(ok) < workers:
+        chunk = os.read(ready_r, workers)
+        if not chunk:
+            break
+        ok += chunk
+    samples = [memory_kb(pid) for pid in pids]
+    master = memory_kb(os.getpid())
+    os.close(go_w)
+    for pid in pids:
+        os.waitpid(pid, 0)
+
+    print(json.dumps({
+        'failed': ok.count(b'0') + workers - len(ok),
+        'master_rss_kb': master[0],
+        'master_pss_kb': master[1],
+        'workers': [{'rss_kb': rss, 'pss_kb': pss, 'uss_kb': uss} for rss, pss, uss in samples]
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', default='1,2,4,8')
+    parser.add_argument('--frames', type=int, default=20, help='Frames each worker processes before measuring')
+    parser.add_argument('--run', choices=['preload', 'no-preload'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        run_mode(args.run == 'preload', int(args.workers), args.frames)
+        return
+    if not os.path.exists('/proc/self/smaps_rollup'):
+        sys.exit('Needs Linux /proc/<pid>/smaps_rollup')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, SESSION_SNAPSHOT_ENABLED='false', MODEL_REGISTRY_DIR=os.path.join(tmp, 'registry'),
+                   ENSEMBLE_MODEL_PATH=os.path.join(tmp, 'ensemble.joblib'))
+        env.setdefault('ENABLE_ENSEMBLE_MODELS', 'true')
+        env.setdefault('ENSEMBLE_SYNTHETIC_BOOTSTRAP', 'true')
+
+        print(f"{'mode':<12}{'workers':>8}{'master MB':>11}{'RSS/worker':>12}{'PSS/worker':>12}"
+              f"{'USS/worker':>12}{'total PSS MB':>14}")
+        for mode in ('no-preload', 'preload'):
+            for workers in [int(w) for w in args.workers.split(',')]:
+                out = subprocess.run([sys.executable, os.path.abspath(__file__), '--run', mode,
+                                      '--workers', str(workers), '--frames', str(args.frames)],
+                                     env=env, capture_output=True, text=True)
+                lines = [line for line in out.stdout.splitlines() if line.startswith('{')]
+                if not lines:
+                    print(f"{mode:<12}{workers:>8}   failed: {out.stderr.strip()[-200:]}")
+                    continue
+                result = json.loads(lines[-1])
+                per_worker = result['workers']
+                mean = {k: sum(w[k] for w in per_worker) / len(per_worker) / 1024 for k in per_worker[0]}
+                total_pss = (result['master_pss_kb'] + sum(w['pss_kb'] for w in per_worker)) / 1024
+                failed = f"  ({result['failed']} workers failed)" if result['failed'] else ''
+                print(f"{mode:<12}{workers:>8}{result['master_rss_kb'] / 1024:>11.0f}{mean['rss_kb']:>12.0f}"
+                      f"{mean['pss_kb']:>12.0f}{mean['uss_kb']:>12.0f}{total_pss:>14.0f}{failed}")
+
+
+if __name__ == '__main__':
+    main()
@@ -23,15 +23,34 @@ import base64
 import os
 import time
 import hashlib
+import json
+import re
+import sys
+import shutil
+import gc
 from typing import Dict, List, Tuple, Optional
-from collections import deque
+from collections import deque, OrderedDict
 from dataclasses import dataclass, field
-from flask import Flask, request, jsonify
+from flask import Flask, Blueprint, request, jsonify, make_response
 from flask_cors import CORS
 from functools import wraps
+from contextlib import contextmanager
 import logging
 import jwt
 import threading
+import tempfile
+import queue
+import struct
+import zlib
+import atexit
+import contextvars
+import random
+import urllib.error
+import urllib.parse
+import urllib.request
+import asyncio
+import socket
+from concurrent.futures import Future, ThreadPoolExecutor
 
 # Configure logging
 logging.basicConfig(
@@ -57,16 +76,24 @@ except ImportError:
     MEDIAPIPE_AVAILABLE = False
     logger.warning("MediaPipe not available - will use Haar Cascade (less accurate)")
 
-# Initialize Flask app
-app = Flask(__name__)
+# Try to import scikit-learn for the classical-ML ensemble
+try:
+    import joblib
+    from sklearn.naive_bayes import GaussianNB
+    from sklearn.neighbors import KNeighborsClassifier
+    from sklearn.preprocessing import StandardScaler
+    from sklearn.svm import SVC
+    from sklearn.tree import DecisionTreeClassifier
+    SKLEARN_AVAILABLE = True
+except ImportError:
+    SKLEARN_AVAILABLE = False
+    logger.warning("scikit-learn not available - ensemble models will be disabled")
 
-# SECURITY: Configure CORS with explicit origins from environment
+# HTTP routes (registered on the app built by create_app)
+api = Blueprint('api', __name__)
+
+# SECURITY: CORS origins from environment (applied in create_app)
 allowed_origins = os.environ.get('ALLOWED_ORIGINS', 'http://localhost:3000,http://localhost:3001').split(',')
-CORS(app, 
-     origins=allowed_origins, 
-     supports_credentials=True,
-     methods=['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS'],
-     allow_headers=['Content-Type', 'Authorization'])
 
 
 # =============================================================================
@@ -105,6 +132,13 @@ NO_FACE_BATCH_THRESHOLD = 0.60  # No-face confirmed if >= 60% of batch
 # =============================================================================
 CLASSIFICATION_DOMINANCE_THRESHOLD = 0.65  # Classification must dominate >= 65% to escalate
 
+# Lazy mode: frames are stored as compact tensors and only a stratified sample
+# of K frames is classified (one batched CNN pass) when the batch closes
+LAZY_CLASSIFICATION_ENABLED = os.environ.get('LAZY_CLASSIFICATION_ENABLED', 'false').lower() == 'true'
+LAZY_CLASSIFICATION_SAMPLE_SIZE = int(os.environ.get('LAZY_CLASSIFICATION_SAMPLE_SIZE', 8))  # K per batch
+LAZY_CLASSIFICATION_INPUT_SIZE = 112  # Stored uint8 RGB side (resized to the CNN's 224 at batch close)
+LAZY_CLASSIFICATION_Z = 1.96  # Confidence bounds on sampled class shares (95%)
+
 # =============================================================================
 # TASK 4: BATCH-DRIVEN CREDIBILITY SCORING
 # =============================================================================
@@ -116,11 +150,240 @@ CREDIBILITY_SUSPICIOUS_BATCH_DECREMENT = 1.0  # -1.0 per suspicious batch
 CREDIBILITY_VERY_SUSPICIOUS_BATCH_DECREMENT = 2.0  # -2.0 per very suspicious batch
 CREDIBILITY_MAX_DELTA_PER_BATCH = 3.0  # Cap change per batch
 
+# Per-batch credibility timeline (whole exam) and its downsampled query
+CREDIBILITY_TIMELINE_FIRST_CHUNK = 64  # Rows in a session's first chunk (~2.5 min of batches)
+CREDIBILITY_TIMELINE_CHUNK = 1024  # Rows per further chunk (~45 min of batches)
+CREDIBILITY_TIMELINE_DEFAULT_POINTS = 500
+CREDIBILITY_TIMELINE_MAX_POINTS = 5000
+
 # =============================================================================
 # TASK 5: STATE INERTIA
 # =============================================================================
 STATE_CHANGE_REQUIRED_BATCHES = 2  # Require 2 consecutive batches to change state
 
+# =============================================================================
+# CAPTURE-RATE GOVERNOR (server-recommended frame interval)
+# =============================================================================
+CAPTURE_INTERVAL_BASE_MS = 100  # Default cadence (fills a 25-frame batch in 2.5s)
+CAPTURE_INTERVAL_MIN_MS = 100  # Never ask for frames faster than this
+CAPTURE_INTERVAL_MAX_MS = 1000  # Never ask for frames slower than this
+CAPTURE_CALM_SLOWDOWN = 4.0  # Interval multiplier for a fully stable session
+CAPTURE_STABLE_FACE_FRAMES = 10  # Frames with a steady face before it counts as stable
+CAPTURE_STABLE_MOVEMENT_PX = 8.0  # Max track movement for a "steady" face
+CAPTURE_DUPLICATE_EWMA_ALPHA = 0.1  # Smoothing for the duplicate-frame ratio
+CAPTURE_WORKER_CAPACITY = os.cpu_count() or 4  # Concurrent frames before the node counts as loaded
+
+# =============================================================================
+# HEAD POSE / GAZE (from MediaPipe detection keypoints)
+# =============================================================================
+HEAD_POSE_KEYPOINTS = 6  # right eye, left eye, nose tip, mouth, right ear, left ear
+HEAD_YAW_AWAY_DEGREES = 30.0  # |yaw| above this counts as looking away
+HEAD_PITCH_AWAY_DEGREES = 20.0  # |pitch| above this counts as looking away
+HEAD_PITCH_NEUTRAL_RATIO = 0.45  # Nose position between eye line and mouth when level
+HEAD_POSE_SMOOTHING = 0.4  # EMA weight of the newest pose per track
+GAZE_AWAY_BATCH_THRESHOLD = 0.60  # Gaze-away event if >= 60% of batch (informational)
+
+# =============================================================================
+# HAAR ROI SEARCH (fallback detector on hosts without MediaPipe)
+# =============================================================================
+HAAR_ROI_ENABLED = os.environ.get('HAAR_ROI_ENABLED', 'true').lower() == 'true'
+HAAR_FULL_SCAN_INTERVAL = 10  # Full-frame rescan every N frames (finds new faces)
+HAAR_ROI_PADDING = 0.5  # ROI padding around a track bbox, as a fraction of its size
+HAAR_ROI_SCALE_RANGE = (0.75, 1.33)  # Face size search range relative to the track bbox
+
+# =============================================================================
+# ADMISSION CONTROL (overload protection)
+# =============================================================================
+ADMISSION_MAX_IN_FLIGHT = int(os.environ.get('ADMISSION_MAX_IN_FLIGHT', 0))  # 0 = 2 x request workers
+ADMISSION_HARD_LIMIT_FACTOR = 2.0  # Above budget * factor, only batch-closing frames are admitted
+ADMISSION_RETRY_AFTER_MS = 500  # Minimum back-off returned to shed clients
+
+# =============================================================================
+# REQUEST DEADLINES (latency budget per request, graceful degradation)
+# =============================================================================
+DEADLINE_HEADER = 'X-Request-Deadline-Ms'  # Client's remaining budget for this request, in ms
+DEADLINE_DEFAULT_MS = {  # Budget when the header is absent, per endpoint
+    'comprehensive-proctoring': 250,
+    'comprehensive-proctoring-frames': 2000,
+    'comprehensive-proctoring-video': 4000
+}
+DEADLINE_MIN_MS = 20  # Header values are clamped to [min, max]
+DEADLINE_MAX_MS = 30000
+DEADLINE_RESERVE_MS = 15  # Kept back for batch close and response building
+DEADLINE_STAGE_EWMA_ALPHA = 0.1  # Smoothing for per-stage cost estimates
+DEGRADED_SAMPLE_WEIGHT = 0.5  # Classification vote of a frame that reused an earlier CNN result
+
+# =============================================================================
+# MULTI-FRAME UPLOAD (one request per buffered batch window)
+# =============================================================================
+MULTI_FRAME_MAX_FRAMES = 2 * BATCH_MAX_FRAMES  # Max frames accepted per request
+MULTI_FRAME_DECODE_WORKERS = 4  # Max threads used to decode a request's frames
+
+# =============================================================================
+# BULK SESSION STATE (dashboard polling)
+# =============================================================================
+SESSION_STATE_MAX_SESSIONS = 1000  # Session ids per bulk state request
+SESSION_STATE_PATH = '/api/sessions/state'  # Also served by the hub listener (POST, forwarded by workers)
+SESSION_STATE_HUB_MAX_BODY = 1 << 20  # Largest forwarded request body the hub reads
+
+# =============================================================================
+# EXAM AGGREGATES (per-exam counters kept by the event hub, fed at batch close)
+# =============================================================================
+EXAM_CREDIBILITY_BIN_WIDTH = 1.0  # Credibility histogram bucket width (points)
+EXAM_CREDIBILITY_QUANTILES = (0.1, 0.25, 0.5, 0.75, 0.9)
+EXAM_SUMMARY_PATH = re.compile(r'/api/exams/([^/]+)/summary')  # Also served by the hub listener
+EXAM_SUMMARY_HUB_TIMEOUT_SECONDS = 2.0
+
+# =============================================================================
+# EVENT STREAM (server-sent events of batch decisions, per exam or session)
+# =============================================================================
+EVENT_STREAM_ENABLED = os.environ.get('EVENT_STREAM_ENABLED', 'true').lower() == 'true'
+EVENT_STREAM_HOST = os.environ.get('EVENT_STREAM_HOST', '0.0.0.0')
+EVENT_STREAM_PORT = int(os.environ.get('EVENT_STREAM_PORT', 5102))  # Served by the hub worker only
+EVENT_STREAM_PATH = '/api/events'
+EVENT_STREAM_TYPES = ('batch', 'state_change', 'multi_face_confirmed', 'no_face_confirmed')
+EVENT_STREAM_BUFFER = 256  # Queued events per subscriber before coalescing
+EVENT_STREAM_HISTORY = 4096  # Recent events kept by the hub for Last-Event-ID resume
+EVENT_STREAM_MAX_SUBSCRIBERS = int(os.environ.get('EVENT_STREAM_MAX_SUBSCRIBERS', 10000))
+EVENT_STREAM_HEARTBEAT_SECONDS = 15.0  # Comment line on idle streams (keeps proxies from timing out)
+EVENT_STREAM_HEADER_TIMEOUT_SECONDS = 10.0
+EVENT_STREAM_RETRY_MS = 3000  # Client reconnect delay advertised to EventSource
+EVENT_STREAM_BACKLOG = 1024
+# All workers publish to one hub (the worker in slot EVENT_HUB_SLOT) over a
+# Unix datagram socket; gunicorn respawns a dead hub under the same slot
+EVENT_HUB_SLOT = 0
+EVENT_HUB_SOCKET = os.environ.get('EVENT_HUB_SOCKET',
+                                  os.path.join(tempfile.gettempdir(), f'evalon-event-hub-{EVENT_STREAM_PORT}.sock'))
+EVENT_HUB_SEND_TIMEOUT_SECONDS = 0.05  # Longest a request thread waits for room in the hub's queue
+EVENT_HUB_MAX_MESSAGE = 65536
+# Sessions with no report for this long leave the hub (owner, exam contribution)
+EVENT_HUB_MEMBER_TTL_SECONDS = float(os.environ.get('EVENT_HUB_MEMBER_TTL_SECONDS', 7200))
+EVENT_HUB_SWEEP_SECONDS = 60.0
+
+# =============================================================================
+# TRAFFIC CAPTURE (opt-in per-session recording for replay)
+# =============================================================================
+CAPTURE_DIR = os.environ.get('CAPTURE_DIR', './captures')
+CAPTURE_MAX_FRAMES = int(os.environ.get('CAPTURE_MAX_FRAMES', 200000))  # Per capture (~190 MB at 32x24)
+CAPTURE_THUMBNAIL_WIDTH = int(os.environ.get('CAPTURE_THUMBNAIL_WIDTH', 32))
+CAPTURE_THUMBNAIL_HEIGHT = int(os.environ.get('CAPTURE_THUMBNAIL_HEIGHT', 24))
+CAPTURE_MAX_FACES = 4  # Raw detections kept per frame
+CAPTURE_MAGIC = b'EVCAP\x01\x00\x00'
+CAPTURE_HEADER_BYTES = 4096  # Magic, JSON header length, JSON header; records start here
+CAPTURE_POLL_SECONDS = 2  # How often each worker applies capture starts/stops made elsewhere
+
+# =============================================================================
+# THREAD BUDGET (CPU cores split between native libraries and request workers)
+# =============================================================================
+THREAD_BUDGET_CORES = int(os.environ.get('CPU_CORE_BUDGET', 0)) or (os.cpu_count() or 4)
+THREAD_BUDGET_SPLIT = os.environ.get('THREAD_BUDGET_SPLIT', '')  # e.g. "opencv=2,tf_intra=4,tf_inter=1,mediapipe=2"
+THREAD_BUDGET_PIN_AFFINITY = os.environ.get('THREAD_BUDGET_PIN_AFFINITY', 'false').lower() == 'true'
+THREAD_BUDGET_CPUS = os.environ.get('THREAD_BUDGET_CPUS', '')  # e.g. "0-7" (default: first CPU_CORE_BUDGET cores)
+
+# =============================================================================
+# FRAME QUALITY GATE (thumbnail checks before detection/classification)
+# =============================================================================
+QUALITY_GATE_ENABLED = os.environ.get('QUALITY_GATE_ENABLED', 'true').lower() == 'true'
+QUALITY_THUMBNAIL_SIZE = (160, 120)  # Checks run on this downscaled copy
+QUALITY_MIN_BRIGHTNESS = 30.0  # Mean gray level below this is too dark
+QUALITY_MAX_BRIGHTNESS = 235.0  # Mean gray level above this is over-exposed
+QUALITY_MIN_CONTRAST = 10.0  # Gray std below this is a flat image
+QUALITY_MIN_SHARPNESS = 25.0  # Laplacian variance (on the thumbnail) below this is blurred
+QUALITY_OCCLUSION_TOLERANCE = 20  # Max per-channel distance from the median colour
+QUALITY_OCCLUSION_COVERAGE = 0.85  # Covered camera if >= 85% of pixels are near one colour
+QUALITY_REASONS = ('dark', 'overexposed', 'occluded', 'low_contrast', 'blurred')
+UNUSABLE_BATCH_THRESHOLD = 0.60  # Camera-unusable confirmed if >= 60% of batch
+QUALITY_INFERENCE_EWMA_ALPHA = 0.05  # Smoothing for the per-frame inference cost estimate
+
+# =============================================================================
+# VIDEO-CHUNK INGEST (short encoded segments instead of stills)
+# =============================================================================
+VIDEO_SAMPLE_FPS = 10.0  # Default server-side sampling rate (matches base cadence)
+VIDEO_MJPEG_DEFAULT_FPS = 30.0  # Source rate assumed for raw MJPEG streams
+VIDEO_MAX_SEGMENT_BYTES = 8 * 1024 * 1024  # Reject larger segments
+VIDEO_CONTAINER_SUFFIXES = {'webm': '.webm', 'mp4': '.mp4', 'avi': '.avi', 'mkv': '.mkv'}
+
+# =============================================================================
+# RESULT CACHE (content-addressed, for /api/classify-behavior and /api/detect-faces)
+# =============================================================================
+RESULT_CACHE_MAX_ENTRIES = 4096
+RESULT_CACHE_MAX_BYTES = int(os.environ.get('RESULT_CACHE_MAX_MB', 32)) * 1024 * 1024
+
+# =============================================================================
+# CLASSICAL-ML ENSEMBLE (KNN / Naive Bayes / Decision Tree / SVM, soft voting)
+# =============================================================================
+ENABLE_ENSEMBLE_MODELS = os.environ.get('ENABLE_ENSEMBLE_MODELS', 'false').lower() == 'true'
+ENSEMBLE_MODEL_PATH = os.environ.get('ENSEMBLE_MODEL_PATH', os.path.join(
+    os.environ.get('MODEL_PATH', os.path.dirname(os.path.abspath(__file__))), 'ensemble_models.joblib'))
+ENSEMBLE_FEATURES = ('face_count', 'movement', 'phone_prob',
+                     'cnn_normal', 'cnn_suspicious', 'cnn_very_suspicious', 'gaze_away')
+ENSEMBLE_MAX_BATCH_ROWS = 256  # Rows per predict_proba call (preallocated feature matrix)
+ENSEMBLE_BATCH_WINDOW_MS = 3.0  # Max wait to coalesce rows from concurrent sessions
+ENSEMBLE_SYNTHETIC_SAMPLES = 600  # Bootstrap training set size (ENSEMBLE_SYNTHETIC_BOOTSTRAP only)
+# Dev/test only: fit on synthetic profiles when ENSEMBLE_MODEL_PATH is missing.
+# Otherwise a missing artifact leaves the ensemble disabled and the CNN decides.
+ENSEMBLE_SYNTHETIC_BOOTSTRAP = os.environ.get('ENSEMBLE_SYNTHETIC_BOOTSTRAP', 'false').lower() == 'true'
+
+# =============================================================================
+# MODEL REGISTRY (versioned behaviour-model artifacts, hot swap)
+# =============================================================================
+MODEL_REGISTRY_DIR = os.environ.get('MODEL_REGISTRY_DIR', os.path.join(
+    os.environ.get('MODEL_PATH', os.path.dirname(os.path.abspath(__file__))), 'model_registry'))
+BUILTIN_MODEL_ID = 'builtin'  # Registry entry for the bundled model file
+BUILTIN_MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'suspicious_activity_model.h5')
+MODEL_ARTIFACT_EXTENSIONS = ('.h5', '.keras')
+MODEL_WARMUP_BATCH = 2  # Frames in the warm-up forward pass before a swap
+# Every worker polls the shared `active` pointer and follows switches made by other workers
+MODEL_ACTIVE_POLL_SECONDS = float(os.environ.get('MODEL_ACTIVE_POLL_SECONDS', 2.0))
+
+# =============================================================================
+# SHADOW EVALUATION (candidate model scored off the request path)
+# =============================================================================
+SHADOW_SAMPLE_RATE = float(os.environ.get('SHADOW_SAMPLE_RATE', 0.1))  # Fraction of classified frames copied
+SHADOW_QUEUE_SIZE = 32  # Bounded backlog; frames are dropped when full
+SHADOW_BATCH_SIZE = 8  # Queued frames scored per candidate forward pass
+SHADOW_MAX_UTILIZATION = 0.75  # Skip sampling while the node is busier than this
+
+# =============================================================================
+# SESSION SNAPSHOTS (crash-safe journal of SessionManager state)
+# =============================================================================
+SESSION_SNAPSHOT_ENABLED = os.environ.get('SESSION_SNAPSHOT_ENABLED', 'true').lower() == 'true'
+SESSION_SNAPSHOT_PATH = os.environ.get('SESSION_SNAPSHOT_PATH', os.path.join(
+    os.environ.get('MODEL_PATH', os.path.dirname(os.path.abspath(__file__))), 'session_snapshots.bin'))
+SESSION_SNAPSHOT_INTERVAL_SECONDS = float(os.environ.get('SESSION_SNAPSHOT_INTERVAL_SECONDS', 5.0))
+SESSION_SNAPSHOT_MAX_AGE_SECONDS = 6 * 3600  # Older sessions are not restored (exam long over)
+SESSION_SNAPSHOT_COMPACT_RATIO = 2.0  # Rewrite the journal once it exceeds this x live record bytes
+
+# =============================================================================
+# REQUEST TRACING (W3C trace context in, OTLP/JSON spans out)
+# =============================================================================
+TRACE_EXPORTER = os.environ.get('TRACE_EXPORTER', 'none').lower()  # 'none', 'otlp' or 'file'
+TRACE_SAMPLE_RATE = float(os.environ.get('TRACE_SAMPLE_RATE', 0.01))  # Head sampling without an upstream decision
+TRACE_SLOW_THRESHOLD_MS = float(os.environ.get('TRACE_SLOW_THRESHOLD_MS', 500))  # Slower requests always kept (0: off)
+TRACE_OTLP_ENDPOINT = os.environ.get('OTEL_EXPORTER_OTLP_TRACES_ENDPOINT', 'http://localhost:4318/v1/traces')
+TRACE_FILE_PATH = os.environ.get('TRACE_FILE_PATH', os.path.join(
+    os.environ.get('MODEL_PATH', os.path.dirname(os.path.abspath(__file__))), 'traces.jsonl'))
+TRACE_FILE_MAX_BYTES = int(os.environ.get('TRACE_FILE_MAX_MB', 16)) * 1024 * 1024
+TRACE_FILE_BACKUPS = 3  # Rotated files kept (traces.jsonl.1 ... .3)
+TRACE_SERVICE_NAME = os.environ.get('OTEL_SERVICE_NAME', 'evalon-ai-service')
+TRACE_EXPORT_QUEUE_SIZE = 256  # Finished traces awaiting export; new ones are dropped when full
+TRACE_EXPORT_BATCH_SPANS = 512  # Max spans per OTLP request / file line
+TRACE_EXPORT_INTERVAL_SECONDS = 2.0  # Max delay before a partial batch is exported
+TRACE_EXPORT_TIMEOUT_SECONDS = 2.0
+TRACEPARENT_HEADER = 'traceparent'
+
+# =============================================================================
+# ON-DEMAND PROFILING (admin-triggered stack sampling)
+# =============================================================================
+PROFILE_DEFAULT_SECONDS = 10.0
+PROFILE_MAX_SECONDS = 120.0  # Hard limit per capture, also for request-count captures
+PROFILE_DEFAULT_INTERVAL_MS = 10.0  # 100 Hz
+PROFILE_MIN_INTERVAL_MS = 1.0
+PROFILE_MAX_OVERHEAD = float(os.environ.get('PROFILE_MAX_OVERHEAD_PCT', 2.0)) / 100  # Max share of wall time spent sampling
+PROFILE_MAX_STACK_DEPTH = 128
+PROFILE_TOP_FUNCTIONS = 25
+ADMIN_USER_TYPES = ('organization_admin',)
+
 # Legacy constants (still used by some classes)
 CLASSIFICATION_WINDOW_SIZE = 5
 NORMAL_TO_SUSPICIOUS_THRESHOLD = 4
@@ -132,15 +395,19 @@ CREDIBILITY_VERY_SUSPICIOUS_RATE = -1.2
 CREDIBILITY_TEMPORAL_GATE_SECONDS = 2.0
 CREDIBILITY_MAX_DELTA_PER_SECOND = 2.0
 
+# Face tracking history
+TRACK_CENTER_HISTORY_SIZE = 10  # Centers kept per track for movement analysis
+
 # Debug logging
 DEBUG_BATCH_PROCESSING = True  # Enable batch processing debug logs
+DEBUG_FACE_TRACKING = False  # Per-frame tracking/smoothing debug logs
+DEBUG_TIME_WINDOWS = False  # Per-update credibility debug logs
 
 
 # =============================================================================
 # DATA CLASSES
 # =============================================================================
 
-@dataclass
 class TrackedFace:
     """
     Represents a face being tracked across frames.
@@ -149,22 +416,58 @@ class TrackedFace:
     - age: number of frames this track has existed
     - last_seen_frame: frame number when last matched
     - A track is ACTIVE only if: age >= PERSISTENCE_FRAMES AND last_seen recently
+    
+    Slotted record: center history is a fixed-size NumPy ring instead of a
+    growing list, so a track's footprint does not depend on its lifetime.
     """
-    id: int
-    bbox: Tuple[int, int, int, int]  # (x, y, w, h)
-    confidence: float
-    first_seen_frame: int
-    last_seen_frame: int
-    seen_count: int = 1
-    center_history: List[Tuple[float, float]] = field(default_factory=list)
-    first_seen_time: float = field(default_factory=time.time)  # Timestamp when first seen
-    last_seen_time: float = field(default_factory=time.time)  # Timestamp when last seen
+    __slots__ = ('id', 'bbox', 'confidence', 'first_seen_frame', 'last_seen_frame',
+                 'seen_count', 'first_seen_time', 'last_seen_time',
+                 '_centers', '_center_pos', '_center_count', 'yaw', 'pitch')
+    
+    def __init__(self, id: int, bbox: Tuple[int, int, int, int], confidence: float,
+                 first_seen_frame: int, last_seen_frame: int, seen_count: int = 1,
+                 first_seen_time: Optional[float] = None,
+                 last_seen_time: Optional[float] = None):
+        now = time.time()
+        self.id = id
+        self.bbox = bbox  # (x, y, w, h)
+        self.confidence = confidence
+        self.first_seen_frame = first_seen_frame
+        self.last_seen_frame = last_seen_frame
+        self.seen_count = seen_count
+        self.first_seen_time = first_seen_time if first_seen_time is not None else now  # Timestamp when first seen
+        self.last_seen_time = last_seen_time if last_seen_time is not None else now  # Timestamp when last seen
+        self._centers = np.zeros((TRACK_CENTER_HISTORY_SIZE, 2), dtype=np.float32)
+        self._center_pos = 0  # Next write index
+        self._center_count = 0
+        self._push_center(bbox)
+        # Smoothed head pose in degrees (None until a keypoint pose is seen)
+        self.yaw: Optional[float] = None
+        self.pitch: Optional[float] = None
     
     @property
     def age(self) -> int:
         """Age of track in frames (how many frames since first seen)"""
         return self.last_seen_frame - self.first_seen_frame + 1
     
+    @property
+    def center_history(self) -> np.ndarray:
+        """Recent face centers, oldest first, as an (n, 2) array"""
+        return self.recent_centers(self._center_count)
+    
+    def _push_center(self, bbox: Tuple[int, int, int, int]):
+        self._centers[self._center_pos, 0] = bbox[0] + bbox[2] / 2
+        self._centers[self._center_pos, 1] = bbox[1] + bbox[3] / 2
+        self._center_pos = (self._center_pos + 1) % TRACK_CENTER_HISTORY_SIZE
+        if self._center_count < TRACK_CENTER_HISTORY_SIZE:
+            self._center_count += 1
+    
+    def recent_centers(self, n: int) -> np.ndarray:
+        """Last n centers in chronological order"""
+        n = min(n, self._center_count)
+        idx = (self._center_pos - n + np.arange(n)) % TRACK_CENTER_HISTORY_SIZE
+        return self._centers[idx]
+    
     def update(self, bbox: Tuple[int, int, int, int], confidence: float, frame_num: int):
         """Update face with new detection"""
         self.bbox = bbox
@@ -172,11 +475,36 @@ class TrackedFace:
         self.last_seen_frame = frame_num
         self.last_seen_time = time.time()
         self.seen_count += 1
-        center = (bbox[0] + bbox[2] / 2, bbox[1] + bbox[3] / 2)
-        self.center_history.append(center)
-        # Keep only last 10 centers for movement analysis
-        if len(self.center_history) > 10:
-            self.center_history.pop(0)
+        # Ring keeps only the last TRACK_CENTER_HISTORY_SIZE centers
+        self._push_center(bbox)
+    
+    def update_pose(self, yaw: float, pitch: float):
+        """EMA-smooth a new (yaw, pitch) estimate into the track (NaN = no estimate)"""
+        if np.isnan(yaw) or np.isnan(pitch):
+            return
+        if self.yaw is None:
+            self.yaw, self.pitch = float(yaw), float(pitch)
+        else:
+            self.yaw += HEAD_POSE_SMOOTHING * (float(yaw) - self.yaw)
+            self.pitch += HEAD_POSE_SMOOTHING * (float(pitch) - self.pitch)
+    
+    def is_gaze_away(self) -> bool:
+        """True if the smoothed pose is turned beyond the gaze-away thresholds"""
+        if self.yaw is None:
+            return False
+        return abs(self.yaw) > HEAD_YAW_AWAY_DEGREES or abs(self.pitch) > HEAD_PITCH_AWAY_DEGREES
+    
+    def head_direction(self) -> str:
+        """Dominant head direction in image space from the smoothed pose"""
+        if self.yaw is None:
+            return 'unknown'
+        yaw_ratio = abs(self.yaw) / HEAD_YAW_AWAY_DEGREES
+        pitch_ratio = abs(self.pitch) / HEAD_PITCH_AWAY_DEGREES
+        if max(yaw_ratio, pitch_ratio) < 0.5:
+            return 'center'
+        if yaw_ratio >= pitch_ratio:
+            return 'right' if self.yaw > 0 else 'left'
+        return 'down' if self.pitch > 0 else 'up'
     
     def is_active(self, current_frame: int) -> bool:
         """
@@ -193,17 +521,11 @@ class TrackedFace:
     
     def movement_magnitude(self) -> float:
         """Calculate recent movement magnitude (for jitter detection)"""
-        if len(self.center_history) < 2:
-            return 0.0
-        recent = self.center_history[-5:] if len(self.center_history) >= 5 else self.center_history
+        recent = self.recent_centers(5)
         if len(recent) < 2:
             return 0.0
-        total_movement = 0.0
-        for i in range(1, len(recent)):
-            dx = recent[i][0] - recent[i-1][0]
-            dy = recent[i][1] - recent[i-1][1]
-            total_movement += (dx*dx + dy*dy) ** 0.5
-        return total_movement / len(recent)
+        steps = np.diff(recent, axis=0)
+        return float(np.hypot(steps[:, 0], steps[:, 1]).sum()) / len(recent)
 
 
 # =============================================================================
@@ -213,14 +535,283 @@ class TrackedFace:
 @dataclass
 class FrameSample:
     """Single frame sample for batch collection"""
+    __slots__ = ('timestamp', 'face_count', 'face_confidences', 'classification',
+                 'classification_confidence', 'probabilities', 'phone_detected', 'frame_hash',
+                 'gaze_away', 'frame_quality', 'classification_weight')
+    
     timestamp: float
     face_count: int
     face_confidences: List[float]
-    classification: str
+    classification: Optional[str]  # None while deferred (lazy classification)
     classification_confidence: float
     probabilities: Dict[str, float]
     phone_detected: bool
     frame_hash: str
+    gaze_away: bool
+    frame_quality: Optional[str]  # None if usable, else a QUALITY_REASONS entry
+    classification_weight: float  # 1.0; DEGRADED_SAMPLE_WEIGHT if reused, 0.0 if unclassified (deadline)
+
+
+# Behaviour classes in CNN output order; class ids index into this tuple
+BEHAVIOR_CLASSES = ('normal', 'suspicious', 'very_suspicious')
+BEHAVIOR_CLASS_IDS = {name: i for i, name in enumerate(BEHAVIOR_CLASSES)}
+
+
+class FrameSampleRing:
+    """
+    Preallocated, array-backed ring buffer of per-frame samples.
+    
+    Each sample is stored as fixed-width fields (timestamp, face count,
+    class id, confidence, phone flag, gaze-away flag, hash) so a session's batch buffer has a
+    constant memory footprint. Batch statistics are maintained as counters
+    updated on push/evict, making both add_frame and batch close O(1).
+    
+    In lazy classification mode a sample carries a compact behaviour input
+    instead of a class; it is kept in `behavior_inputs` and flagged as
+    deferred until the batch closes.
+    
+    Unusable samples (failed the frame-quality gate) only count towards
+    `unusable_frames` / `unusable_freq`, never towards face or class counts.
+    
+    Class votes are weighted by the sample's classification_weight, and
+    `class_weight` is their total over usable samples (the denominator of
+    the class shares). Samples degraded by a request deadline vote with
+    less than full weight.
+    """
+    
+    def __init__(self, capacity: int = BATCH_MAX_FRAMES):
+        self.capacity = capacity
+        self.timestamps = np.zeros(capacity, dtype=np.float64)
+        self.face_counts = np.zeros(capacity, dtype=np.int16)
+        self.class_ids = np.zeros(capacity, dtype=np.int8)
+        self.confidences = np.zeros(capacity, dtype=np.float32)
+        self.phone_flags = np.zeros(capacity, dtype=np.bool_)
+        self.gaze_flags = np.zeros(capacity, dtype=np.bool_)
+        self.hashes = np.zeros(capacity, dtype=np.uint64)
+        self.deferred = np.zeros(capacity, dtype=np.bool_)
+        self.quality_ids = np.full(capacity, -1, dtype=np.int8)  # -1 = usable
+        self.weights = np.ones(capacity, dtype=np.float32)
+        self.behavior_inputs: Optional[np.ndarray] = None  # Allocated on first deferred push
+        self.head = 0  # Index of oldest sample
+        self.size = 0
+        
+        # Incremental statistics
+        self.face_count_freq: Dict[int, int] = {}
+        self.class_freq = [0.0] * len(BEHAVIOR_CLASSES)
+        self.class_weight = 0.0
+        self.degraded_frames = 0
+        self.multi_face_frames = 0
+        self.no_face_frames = 0
+        self.phone_frames = 0
+        self.gaze_away_frames = 0
+        self.deferred_frames = 0
+        self.unusable_frames = 0
+        self.unusable_freq = [0] * len(QUALITY_REASONS)
+    
+    def __len__(self) -> int:
+        return self.size
+    
+    def clear(self):
+        """Drop all samples and counters (arrays stay allocated)"""
+        self.head = 0
+        self.size = 0
+        self.face_count_freq.clear()
+        self.class_freq = [0.0] * len(BEHAVIOR_CLASSES)
+        self.class_weight = 0.0
+        self.degraded_frames = 0
+        self.multi_face_frames = 0
+        self.no_face_frames = 0
+        self.phone_frames = 0
+        self.gaze_away_frames = 0
+        self.deferred_frames = 0
+        self.unusable_frames = 0
+        self.unusable_freq = [0] * len(QUALITY_REASONS)
+    
+    def _count(self, face_count: int, class_id: int, phone: bool, gaze_away: bool,
+               quality_id: int, weight: float, step: int):
+        """Apply one sample to the counters (step=+1 on push, -1 on evict)"""
+        if quality_id >= 0:
+            self.unusable_frames += step
+            self.unusable_freq[quality_id] += step
+            return
+        freq = self.face_count_freq.get(face_count, 0) + step
+        if freq:
+            self.face_count_freq[face_count] = freq
+        else:
+            self.face_count_freq.pop(face_count, None)
+        self.class_weight += step * weight
+        if class_id >= 0:
+            self.class_freq[class_id] += step * weight
+        if weight < 1.0:
+            self.degraded_frames += step
+        if face_count >= 2:
+            self.multi_face_frames += step
+        elif face_count == 0:
+            self.no_face_frames += step
+        if phone:
+            self.phone_frames += step
+        if gaze_away:
+            self.gaze_away_frames += step
+    
+    def push(self, sample: 'FrameSample', behavior_input: Optional[np.ndarray] = None):
+        """
+        Append a sample, evicting the oldest one if the ring is full.
+        With behavior_input the sample's classification is deferred.
+        """
+        if self.size == self.capacity:
+            old = self.head
+            self._count(int(self.face_counts[old]), int(self.class_ids[old]),
+                        bool(self.phone_flags[old]), bool(self.gaze_flags[old]),
+                        int(self.quality_ids[old]), float(self.weights[old]), -1)
+            if self.deferred[old]:
+                self.deferred_frames -= 1
+            self.head = (self.head + 1) % self.capacity
+            self.size -= 1
+        
+        idx = (self.head + self.size) % self.capacity
+        class_id = BEHAVIOR_CLASS_IDS.get(sample.classification, -1)
+        quality_id = QUALITY_REASONS.index(sample.frame_quality) if sample.frame_quality else -1
+        self.timestamps[idx] = sample.timestamp
+        self.face_counts[idx] = sample.face_count
+        self.class_ids[idx] = class_id
+        self.confidences[idx] = sample.classification_confidence
+        self.phone_flags[idx] = sample.phone_detected
+        self.gaze_flags[idx] = sample.gaze_away
+        self.hashes[idx] = int(sample.frame_hash[:16], 16) if sample.frame_hash else 0
+        self.quality_ids[idx] = quality_id
+        self.weights[idx] = sample.classification_weight
+        self.deferred[idx] = behavior_input is not None
+        if behavior_input is not None:
+            if self.behavior_inputs is None:
+                self.behavior_inputs = np.empty((self.capacity,) + behavior_input.shape, dtype=behavior_input.dtype)
+            self.behavior_inputs[idx] = behavior_input
+            self.deferred_frames += 1
+        self.size += 1
+        self._count(sample.face_count, class_id, sample.phone_detected, sample.gaze_away, quality_id,
+                    float(self.weights[idx]), +1)
+    
+    def first_timestamp(self) -> float:
+        return float(self.timestamps[self.head])
+    
+    def last_timestamp(self) -> float:
+        return float(self.timestamps[(self.head + self.size - 1) % self.capacity])
+    
+    def deferred_strata(self, k: int) -> List[Tuple[int, np.ndarray]]:
+        """
+        Stratified sample of up to k deferred frames.
+        
+        Strata are face-count groups (0 / 1 / 2+), so short stretches of
+        absence or extra faces are still represented. Allocation is
+        proportional (largest remainder, at least one frame per stratum)
+        and frames are evenly spaced in time within a stratum.
+        Returns [(stratum_size, ring_indices), ...].
+        """
+        order = (self.head + np.arange(self.size)) % self.capacity
+        order = order[self.deferred[order]]
+        if len(order) == 0:
+            return []
+        stratum = np.minimum(self.face_counts[order], 2)
+        groups = [order[stratum == s] for s in range(3)]
+        groups = [g for g in groups if len(g)]
+        sizes = np.array([len(g) for g in groups])
+        k = min(max(k, len(groups)), len(order))
+        
+        quotas = k * sizes / len(order)
+        alloc = np.maximum(np.floor(quotas).astype(int), 1)
+        while alloc.sum() > k:
+            alloc[int(np.argmax(np.where(alloc > 1, alloc - quotas, -np.inf)))] -= 1
+        while alloc.sum() < k:
+            alloc[int(np.argmax(np.where(alloc < sizes, quotas - alloc, -np.inf)))] += 1
+        
+        return [(len(g), g[((np.arange(n) + 0.5) * len(g) / n).astype(int)])
+                for g, n in zip(groups, alloc)]
+
+
+class CredibilityTimeline:
+    """
+    Whole-exam series of one session, one row per closed batch.
+    
+    Columns: t (float32 seconds since the first batch; exact to ~1 ms over
+    a 3-hour exam), credibility (float32), and the confirmed state and
+    batch decision as BEHAVIOR_CLASSES ids (uint8) - 10 bytes per batch.
+    Each column lives in chunks allocated as the series grows (a small
+    first chunk, then CREDIBILITY_TIMELINE_CHUNK rows), so appends never
+    copy earlier rows. Not locked itself: the owning BatchFrameProcessor
+    appends and reads under its lock.
+    """
+    
+    def __init__(self):
+        self.clear()
+    
+    def clear(self):
+        self.start_time: Optional[float] = None
+        self.chunks: List[Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]] = []
+        self.size = 0
+        self.fill = 0  # Rows used in the last chunk
+        self.last_offset = 0.0
+    
+    def __len__(self) -> int:
+        return self.size
+    
+    def append(self, timestamp: float, credibility: float, state_id: int, decision_id: int):
+        if self.start_time is None:
+            self.start_time = timestamp
+        if not self.chunks or self.fill == len(self.chunks[-1][0]):
+            rows = CREDIBILITY_TIMELINE_CHUNK if self.chunks else CREDIBILITY_TIMELINE_FIRST_CHUNK
+            self.chunks.append((np.empty(rows, np.float32), np.empty(rows, np.float32),
+                                np.empty(rows, np.uint8), np.empty(rows, np.uint8)))
+            self.fill = 0
+        t, cred, state, decision = self.chunks[-1]
+        # Client clocks may step back between uploads; keep the series ordered
+        self.last_offset = max(self.last_offset, timestamp - self.start_time)
+        t[self.fill] = self.last_offset
+        cred[self.fill] = credibility
+        state[self.fill] = state_id
+        decision[self.fill] = decision_id
+        self.fill += 1
+        self.size += 1
+    
+    def columns(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Copies of (t, credibility, state, decision) over all rows"""
+        if not self.chunks:
+            return (np.empty(0, np.float32), np.empty(0, np.float32),
+                    np.empty(0, np.uint8), np.empty(0, np.uint8))
+        parts = self.chunks[:-1] + [tuple(col[:self.fill] for col in self.chunks[-1])]
+        return tuple(np.concatenate([part[i] for part in parts]) for i in range(4))
+    
+    @property
+    def nbytes(self) -> int:
+        return sum(col.nbytes for chunk in self.chunks for col in chunk)
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, points: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets downsampling: indices of `points` rows
+    (first and last always kept) that preserve the visual shape of y(x).
+    
+    Rows 1..n-2 are split into points-2 equal buckets; from each bucket
+    the row forming the largest triangle with the previously selected row
+    and the next bucket's mean is kept.
+    """
+    n = len(x)
+    if points >= n or points < 3:
+        return np.arange(n)
+    x = x.astype(np.float64)
+    y = y.astype(np.float64)
+    edges = (np.arange(points - 1) * (n - 2) / (points - 2)).astype(int) + 1
+    edges[-1] = n - 1
+    selected = np.empty(points, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(points - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
 
 
 @dataclass
@@ -242,6 +833,46 @@ class BatchAnalysisResult:
     total_frames: int
     batch_duration: float
     decision_reason: str
+    
+    # Head pose (keypoint-based, informational)
+    gaze_away_frames: int = 0
+    gaze_away_pct: float = 0.0
+    
+    # Lazy classification: frames actually classified and bounds on the
+    # dominant class share (equal to the share itself when all were classified)
+    classification_sampled_frames: int = 0
+    classification_dominance_bounds: Tuple[float, float] = (0.0, 0.0)
+    
+    # Frame-quality gate: unusable frames are excluded from the face and
+    # classification histograms above (their denominator is usable frames)
+    unusable_frames: int = 0
+    unusable_pct: float = 0.0
+    unusable_reasons: Dict[str, int] = field(default_factory=dict)
+    camera_unusable_confirmed: bool = False
+    
+    # Request deadlines: usable frames whose CNN result was reused or skipped
+    # (their class votes carry less weight)
+    degraded_frames: int = 0
+    
+    # Confirmed state before this batch, if the batch changed it
+    state_changed_from: Optional[str] = None
+
+
+_state_version_lock = threading.Lock()
+_last_state_version = 0
+
+
+def next_state_version() -> int:
+    """
+    Next session state version (worker-wide, strictly increasing).
+    
+    Seeded from the clock in microseconds, so versions keep increasing
+    across restarts and a dashboard's `since` cursor stays valid.
+    """
+    global _last_state_version
+    with _state_version_lock:
+        _last_state_version = max(_last_state_version + 1, time.time_ns() // 1000)
+        return _last_state_version
 
 
 class BatchFrameProcessor:
@@ -254,11 +885,17 @@ class BatchFrameProcessor:
     TASK 4: Update credibility ONCE per batch
     TASK 5: State inertia - require 2 consecutive batches to change state
     TASK 6: Clear buffer after processing, no frame reuse
+    
+    With lazy_classification, frames are added with a compact behaviour
+    input instead of a class and the CNN runs once per batch on a
+    stratified sample of LAZY_CLASSIFICATION_SAMPLE_SIZE frames.
     """
     
-    def __init__(self):
-        self.buffer: List[FrameSample] = []
-        self.batch_start_time: Optional[float] = None
+    def __init__(self, lazy_classification: bool = False):
+        self.buffer = FrameSampleRing(BATCH_MAX_FRAMES)
+        self.lazy_classification = lazy_classification
+        self.batch_start_time: Optional[float] = None  # Client timestamp of the first frame
+        self.batch_opened_at: Optional[float] = None  # Server time.monotonic() of the same frame
         self.last_batch_result: Optional[BatchAnalysisResult] = None
         
         # TASK 5: State inertia
@@ -266,12 +903,21 @@ class BatchFrameProcessor:
         self.pending_state = 'normal'  # State waiting for confirmation
         self.consecutive_state_batches = 0  # Batches agreeing on pending state
         
-        # Credibility (TASK 4)
+        # Credibility (TASK 4), plus its per-batch history for review
         self.credibility_score = CREDIBILITY_INITIAL
+        self.timeline = CredibilityTimeline()
         
         self.lock = threading.Lock()
         self.batch_count = 0
         
+        # Bumped on every batch close and reset (bulk state API, ETags)
+        self.state_version = next_state_version()
+        self.state_updated_at = time.time()
+        self._compact_state: Optional[Tuple[int, Dict]] = None
+        
+        # Batch window follows the session's capture cadence (see set_capture_interval)
+        self.max_duration_seconds = BATCH_MAX_DURATION_SECONDS
+        
         logger.info(f"BatchFrameProcessor initialized (max_frames={BATCH_MAX_FRAMES}, max_duration={BATCH_MAX_DURATION_SECONDS}s)")
     
     def reset(self):
@@ -279,33 +925,70 @@ class BatchFrameProcessor:
         with self.lock:
             self.buffer.clear()
             self.batch_start_time = None
+            self.batch_opened_at = None
             self.last_batch_result = None
             self.confirmed_state = 'normal'
             self.pending_state = 'normal'
             self.consecutive_state_batches = 0
             self.credibility_score = CREDIBILITY_INITIAL
+            self.timeline.clear()
             self.batch_count = 0
+            self.max_duration_seconds = BATCH_MAX_DURATION_SECONDS
+            self.bump_state_version()
             logger.info("BatchFrameProcessor reset - all state cleared")
     
-    def add_frame(self, sample: FrameSample) -> Optional[BatchAnalysisResult]:
+    def admission_state(self, now: float) -> Tuple[int, bool]:
+        """
+        Buffer state for admission control.
+        
+        Returns (buffer_size, closes_batch) where closes_batch is True if a
+        frame arriving at `now` (server time.monotonic()) would close the
+        current batch. Client timestamps are not comparable with the server
+        clock, so the batch age is measured from batch_opened_at.
+        """
+        with self.lock:
+            size = len(self.buffer)
+            if size + 1 < BATCH_MIN_FRAMES:
+                return size, False
+            duration = now - self.batch_opened_at if self.batch_opened_at is not None else 0.0
+            closes = size + 1 >= BATCH_MAX_FRAMES or duration >= self.max_duration_seconds
+            return size, closes
+    
+    def set_capture_interval(self, interval_seconds: float):
+        """
+        Keep the batch window consistent with the recommended capture cadence.
+        
+        At slower cadences the duration cap is stretched so a batch can still
+        collect BATCH_MIN_FRAMES; at the base cadence it stays at
+        BATCH_MAX_DURATION_SECONDS.
+        """
+        with self.lock:
+            self.max_duration_seconds = max(BATCH_MAX_DURATION_SECONDS,
+                                            interval_seconds * BATCH_MIN_FRAMES)
+    
+    def add_frame(self, sample: FrameSample,
+                  behavior_input: Optional[np.ndarray] = None) -> Optional[BatchAnalysisResult]:
         """
         TASK 1: Add frame to buffer and check if batch is ready.
         
+        behavior_input (lazy mode) is the frame's compact_behavior_input;
+        the sample's classification is then left as None.
         Returns BatchAnalysisResult if batch was processed, None otherwise.
         """
         with self.lock:
             # Initialize batch start time if needed
             if self.batch_start_time is None:
                 self.batch_start_time = sample.timestamp
+                self.batch_opened_at = time.monotonic()
             
-            # Add sample to buffer
-            self.buffer.append(sample)
+            # Add sample to buffer (O(1): counters updated on push)
+            self.buffer.push(sample, behavior_input)
             
             # Check if batch is ready for processing
             batch_duration = sample.timestamp - self.batch_start_time
             batch_ready = (
                 len(self.buffer) >= BATCH_MAX_FRAMES or
-                batch_duration >= BATCH_MAX_DURATION_SECONDS
+                batch_duration >= self.max_duration_seconds
             )
             
             if batch_ready and len(self.buffer) >= BATCH_MIN_FRAMES:
@@ -321,18 +1004,23 @@ class BatchFrameProcessor:
         Called when batch is full. Returns analysis result.
         """
         self.batch_count += 1
-        total_frames = len(self.buffer)
-        batch_duration = self.buffer[-1].timestamp - self.buffer[0].timestamp if len(self.buffer) > 1 else 0
+        buffer = self.buffer
+        total_frames = len(buffer)
+        batch_duration = buffer.last_timestamp() - buffer.first_timestamp() if total_frames > 1 else 0
+        
+        # Frames that failed the quality gate are their own category; face and
+        # classification shares are taken over the usable frames only
+        usable_frames = total_frames - buffer.unusable_frames
+        denominator = usable_frames or 1
+        unusable_pct = buffer.unusable_frames / total_frames
+        camera_unusable_confirmed = unusable_pct >= UNUSABLE_BATCH_THRESHOLD
+        unusable_reasons = {r: n for r, n in zip(QUALITY_REASONS, buffer.unusable_freq) if n}
         
         # =====================================================================
-        # TASK 2A: Face Count Analysis - Compute frequency distribution
+        # TASK 2A: Face Count Analysis - Frequency distribution from the
+        # buffer's incremental counters (no rescan of samples)
         # =====================================================================
-        face_count_freq: Dict[int, int] = {}
-        for sample in self.buffer:
-            count = sample.face_count
-            face_count_freq[count] = face_count_freq.get(count, 0) + 1
-        
-        face_count_histogram = {k: v / total_frames for k, v in face_count_freq.items()}
+        face_count_histogram = {k: v / denominator for k, v in buffer.face_count_freq.items()}
         
         # Find dominant face count (MODE)
         # Ignore counts appearing in < 30% of batch
@@ -351,30 +1039,40 @@ class BatchFrameProcessor:
         # TASK 2B: Multi-Face Confirmation
         # Confirm ONLY IF face_count >= 2 appears in >= 70% of batch
         # =====================================================================
-        multi_face_pct = sum(v for k, v in face_count_histogram.items() if k >= 2)
+        multi_face_pct = buffer.multi_face_frames / denominator
         multi_face_confirmed = multi_face_pct >= MULTI_FACE_BATCH_THRESHOLD
         
         # =====================================================================
         # TASK 2C: No-Face Detection
         # Confirm ONLY IF face_count == 0 appears in >= 60% of batch
         # =====================================================================
-        no_face_pct = face_count_histogram.get(0, 0.0)
+        no_face_pct = buffer.no_face_frames / denominator
         no_face_confirmed = no_face_pct >= NO_FACE_BATCH_THRESHOLD
         
         # =====================================================================
-        # TASK 3: Classification Analysis - Majority voting
+        # TASK 3: Classification Analysis - Weighted majority voting
+        # Deferred (lazy) frames contribute their sampled class shares;
+        # deadline-degraded frames vote with their reduced weight
         # =====================================================================
-        class_freq: Dict[str, int] = {'normal': 0, 'suspicious': 0, 'very_suspicious': 0}
-        for sample in self.buffer:
-            cls = sample.classification
-            if cls in class_freq:
-                class_freq[cls] += 1
+        class_counts = np.array(buffer.class_freq, dtype=np.float64)
+        class_denominator = buffer.class_weight if buffer.class_weight > 1e-6 else 1.0
+        sampled_frames = usable_frames - buffer.deferred_frames
+        half_widths = np.zeros(len(BEHAVIOR_CLASSES))
+        if buffer.deferred_frames:
+            shares, deferred_half_widths, classified = self._classify_deferred()
+            class_counts += shares * buffer.deferred_frames
+            half_widths = deferred_half_widths * buffer.deferred_frames / class_denominator
+            sampled_frames += classified
         
-        classification_histogram = {k: v / total_frames for k, v in class_freq.items()}
+        class_freq: Dict[str, float] = dict(zip(BEHAVIOR_CLASSES, class_counts.tolist()))
+        classification_histogram = {k: v / class_denominator for k, v in class_freq.items()}
         
         # Find dominant classification
         dominant_classification = max(class_freq, key=class_freq.get)
         classification_dominance = classification_histogram[dominant_classification]
+        half_width = float(half_widths[BEHAVIOR_CLASS_IDS[dominant_classification]])
+        dominance_bounds = (max(0.0, classification_dominance - half_width),
+                            min(1.0, classification_dominance + half_width))
         
         # =====================================================================
         # Determine batch decision
@@ -387,7 +1085,12 @@ class BatchFrameProcessor:
             batch_classification = 'very_suspicious'
             decision_reason = f"Multi-face BATCH-CONFIRMED ({multi_face_pct:.1%} of batch)"
         
-        # Priority 2: No-face (if confirmed by batch)
+        # Priority 2a: Camera covered / unusable (if confirmed by batch)
+        elif camera_unusable_confirmed:
+            batch_classification = 'suspicious'
+            decision_reason = f"Camera unusable BATCH-CONFIRMED ({unusable_pct:.1%} of batch: {unusable_reasons})"
+        
+        # Priority 2b: No-face (if confirmed by batch)
         elif no_face_confirmed:
             batch_classification = 'suspicious'
             decision_reason = f"No-face BATCH-CONFIRMED ({no_face_pct:.1%} of batch)"
@@ -396,6 +1099,9 @@ class BatchFrameProcessor:
         elif classification_dominance >= CLASSIFICATION_DOMINANCE_THRESHOLD:
             batch_classification = dominant_classification
             decision_reason = f"Classification '{dominant_classification}' dominates ({classification_dominance:.1%})"
+            if sampled_frames < usable_frames:
+                decision_reason += (f" [sampled {sampled_frames}/{usable_frames}, "
+                                    f"{dominance_bounds[0]:.0%}-{dominance_bounds[1]:.0%}]")
         
         # Default: Stay normal
         else:
@@ -424,6 +1130,8 @@ class BatchFrameProcessor:
         # TASK 4: Update credibility ONCE per batch
         # =====================================================================
         credibility_delta = self._update_credibility(self.confirmed_state)
+        self.timeline.append(buffer.last_timestamp(), self.credibility_score,
+                             BEHAVIOR_CLASS_IDS[self.confirmed_state], BEHAVIOR_CLASS_IDS[batch_classification])
         
         # Build result
         result = BatchAnalysisResult(
@@ -437,7 +1145,17 @@ class BatchFrameProcessor:
             classification_dominance_pct=classification_dominance,
             total_frames=total_frames,
             batch_duration=batch_duration,
-            decision_reason=decision_reason
+            decision_reason=decision_reason,
+            gaze_away_frames=buffer.gaze_away_frames,
+            gaze_away_pct=buffer.gaze_away_frames / denominator,
+            classification_sampled_frames=sampled_frames,
+            classification_dominance_bounds=dominance_bounds,
+            unusable_frames=buffer.unusable_frames,
+            unusable_pct=unusable_pct,
+            unusable_reasons=unusable_reasons,
+            camera_unusable_confirmed=camera_unusable_confirmed,
+            degraded_frames=buffer.degraded_frames,
+            state_changed_from=old_state if state_changed else None
         )
         
         # =====================================================================
@@ -453,8 +1171,12 @@ class BatchFrameProcessor:
             logger.info(f"  Dominant face count: {dominant_face_count} ({face_count_dominance:.1%})")
             logger.info(f"  Multi-face confirmed: {multi_face_confirmed} ({multi_face_pct:.1%})")
             logger.info(f"  No-face confirmed: {no_face_confirmed} ({no_face_pct:.1%})")
+            logger.info(f"  Gaze away: {buffer.gaze_away_frames}/{total_frames} frames")
             logger.info(f"  Classification distribution: {classification_histogram}")
-            logger.info(f"  Dominant classification: {dominant_classification} ({classification_dominance:.1%})")
+            logger.info(f"  Dominant classification: {dominant_classification} ({classification_dominance:.1%}, "
+                        f"bounds {dominance_bounds[0]:.1%}-{dominance_bounds[1]:.1%}, "
+                        f"classified {sampled_frames}/{usable_frames}, degraded {buffer.degraded_frames})")
+            logger.info(f"  Unusable frames: {buffer.unusable_frames}/{total_frames} {unusable_reasons}")
             logger.info(f"  Batch decision: {batch_classification}")
             logger.info(f"  Confirmed state: {self.confirmed_state} (consecutive batches: {self.consecutive_state_batches})")
             logger.info(f"  Credibility: {self.credibility_score:.1f} (Δ{credibility_delta:+.2f})")
@@ -466,10 +1188,43 @@ class BatchFrameProcessor:
         # =====================================================================
         self.buffer.clear()
         self.batch_start_time = None
+        self.batch_opened_at = None
         self.last_batch_result = result
+        self.bump_state_version()
         
         return result
     
+    def _classify_deferred(self) -> Tuple[np.ndarray, np.ndarray, int]:
+        """
+        Lazy classification of the buffer's deferred frames.
+        
+        Runs ONE batched CNN pass over a stratified sample and returns
+        (class_shares, half_widths, frames_classified). Shares are the
+        stratified estimate over all deferred frames; half-widths are
+        normal-approximation bounds (Agresti-Coull adjusted, with finite
+        population correction, so a fully classified stratum is exact).
+        """
+        buffer = self.buffer
+        strata = buffer.deferred_strata(LAZY_CLASSIFICATION_SAMPLE_SIZE)
+        indices = np.concatenate([idx for _, idx in strata])
+        results = classify_behavior_inputs(buffer.behavior_inputs[indices])
+        class_ids = np.array([BEHAVIOR_CLASS_IDS[c] for c, _, _ in results])
+        
+        z2 = LAZY_CLASSIFICATION_Z ** 2
+        shares = np.zeros(len(BEHAVIOR_CLASSES))
+        variance = np.zeros(len(BEHAVIOR_CLASSES))
+        start = 0
+        for stratum_size, stratum_indices in strata:
+            n = len(stratum_indices)
+            counts = np.bincount(class_ids[start:start + n], minlength=len(BEHAVIOR_CLASSES))
+            weight = stratum_size / buffer.deferred_frames
+            shares += weight * counts / n
+            adjusted = (counts + z2 / 2) / (n + z2)
+            variance += weight ** 2 * (1 - n / stratum_size) * adjusted * (1 - adjusted) / n
+            start += n
+        
+        return shares, LAZY_CLASSIFICATION_Z * np.sqrt(variance), len(indices)
+    
     def _update_credibility(self, classification: str) -> float:
         """
         TASK 4: Update credibility ONCE per batch.
@@ -510,9 +1265,49 @@ class BatchFrameProcessor:
                 'credibility_score': self.credibility_score,
                 'buffer_size': len(self.buffer),
                 'batch_count': self.batch_count,
+                'max_duration': self.max_duration_seconds,
                 'last_batch': self.last_batch_result
             }
     
+    def bump_state_version(self):
+        """Call with the lock held, after any change to the dashboard-visible state"""
+        self.state_version = next_state_version()
+        self.state_updated_at = time.time()
+    
+    def compact_state(self) -> Dict:
+        """Dashboard view of the session, rebuilt only when state_version changed"""
+        with self.lock:
+            cached = self._compact_state
+            if cached is not None and cached[0] == self.state_version:
+                return cached[1]
+            last = self.last_batch_result
+            state = {
+                'version': self.state_version,
+                'updated_at_ms': int(self.state_updated_at * 1000),
+                'confirmed_state': self.confirmed_state,
+                'pending_state': self.pending_state,
+                'credibility_score': float(round(self.credibility_score, 1)),
+                'batch_count': self.batch_count,
+                'last_batch': None if last is None else {
+                    'classification': last.dominant_classification,
+                    'face_count': int(last.dominant_face_count),
+                    'multiple_faces_confirmed': last.multi_face_confirmed,
+                    'no_face_confirmed': last.no_face_confirmed,
+                    'camera_unusable_confirmed': last.camera_unusable_confirmed,
+                    'gaze_away_pct': float(round(last.gaze_away_pct, 3)),
+                    'decision_reason': last.decision_reason
+                }
+            }
+            self._compact_state = (self.state_version, state)
+            return state
+    
+    def timeline_columns(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """(epoch seconds, credibility, state ids, decision ids) per closed batch"""
+        with self.lock:
+            t, credibility, states, decisions = self.timeline.columns()
+            start_time = self.timeline.start_time or 0.0
+        return start_time + t.astype(np.float64), credibility, states, decisions
+    
     def force_process(self) -> Optional[BatchAnalysisResult]:
         """Force process current buffer (even if not full)"""
         with self.lock:
@@ -524,6 +1319,9 @@ class BatchFrameProcessor:
 @dataclass
 class FrameAnalysisResult:
     """Result of analyzing a single frame"""
+    __slots__ = ('face_count', 'stable_face_count', 'faces_detected', 'multiple_faces',
+                 'multiple_faces_confirmed', 'bboxes', 'confidences', 'frame_hash', 'timestamp')
+    
     face_count: int
     stable_face_count: int
     faces_detected: bool
@@ -538,6 +1336,9 @@ class FrameAnalysisResult:
 @dataclass
 class ClassificationResult:
     """Result of behavior classification"""
+    __slots__ = ('classification', 'confidence', 'raw_probabilities',
+                 'smoothed_probabilities', 'is_stable')
+    
     classification: str  # 'normal', 'suspicious', 'very_suspicious'
     confidence: float
     raw_probabilities: Dict[str, float]
@@ -583,6 +1384,18 @@ def require_auth(f):
     return decorated_function
 
 
+def require_admin(f):
+    """require_auth, plus a userType in ADMIN_USER_TYPES (403 otherwise)"""
+    @wraps(f)
+    @require_auth
+    def decorated_function(*args, **kwargs):
+        if request.user_type not in ADMIN_USER_TYPES:
+            logger.warning(f"Admin endpoint denied for user {request.user_id} ({request.user_type})")
+            return jsonify({'success': False, 'error': 'Forbidden - Admin access required'}), 403
+        return f(*args, **kwargs)
+    return decorated_function
+
+
 # =============================================================================
 # FACE TRACKER CLASS - Simple per-frame face tracking (BATCH handles certainty)
 # =============================================================================
@@ -637,13 +1450,15 @@ class FaceTracker:
         return intersection / union if union > 0 else 0.0
     
     def _merge_overlapping_boxes(self, boxes: List[Tuple[int, int, int, int]], 
-                                  confidences: List[float]) -> Tuple[List[Tuple[int, int, int, int]], List[float]]:
+                                  confidences: List[float]) -> Tuple[List[Tuple[int, int, int, int]], List[float], List[int]]:
         """
         Merge overlapping bounding boxes using Non-Maximum Suppression.
         TASK 1: Uses stricter IoU threshold (0.5) to merge duplicates
+        
+        Returns (boxes, confidences, kept input indices).
         """
         if len(boxes) <= 1:
-            return boxes, confidences
+            return boxes, confidences, list(range(len(boxes)))
         
         boxes_np = np.array(boxes)
         confs_np = np.array(confidences)
@@ -672,7 +1487,7 @@ class FaceTracker:
         merged_boxes = [tuple(boxes_np[i]) for i in keep]
         merged_confs = [confs_np[i] for i in keep]
         
-        return merged_boxes, merged_confs
+        return merged_boxes, merged_confs, [int(i) for i in keep]
     
     def _suppress_duplicate_tracks(self):
         """
@@ -741,10 +1556,14 @@ class FaceTracker:
         return matches
     
     def update(self, boxes: List[Tuple[int, int, int, int]], 
-               confidences: List[float]) -> Tuple[List[TrackedFace], int, List[float]]:
+               confidences: List[float],
+               poses: Optional[np.ndarray] = None) -> Tuple[List[TrackedFace], int, List[float]]:
         """
         Update tracker with new frame detections.
         
+        poses: optional (N, 2) array of per-detection (yaw, pitch) degrees,
+        smoothed into the matched tracks.
+        
         Returns: (active_faces, face_count, face_confidences)
         
         NOTE: This returns RAW frame-based counts.
@@ -757,13 +1576,16 @@ class FaceTracker:
             # Confidence Gating - Filter out low-confidence detections
             high_conf_boxes = []
             high_conf_confs = []
-            for box, conf in zip(boxes, confidences):
+            high_conf_idx = []
+            for idx, (box, conf) in enumerate(zip(boxes, confidences)):
                 if conf >= FACE_DETECTION_CONFIDENCE:
                     high_conf_boxes.append(box)
                     high_conf_confs.append(conf)
+                    high_conf_idx.append(idx)
             
             # Merge overlapping boxes (NMS)
-            merged_boxes, merged_confs = self._merge_overlapping_boxes(high_conf_boxes, high_conf_confs)
+            merged_boxes, merged_confs, kept = self._merge_overlapping_boxes(high_conf_boxes, high_conf_confs)
+            merged_poses = poses[[high_conf_idx[i] for i in kept]] if poses is not None and kept else None
             
             # Match new detections to existing tracked faces
             matches = self._match_faces(merged_boxes, merged_confs)
@@ -775,6 +1597,8 @@ class FaceTracker:
                     merged_confs[box_idx],
                     self.frame_count
                 )
+                if merged_poses is not None:
+                    self.tracked_faces[face_id].update_pose(*merged_poses[box_idx])
             
             # Create new tracked faces for unmatched detections
             for i, (box, conf) in enumerate(zip(merged_boxes, merged_confs)):
@@ -785,10 +1609,11 @@ class FaceTracker:
                         confidence=conf,
                         first_seen_frame=self.frame_count,
                         last_seen_frame=self.frame_count,
-                        center_history=[(box[0] + box[2]/2, box[1] + box[3]/2)],
                         first_seen_time=current_time,
                         last_seen_time=current_time
                     )
+                    if merged_poses is not None:
+                        new_face.update_pose(*merged_poses[i])
                     self.tracked_faces[self.next_face_id] = new_face
                     self.next_face_id += 1
             
@@ -809,6 +1634,11 @@ class FaceTracker:
             face_confidences = [f.confidence for f in active_faces]
             
             return active_faces, face_count, face_confidences
+    
+    def track_boxes(self) -> List[Tuple[int, int, int, int]]:
+        """Bboxes of all current tracks (including not-yet-active ones)"""
+        with self.lock:
+            return [f.bbox for f in self.tracked_faces.values()]
 
 
 # =============================================================================
@@ -827,7 +1657,11 @@ class ClassificationSmoother:
     
     def __init__(self, window_size: int = CLASSIFICATION_WINDOW_SIZE):
         self.window_size = window_size
-        self.history: deque = deque(maxlen=window_size)
+        # Structure-of-arrays sliding window (class ids + probability rows)
+        self.history_class_ids = np.zeros(window_size, dtype=np.int8)
+        self.history_probs = np.zeros((window_size, len(BEHAVIOR_CLASSES)), dtype=np.float32)
+        self.history_len = 0
+        self.history_pos = 0
         self.current_classification = 'normal'
         self.current_confidence = 1.0
         self.frames_in_current_state = 0
@@ -838,7 +1672,8 @@ class ClassificationSmoother:
     def reset(self):
         """Reset smoother state"""
         with self.lock:
-            self.history.clear()
+            self.history_len = 0
+            self.history_pos = 0
             self.current_classification = 'normal'
             self.current_confidence = 1.0
             self.frames_in_current_state = 0
@@ -876,14 +1711,14 @@ class ClassificationSmoother:
                     if DEBUG_FACE_TRACKING:
                         logger.debug(f"  [NORMAL GRAVITY] Single stable face, biasing toward normal")
             
-            # Add to history
-            self.history.append({
-                'classification': adjusted_classification,
-                'confidence': raw_confidence,
-                'probabilities': adjusted_probs
-            })
+            # Add to history (ring overwrite of the oldest slot)
+            pos = self.history_pos
+            self.history_class_ids[pos] = BEHAVIOR_CLASS_IDS[adjusted_classification]
+            self.history_probs[pos] = [adjusted_probs.get(key, 0.0) for key in BEHAVIOR_CLASSES]
+            self.history_pos = (pos + 1) % self.window_size
+            self.history_len = min(self.history_len + 1, self.window_size)
             
-            if len(self.history) < 2:
+            if self.history_len < 2:
                 # TASK 3D: Not enough history = default to normal (weak signal suppression)
                 return ClassificationResult(
                     classification='normal',
@@ -894,17 +1729,13 @@ class ClassificationSmoother:
                 )
             
             # Count classifications in window
-            counts = {'normal': 0, 'suspicious': 0, 'very_suspicious': 0}
-            for item in self.history:
-                counts[item['classification']] += 1
+            n = self.history_len
+            class_counts = np.bincount(self.history_class_ids[:n], minlength=len(BEHAVIOR_CLASSES))
+            counts = {key: int(c) for key, c in zip(BEHAVIOR_CLASSES, class_counts)}
             
             # Calculate smoothed probabilities
-            smoothed_probs = {'normal': 0.0, 'suspicious': 0.0, 'very_suspicious': 0.0}
-            for item in self.history:
-                for key in smoothed_probs:
-                    smoothed_probs[key] += item['probabilities'].get(key, 0.0)
-            for key in smoothed_probs:
-                smoothed_probs[key] /= len(self.history)
+            mean_probs = self.history_probs[:n].mean(axis=0)
+            smoothed_probs = {key: float(p) for key, p in zip(BEHAVIOR_CLASSES, mean_probs)}
             
             majority_class = max(counts, key=counts.get)
             majority_count = counts[majority_class]
@@ -957,7 +1788,7 @@ class ClassificationSmoother:
                 self.frames_in_current_state += 1
             
             # Calculate confidence
-            agreement_ratio = majority_count / len(self.history)
+            agreement_ratio = majority_count / self.history_len
             smoothed_confidence = smoothed_probs[new_classification] * agreement_ratio
             self.current_confidence = smoothed_confidence
             
@@ -1118,20 +1949,25 @@ class FaceDetector:
     Temporal tracking is handled by FaceTracker.
     """
     
-    def __init__(self):
+    def __init__(self, mediapipe_instances: int = 1):
         self.face_cascade = None
         self.detection_method = None
         
         # Initialize MediaPipe
+        # A graph is not safe for concurrent process() calls, so we keep a pool
+        # of graphs sized by the thread budget; it also bounds MediaPipe's
+        # share of the CPU to `mediapipe_instances` concurrent detections.
         if MEDIAPIPE_AVAILABLE:
             try:
                 self.mp_face_detection = mp.solutions.face_detection
-                self.face_detection = self.mp_face_detection.FaceDetection(
-                    model_selection=1,  # Full-range model
-                    min_detection_confidence=FACE_DETECTION_CONFIDENCE
-                )
+                self.face_detection_pool: queue.Queue = queue.Queue()
+                for _ in range(max(1, mediapipe_instances)):
+                    self.face_detection_pool.put(self.mp_face_detection.FaceDetection(
+                        model_selection=1,  # Full-range model
+                        min_detection_confidence=FACE_DETECTION_CONFIDENCE
+                    ))
                 self.detection_method = 'mediapipe'
-                logger.info("✅ Using MediaPipe face detection")
+                logger.info(f"✅ Using MediaPipe face detection ({max(1, mediapipe_instances)} graph(s))")
             except Exception as e:
                 logger.warning(f"MediaPipe init failed: {str(e)[:200]}")
         
@@ -1146,23 +1982,43 @@ class FaceDetector:
             except Exception as e:
                 logger.error(f"All detection methods failed: {str(e)[:200]}")
     
-    def detect_faces_raw(self, frame: np.ndarray) -> Tuple[List[Tuple[int, int, int, int]], List[float]]:
+    def detect_faces_raw(self, frame: np.ndarray,
+                         roi_state: Optional['RoiSearchState'] = None) -> Tuple[List[Tuple[int, int, int, int]], List[float]]:
         """
         Detect faces in a single frame (raw detection, no tracking).
         
+        roi_state (per session) enables ROI-restricted Haar search around the
+        session's current tracks; ignored for MediaPipe.
+        
         Returns:
             Tuple of (bounding_boxes, confidences)
         """
+        boxes, confidences, _ = self.detect_faces_with_keypoints(frame, roi_state)
+        return boxes, confidences
+    
+    def detect_faces_with_keypoints(self, frame: np.ndarray,
+                                    roi_state: Optional['RoiSearchState'] = None
+                                    ) -> Tuple[List[Tuple[int, int, int, int]], List[float], Optional[np.ndarray]]:
+        """
+        Like detect_faces_raw, but also returns MediaPipe's six keypoints per
+        face as an (N, 6, 2) pixel array (None for Haar, which has none).
+        """
         h, w = frame.shape[:2]
         boxes = []
         confidences = []
+        keypoints = None
         
         try:
             if self.detection_method == 'mediapipe':
                 rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                results = self.face_detection.process(rgb_frame)
+                face_detection = self.face_detection_pool.get()
+                try:
+                    results = face_detection.process(rgb_frame)
+                finally:
+                    self.face_detection_pool.put(face_detection)
                 
                 if results.detections:
+                    face_keypoints = []
                     for detection in results.detections:
                         bbox = detection.location_data.relative_bounding_box
                         
@@ -1191,29 +2047,211 @@ class FaceDetector:
                             if 0.5 <= aspect <= 2.0:
                                 boxes.append((x, y, width, height))
                                 confidences.append(confidence)
+                                points = detection.location_data.relative_keypoints
+                                face_keypoints.append(
+                                    [(p.x * w, p.y * h) for p in points[:HEAD_POSE_KEYPOINTS]]
+                                    if len(points) >= HEAD_POSE_KEYPOINTS
+                                    else [(np.nan, np.nan)] * HEAD_POSE_KEYPOINTS)
+                    if face_keypoints:
+                        keypoints = np.asarray(face_keypoints, dtype=np.float32)
             
             elif self.detection_method == 'haar':
                 gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-                detected = self.face_cascade.detectMultiScale(
-                    gray,
-                    scaleFactor=1.1,
-                    minNeighbors=5,
-                    minSize=FACE_MIN_SIZE
-                )
+                if HAAR_ROI_ENABLED and roi_state is not None and not roi_state.needs_full_scan():
+                    detected = self._detect_haar_roi(gray, roi_state)
+                else:
+                    detected = self.face_cascade.detectMultiScale(
+                        gray,
+                        scaleFactor=1.1,
+                        minNeighbors=5,
+                        minSize=FACE_MIN_SIZE
+                    )
+                    if roi_state is not None:
+                        roi_state.record_full_scan()
                 for (x, y, w_box, h_box) in detected:
-                    boxes.append((x, y, w_box, h_box))
+                    boxes.append((int(x), int(y), int(w_box), int(h_box)))
                     confidences.append(0.7)  # Haar doesn't give confidence
             
         except Exception as e:
             logger.error(f"Detection error: {str(e)}")
         
-        return boxes, confidences
+        if keypoints is not None and len(keypoints) != len(boxes):
+            keypoints = None
+        return boxes, confidences, keypoints
+
+
+    def _detect_haar_roi(self, gray: np.ndarray, roi_state: 'RoiSearchState') -> List[Tuple[int, int, int, int]]:
+        """
+        Haar search restricted to padded windows around the session's tracks,
+        with the scale range narrowed to each track's size.
+        """
+        h, w = gray.shape[:2]
+        found = []
+        missed = False
+        for (bx, by, bw, bh) in roi_state.hints:
+            pad_x = int(bw * HAAR_ROI_PADDING)
+            pad_y = int(bh * HAAR_ROI_PADDING)
+            x0, y0 = max(0, bx - pad_x), max(0, by - pad_y)
+            x1, y1 = min(w, bx + bw + pad_x), min(h, by + bh + pad_y)
+            if x1 - x0 < FACE_MIN_SIZE[0] or y1 - y0 < FACE_MIN_SIZE[1]:
+                missed = True
+                continue
+            
+            size = min(bw, bh)
+            min_size = max(FACE_MIN_SIZE[0], int(size * HAAR_ROI_SCALE_RANGE[0]))
+            max_size = min(x1 - x0, y1 - y0, int(size * HAAR_ROI_SCALE_RANGE[1]))
+            detected = self.face_cascade.detectMultiScale(
+                gray[y0:y1, x0:x1],
+                scaleFactor=1.1,
+                minNeighbors=5,
+                minSize=(min_size, min_size),
+                maxSize=(max(min_size, max_size), max(min_size, max_size))
+            )
+            if len(detected) == 0:
+                missed = True
+            for (x, y, w_box, h_box) in detected:
+                found.append((x + x0, y + y0, w_box, h_box))
+        
+        roi_state.record_roi_scan(missed)
+        return found
+
+
+class RoiSearchState:
+    """
+    Per-session schedule for ROI-restricted Haar search.
+    
+    ROI mode searches only around the session's current tracks. A full-frame
+    scan runs every HAAR_FULL_SCAN_INTERVAL frames, whenever there are no
+    tracks, and on the frame after any ROI miss, so new faces are still found.
+    """
+    __slots__ = ('hints', 'frames_since_full_scan', 'missed', 'full_scans', 'roi_scans')
+    
+    def __init__(self):
+        self.hints: List[Tuple[int, int, int, int]] = []
+        self.frames_since_full_scan = 0
+        self.missed = True  # First frame is always a full scan
+        self.full_scans = 0
+        self.roi_scans = 0
+    
+    def needs_full_scan(self) -> bool:
+        return (not self.hints or self.missed or
+                self.frames_since_full_scan >= HAAR_FULL_SCAN_INTERVAL - 1)
+    
+    def record_full_scan(self):
+        self.frames_since_full_scan = 0
+        self.missed = False
+        self.full_scans += 1
+    
+    def record_roi_scan(self, missed: bool):
+        self.frames_since_full_scan += 1
+        self.missed = missed
+        self.roi_scans += 1
+    
+    def reset(self):
+        self.hints = []
+        self.frames_since_full_scan = 0
+        self.missed = True
 
 
 # =============================================================================
 # SESSION MANAGER - Handles per-session state
 # =============================================================================
 
+class ExamAggregate:
+    """
+    Exam-wide counters, maintained incrementally by the EventHub from the
+    session updates of all workers.
+    
+    Each member session contributes one count to its confirmed state and
+    one to a fixed-bucket credibility histogram. When a batch moves the
+    session, the old contribution is removed and the new one added, so
+    the counters always describe current state and a summary costs the
+    same for 10 sessions as for 10,000. Violation and batch counts are
+    cumulative over the exam.
+    """
+    
+    BINS = int(np.ceil((CREDIBILITY_MAX - CREDIBILITY_MIN) / EXAM_CREDIBILITY_BIN_WIDTH)) + 1
+    
+    def __init__(self, exam_id: str):
+        self.exam_id = exam_id
+        self.sessions = 0
+        self.state_counts = {state: 0 for state in BEHAVIOR_CLASSES}
+        self.credibility_histogram = np.zeros(self.BINS, dtype=np.int64)
+        self.credibility_sum = 0.0
+        self.violations: Dict[str, int] = {}
+        self.batches = 0
+        self.updated_at = time.time()
+    
+    @classmethod
+    def credibility_bin(cls, credibility: float) -> int:
+        index = int((credibility - CREDIBILITY_MIN) / EXAM_CREDIBILITY_BIN_WIDTH)
+        return min(max(index, 0), cls.BINS - 1)
+    
+    def add(self, state: str, credibility: float):
+        self.sessions += 1
+        self.state_counts[state] += 1
+        self.credibility_histogram[self.credibility_bin(credibility)] += 1
+        self.credibility_sum += credibility
+    
+    def remove(self, state: str, credibility: float):
+        self.sessions -= 1
+        self.state_counts[state] -= 1
+        self.credibility_histogram[self.credibility_bin(credibility)] -= 1
+        self.credibility_sum -= credibility
+    
+    def record(self, batches: int, violations: Dict[str, int]):
+        self.batches += batches
+        for violation, count in violations.items():
+            self.violations[violation] = self.violations.get(violation, 0) + count
+        self.updated_at = time.time()
+    
+    def summary(self) -> Dict:
+        """Current counters and derived statistics; cost is independent of exam size"""
+        quantiles = {}
+        if self.sessions > 0:
+            cumulative = np.cumsum(self.credibility_histogram)
+            for q in EXAM_CREDIBILITY_QUANTILES:
+                index = int(np.searchsorted(cumulative, q * self.sessions, 'left'))
+                quantiles[f'p{int(q * 100)}'] = round(CREDIBILITY_MIN + index * EXAM_CREDIBILITY_BIN_WIDTH, 1)
+        return {
+            'exam_id': self.exam_id,
+            'sessions': self.sessions,
+            'states': dict(self.state_counts),
+            'flagged_sessions': self.sessions - self.state_counts['normal'],
+            'credibility': {
+                'mean': round(self.credibility_sum / self.sessions, 1) if self.sessions else None,
+                **quantiles,
+                'histogram': {
+                    'min': CREDIBILITY_MIN,
+                    'bin_width': EXAM_CREDIBILITY_BIN_WIDTH,
+                    'counts': self.credibility_histogram.tolist()
+                }
+            },
+            'violations': [{'type': violation, 'count': count} for violation, count in
+                           sorted(self.violations.items(), key=lambda item: item[1], reverse=True)],
+            'batches': self.batches,
+            'updated_at_ms': int(self.updated_at * 1000)
+        }
+
+
+def bulk_state_etag(session_ids: List[str], since: int, found: List[Tuple]) -> str:
+    """Weak ETag of a bulk state answer; found holds (id, version, state getter) of visible sessions"""
+    cursor = max((version for _, version, _ in found), default=since)
+    return f"{zlib.crc32(chr(0).join(session_ids).encode()):08x}-{since}-{cursor}-{len(found)}"
+
+
+def bulk_state_body(since: int, found: List[Tuple], missing: List[str]) -> Dict:
+    """Sessions changed after `since`; `version` is the cursor for the next poll"""
+    changed = {sid: get_state() for sid, version, get_state in found if version > since}
+    return {
+        'success': True,
+        'version': max([since] + [version for _, version, _ in found]),
+        'sessions': changed,
+        'unchanged': len(found) - len(changed),
+        'missing': missing
+    }
+
+
 class SessionManager:
     """
     Manages session-specific state for BATCH-BASED proctoring.
@@ -1222,10 +2260,20 @@ class SessionManager:
     - BatchFrameProcessor handles all certainty logic
     - FaceTracker provides raw per-frame detection
     - All decisions made per BATCH, not per frame
+    
+    Sessions restored from a snapshot (SessionSnapshotter) are kept as
+    encoded records in `restored` and hydrated on first access.
+    
+    Sessions tagged with an exam_id count their batches and violations
+    since joining the exam (record_batch). The exam aggregates themselves
+    live in the EventHub, which gets each session's full contribution
+    with its batch events and on exam change and reset, so sessions
+    spread over several workers are counted once.
     """
     
     def __init__(self):
         self.sessions: Dict[str, Dict] = {}
+        self.restored: Dict[str, bytes] = {}  # session_id -> snapshot payload, not yet hydrated
         self.default_session_id = "default"
         self.lock = threading.Lock()
         
@@ -1237,98 +2285,3605 @@ class SessionManager:
         """Create a new session with fresh state"""
         session = {
             'face_tracker': FaceTracker(),
-            'batch_processor': BatchFrameProcessor(),  # NEW: Batch-based processing
+            'batch_processor': BatchFrameProcessor(LAZY_CLASSIFICATION_ENABLED),  # NEW: Batch-based processing
+            'roi_state': RoiSearchState(),  # Haar ROI search schedule
             'last_frame_hash': None,
             'frame_count': 0,
             'created_at': time.time(),
-            'last_batch_result': None  # Cache last batch result for API responses
+            'last_batch_result': None,  # Cache last batch result for API responses
+            # Capture-rate governor inputs
+            'last_face_count': None,
+            'stable_face_frames': 0,
+            'duplicate_ratio': 0.0,
+            'capture_interval_ms': CAPTURE_INTERVAL_BASE_MS,
+            # Last fresh optional-stage results, reused when a deadline is short
+            'last_behavior': None,
+            'last_phone_prob': 0.0,
+            'exam_id': None,  # Set by requests carrying exam_id (event stream, exam aggregates)
+            'owner': None,  # userId of the first authenticated proctoring request (event stream access)
+            'exam_batches': 0,  # Batches and violations since joining exam_id (sent to the event hub)
+            'exam_violations': {},
+            'capture': None  # TrafficCapture while an admin has capture enabled
         }
+        payload = self.restored.pop(session_id, None)
+        if payload is not None:
+            apply_session_snapshot(session, payload)
         self.sessions[session_id] = session
         return session
     
-    def get_session(self, session_id: str = None) -> Dict:
-        """Get session by ID, creating if necessary"""
+    def adopt_restored(self, payloads: Dict[str, bytes]):
+        """Register restored sessions; live ones are hydrated now, the rest on first access"""
         with self.lock:
-            sid = session_id or self.default_session_id
-            if sid not in self.sessions:
-                return self._create_session(sid)
-            return self.sessions[sid]
+            for sid, payload in payloads.items():
+                if sid in self.sessions:
+                    apply_session_snapshot(self.sessions[sid], payload)
+                else:
+                    self.restored[sid] = payload
     
-    def reset_session(self, session_id: str = None):
-        """Reset session state (TASK 6: Clear all buffers)"""
+    def snapshot_view(self) -> Tuple[List[Tuple[str, Dict]], set]:
+        """Live sessions and ids of restored-but-unhydrated ones (for the snapshotter)"""
         with self.lock:
-            sid = session_id or self.default_session_id
-            if sid in self.sessions:
-                session = self.sessions[sid]
-                session['face_tracker'].reset()
-                session['batch_processor'].reset()
-                session['last_frame_hash'] = None
-                session['frame_count'] = 0
-                session['last_batch_result'] = None
-                logger.info(f"Session {sid} reset - all state cleared")
+            return list(self.sessions.items()), set(self.restored)
     
-    def is_duplicate_frame(self, session_id: str, frame: np.ndarray) -> bool:
+    def get_session(self, session_id: str = None, exam_id: str = None, owner: str = None) -> Dict:
+        """
+        Get session by ID, creating if necessary. exam_id (if given) tags the
+        session; owner (the request's userId) is bound on first use. Either
+        change is reported to the event hub.
+        """
+        sid = session_id or self.default_session_id
+        annotate_trace('session.id', sid)
+        if profiler is not None:
+            profiler.bind_session(sid)
+        changed = False
+        with trace_span('session_manager.get_session'), self.lock:
+            session = self.sessions.get(sid) or self._create_session(sid)
+            if owner is not None and session['owner'] is None:
+                session['owner'] = owner
+                changed = True
+            if exam_id and session['exam_id'] != str(exam_id):
+                session['exam_id'] = str(exam_id)
+                session['exam_batches'] = 0
+                session['exam_violations'] = {}
+                changed = True
+        if changed and event_channel is not None:
+            event_channel.send(session_update(sid, session))
+        return session
+    
+    def record_batch(self, session: Dict, batch_result: BatchAnalysisResult):
+        """Count a closed batch towards the session's exam (reported with its batch events)"""
+        if session['exam_id'] is None:
+            return
+        with self.lock:
+            session['exam_batches'] += 1
+            violations = session['exam_violations']
+            for violation in batch_violation_types(batch_result):
+                violations[violation] = violations.get(violation, 0) + 1
+    
+    def find_session(self, session_id: str) -> Optional[Dict]:
+        """Existing (or restored) session; unlike get_session, never creates one"""
+        with self.lock:
+            if session_id in self.sessions:
+                return self.sessions[session_id]
+            if session_id in self.restored:
+                return self._create_session(session_id)
+            return None
+    
+    def reset_session(self, session_id: str = None):
+        """Reset session state (TASK 6: Clear all buffers); exam counts are kept"""
+        sid = session_id or self.default_session_id
+        session = None
+        with self.lock:
+            if sid in self.sessions:
+                session = self.sessions[sid]
+                session['face_tracker'].reset()
+                session['roi_state'].reset()
+                session['batch_processor'].reset()
+                session['last_frame_hash'] = None
+                session['frame_count'] = 0
+                session['last_batch_result'] = None
+                session['last_face_count'] = None
+                session['stable_face_frames'] = 0
+                session['duplicate_ratio'] = 0.0
+                session['capture_interval_ms'] = CAPTURE_INTERVAL_BASE_MS
+                session['last_behavior'] = None
+                session['last_phone_prob'] = 0.0
+                if session['capture'] is not None:
+                    session['capture'].record_reset()
+                logger.info(f"Session {sid} reset - all state cleared")
+        if session is not None and event_channel is not None:
+            event_channel.send(session_update(sid, session))
+    
+    def is_duplicate_frame(self, session_id: str, frame: np.ndarray) -> bool:
         """
         Check if frame is duplicate of last processed frame.
         
         FIX: Prevents processing same frame multiple times (loopback bug)
         """
-        session = self.get_session(session_id)
-        
-        # Compute frame hash (fast, uses downsampled version)
-        small = cv2.resize(frame, (64, 64))
-        frame_hash = hashlib.md5(small.tobytes()).hexdigest()
+        session = self.get_session(session_id)
+        
+        # Compute frame hash (fast, uses downsampled version)
+        small = cv2.resize(frame, (64, 64))
+        frame_hash = hashlib.md5(small.tobytes()).hexdigest()
+        
+        if session['last_frame_hash'] == frame_hash:
+            return True
+        
+        session['last_frame_hash'] = frame_hash
+        session['frame_count'] += 1
+        return False
+
+
+# =============================================================================
+# SESSION SNAPSHOTS - Crash-safe binary journal of session state
+# =============================================================================
+
+# Session record: saved_at, created_at, frame_count, last_face_count (-1 = None),
+# stable_face_frames, duplicate_ratio, capture_interval_ms, confirmed/pending
+# state ids, consecutive_state_batches, credibility_score, batch_count,
+# max_duration_seconds, tracker frame_count, next_face_id, track count
+SESSION_SNAPSHOT_STRUCT = struct.Struct('<ddIiIffBBIdIfIIH')
+SESSION_SNAPSHOT_TRACK_DTYPE = np.dtype([
+    ('id', '<i4'), ('bbox', '<i4', (4,)), ('confidence', '<f4'),
+    ('first_seen_frame', '<i4'), ('last_seen_frame', '<i4'), ('seen_count', '<i4'),
+    ('first_seen_time', '<f8'), ('last_seen_time', '<f8'),
+    ('yaw', '<f4'), ('pitch', '<f4'),  # NaN = no pose yet
+    ('center_count', '<i2'), ('centers', '<f4', (TRACK_CENTER_HISTORY_SIZE, 2))  # Oldest first
+])
+SESSION_SNAPSHOT_MAGIC = b'EVSS\x02'  # v2: consecutive_state_batches widened to uint32
+SESSION_SNAPSHOT_FRAME = struct.Struct('<II')  # Payload length, CRC32 of payload
+
+
+def session_snapshot_signature(session: Dict) -> Tuple:
+    """Cheap change marker; a session is re-encoded only when this moves"""
+    return (session['frame_count'], session['batch_processor'].batch_count,
+            session['face_tracker'].frame_count, session['capture_interval_ms'])
+
+
+def encode_session_snapshot(session_id: str, session: Dict) -> bytes:
+    """
+    Serialize what a restart must not lose: state inertia, credibility,
+    tracks and capture-governor inputs. The open batch buffer is not kept
+    (a restart costs at most one partial batch).
+    """
+    processor = session['batch_processor']
+    tracker = session['face_tracker']
+    with processor.lock:
+        confirmed = BEHAVIOR_CLASS_IDS[processor.confirmed_state]
+        pending = BEHAVIOR_CLASS_IDS[processor.pending_state]
+        consecutive = processor.consecutive_state_batches
+        credibility = processor.credibility_score
+        batch_count = processor.batch_count
+        max_duration = processor.max_duration_seconds
+    with tracker.lock:
+        faces = list(tracker.tracked_faces.values())
+        tracks = np.zeros(len(faces), dtype=SESSION_SNAPSHOT_TRACK_DTYPE)
+        for row, face in zip(tracks, faces):
+            row['id'] = face.id
+            row['bbox'] = face.bbox
+            row['confidence'] = face.confidence
+            row['first_seen_frame'] = face.first_seen_frame
+            row['last_seen_frame'] = face.last_seen_frame
+            row['seen_count'] = face.seen_count
+            row['first_seen_time'] = face.first_seen_time
+            row['last_seen_time'] = face.last_seen_time
+            row['yaw'] = np.nan if face.yaw is None else face.yaw
+            row['pitch'] = np.nan if face.pitch is None else face.pitch
+            row['center_count'] = face._center_count
+            row['centers'][:face._center_count] = face.center_history
+        tracker_frames = tracker.frame_count
+        next_face_id = tracker.next_face_id
+    
+    sid = session_id.encode('utf-8')
+    last_face_count = session['last_face_count']
+    header = SESSION_SNAPSHOT_STRUCT.pack(
+        time.time(), session['created_at'], session['frame_count'],
+        -1 if last_face_count is None else last_face_count, session['stable_face_frames'],
+        session['duplicate_ratio'], session['capture_interval_ms'], confirmed, pending,
+        consecutive, credibility, batch_count, max_duration, tracker_frames, next_face_id, len(faces))
+    payload = struct.pack('<H', len(sid)) + sid + header + tracks.tobytes()
+    return SESSION_SNAPSHOT_FRAME.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def session_snapshot_header(payload: bytes) -> Tuple[str, float]:
+    """(session_id, saved_at) without decoding the rest"""
+    sid_len = struct.unpack_from('<H', payload)[0]
+    return payload[2:2 + sid_len].decode('utf-8'), struct.unpack_from('<d', payload, 2 + sid_len)[0]
+
+
+def apply_session_snapshot(session: Dict, payload: bytes):
+    """Hydrate a freshly created session from a snapshot payload"""
+    sid_len = struct.unpack_from('<H', payload)[0]
+    (_, created_at, frame_count, last_face_count, stable_face_frames, duplicate_ratio,
+     capture_interval_ms, confirmed, pending, consecutive, credibility, batch_count,
+     max_duration, tracker_frames, next_face_id, n_tracks) = SESSION_SNAPSHOT_STRUCT.unpack_from(payload, 2 + sid_len)
+    tracks = np.frombuffer(payload, dtype=SESSION_SNAPSHOT_TRACK_DTYPE, count=n_tracks,
+                           offset=2 + sid_len + SESSION_SNAPSHOT_STRUCT.size)
+    
+    session.update({
+        'created_at': created_at,
+        'frame_count': frame_count,
+        'last_face_count': None if last_face_count < 0 else last_face_count,
+        'stable_face_frames': stable_face_frames,
+        'duplicate_ratio': duplicate_ratio,
+        'capture_interval_ms': capture_interval_ms
+    })
+    processor = session['batch_processor']
+    with processor.lock:
+        processor.confirmed_state = BEHAVIOR_CLASSES[confirmed]
+        processor.pending_state = BEHAVIOR_CLASSES[pending]
+        processor.consecutive_state_batches = consecutive
+        processor.credibility_score = credibility
+        processor.batch_count = batch_count
+        processor.max_duration_seconds = max_duration
+        processor.bump_state_version()
+    tracker = session['face_tracker']
+    with tracker.lock:
+        tracker.frame_count = tracker_frames
+        tracker.next_face_id = next_face_id
+        tracker.tracked_faces.clear()
+        for row in tracks:
+            face = TrackedFace(int(row['id']), tuple(int(v) for v in row['bbox']), float(row['confidence']),
+                               int(row['first_seen_frame']), int(row['last_seen_frame']), int(row['seen_count']),
+                               float(row['first_seen_time']), float(row['last_seen_time']))
+            count = int(row['center_count'])
+            face._centers[:count] = row['centers'][:count]
+            face._center_pos = count % TRACK_CENTER_HISTORY_SIZE
+            face._center_count = count
+            if not np.isnan(row['yaw']):
+                face.yaw, face.pitch = float(row['yaw']), float(row['pitch'])
+            tracker.tracked_faces[face.id] = face
+
+
+class SessionSnapshotter:
+    """
+    Periodic, incremental snapshots of SessionManager state, written off the
+    request path by a background thread.
+    
+    The file is an append-only journal: a magic header followed by framed
+    records (length, CRC32, payload), one per session version. Each tick only
+    sessions whose signature moved are encoded and appended with one
+    write + fsync; the last record per session wins. When the journal grows
+    past SESSION_SNAPSHOT_COMPACT_RATIO x the live records it is rewritten
+    (temp file + fsync + atomic rename). A torn tail from a crash mid-append
+    fails its CRC and is ignored on restore.
+    
+    Restore reads the journal once and hands payloads to SessionManager,
+    which hydrates each session on first access, so startup cost is one
+    sequential read regardless of session count.
+    """
+    
+    def __init__(self, manager: SessionManager, path: str = SESSION_SNAPSHOT_PATH,
+                 interval_seconds: float = SESSION_SNAPSHOT_INTERVAL_SECONDS):
+        self.manager = manager
+        self.path = path
+        self.interval_seconds = interval_seconds
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+        self.records: Dict[str, Tuple[Optional[Tuple], bytes]] = {}  # sid -> (signature, framed record)
+        self.journal_bytes = 0
+        self.snapshots = 0
+        self.records_written = 0
+        self.encode_errors = 0
+        self.compactions = 0
+        self.last_snapshot_ms = 0.0
+        self.last_dirty = 0
+        self.restored_sessions = 0
+        self.restore_ms = 0.0
+        self.error: Optional[str] = None
+    
+    def restore(self) -> int:
+        """Load the journal (newest record per session, CRC-checked); returns sessions restored"""
+        started = time.perf_counter()
+        try:
+            with open(self.path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return 0
+        if not data.startswith(SESSION_SNAPSHOT_MAGIC):
+            logger.warning(f"Ignoring session snapshot {self.path}: unknown format")
+            return 0
+        
+        latest: Dict[str, Tuple[float, bytes, bytes]] = {}
+        view = memoryview(data)
+        offset = len(SESSION_SNAPSHOT_MAGIC)
+        torn = False
+        while offset + SESSION_SNAPSHOT_FRAME.size <= len(data):
+            length, crc = SESSION_SNAPSHOT_FRAME.unpack_from(data, offset)
+            end = offset + SESSION_SNAPSHOT_FRAME.size + length
+            payload = view[offset + SESSION_SNAPSHOT_FRAME.size:end]
+            if end > len(data) or zlib.crc32(payload) != crc:
+                torn = True
+                break
+            payload = bytes(payload)
+            sid, saved_at = session_snapshot_header(payload)
+            latest[sid] = (saved_at, payload, data[offset:end])
+            offset = end
+        
+        cutoff = time.time() - SESSION_SNAPSHOT_MAX_AGE_SECONDS
+        payloads = {}
+        with self.lock:
+            for sid, (saved_at, payload, record) in latest.items():
+                if saved_at >= cutoff:
+                    payloads[sid] = payload
+                    self.records[sid] = (None, record)
+            self.manager.adopt_restored(payloads)
+            if torn or len(payloads) < len(latest):
+                self._compact()
+            else:
+                self.journal_bytes = len(data)
+        self.restored_sessions = len(payloads)
+        self.restore_ms = (time.perf_counter() - started) * 1000
+        logger.info(f"Restored {len(payloads)} sessions from {self.path} in {self.restore_ms:.1f}ms"
+                    + (' (torn tail dropped)' if torn else ''))
+        return len(payloads)
+    
+    def snapshot(self) -> int:
+        """Encode and persist sessions changed since the last snapshot; returns records written"""
+        started = time.perf_counter()
+        sessions, unhydrated = self.manager.snapshot_view()
+        with self.lock:
+            dirty = []
+            for sid, session in sessions:
+                signature = session_snapshot_signature(session)
+                cached = self.records.get(sid)
+                if cached is not None and cached[0] == signature:
+                    continue
+                if cached is None and signature[:3] == (0, 0, 0):
+                    continue  # Fresh session, nothing worth restoring
+                try:
+                    record = encode_session_snapshot(sid, session)
+                except Exception as e:
+                    # One bad session must not block persisting the rest; its previous record is kept
+                    self.encode_errors += 1
+                    logger.warning(f"Session snapshot skipped {sid}: {str(e)[:200]}")
+                    continue
+                self.records[sid] = (signature, record)
+                dirty.append(record)
+            
+            # Keep only sessions that still exist (live or awaiting hydration)
+            live = {sid for sid, _ in sessions} | unhydrated
+            for sid in [sid for sid in self.records if sid not in live]:
+                del self.records[sid]
+            
+            live_bytes = sum(len(record) for _, record in self.records.values())
+            appended = sum(len(record) for record in dirty)
+            if self.journal_bytes == 0 or \
+                    self.journal_bytes + appended > SESSION_SNAPSHOT_COMPACT_RATIO * live_bytes + 65536:
+                if dirty or self.journal_bytes:
+                    self._compact()
+            elif dirty:
+                with open(self.path, 'ab') as f:
+                    f.write(b''.join(dirty))
+                    f.flush()
+                    os.fsync(f.fileno())
+                self.journal_bytes += appended
+            
+            self.snapshots += 1
+            self.records_written += len(dirty)
+            self.last_dirty = len(dirty)
+            self.last_snapshot_ms = (time.perf_counter() - started) * 1000
+            return len(dirty)
+    
+    def _compact(self):
+        """Rewrite the journal with one record per session (atomic replace)"""
+        data = SESSION_SNAPSHOT_MAGIC + b''.join(record for _, record in self.records.values())
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self.journal_bytes = len(data)
+        self.compactions += 1
+    
+    def start(self):
+        """Background snapshot loop, plus a final snapshot at interpreter exit"""
+        self.thread = threading.Thread(target=self._run, name='session-snapshot', daemon=True)
+        self.thread.start()
+        atexit.register(self.stop)
+    
+    def stop(self):
+        self.stop_event.set()
+        try:
+            self.snapshot()
+        except Exception as e:
+            logger.warning(f"Final session snapshot failed: {e}")
+    
+    def _run(self):
+        while not self.stop_event.wait(self.interval_seconds):
+            try:
+                self.snapshot()
+                self.error = None
+            except Exception as e:
+                self.error = str(e)[:200]
+                logger.warning(f"Session snapshot failed: {self.error}")
+    
+    def get_stats(self) -> Dict:
+        with self.lock:
+            return {
+                'enabled': self.thread is not None,
+                'path': self.path,
+                'interval_seconds': self.interval_seconds,
+                'sessions_tracked': len(self.records),
+                'journal_bytes': self.journal_bytes,
+                'snapshots': self.snapshots,
+                'records_written': self.records_written,
+                'encode_errors': self.encode_errors,
+                'compactions': self.compactions,
+                'last_dirty_sessions': self.last_dirty,
+                'last_snapshot_ms': round(self.last_snapshot_ms, 2),
+                'restored_sessions': self.restored_sessions,
+                'restore_ms': round(self.restore_ms, 2),
+                'error': self.error
+            }
+
+
+# =============================================================================
+# FRAME QUALITY GATE - Cheap thumbnail checks before expensive stages
+# =============================================================================
+
+class FrameQualityGate:
+    """
+    Rejects frames that cannot yield a meaningful detection before they
+    reach MediaPipe/Haar, the behaviour CNN and phone detection.
+    
+    Checks run on a QUALITY_THUMBNAIL_SIZE grayscale/colour thumbnail:
+    brightness (dark / over-exposed), covered camera (near-uniform colour),
+    contrast and Laplacian-variance blur. Rejected frames are added to the
+    batch as typed unusable samples.
+    
+    Inference time saved is estimated as rejected frames x an EWMA of the
+    full per-frame pipeline cost, minus the time spent in the gate.
+    """
+    
+    def __init__(self, enabled: bool = QUALITY_GATE_ENABLED):
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.checked = 0
+        self.rejected = {reason: 0 for reason in QUALITY_REASONS}
+        self.gate_seconds = 0.0
+        self.inference_ewma = 0.0  # Seconds per usable frame (detect + classify + phone)
+        self.saved_seconds = 0.0
+    
+    @staticmethod
+    def check(frame: np.ndarray) -> Optional[str]:
+        """Reason the frame is unusable (a QUALITY_REASONS entry) or None"""
+        thumb = cv2.resize(frame, QUALITY_THUMBNAIL_SIZE, interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(thumb, cv2.COLOR_BGR2GRAY)
+        
+        brightness = gray.mean()
+        if brightness < QUALITY_MIN_BRIGHTNESS:
+            return 'dark'
+        if brightness > QUALITY_MAX_BRIGHTNESS:
+            return 'overexposed'
+        
+        # Lens covered: most of the view is one colour (hand, tape, wall close-up);
+        # every other pixel is plenty for a coverage fraction
+        coarse = thumb[::2, ::2]
+        median = np.median(coarse.reshape(-1, 3), axis=0).astype(np.uint8)
+        distance = cv2.absdiff(coarse, np.broadcast_to(median, coarse.shape).copy()).max(axis=2)
+        if (distance <= QUALITY_OCCLUSION_TOLERANCE).mean() >= QUALITY_OCCLUSION_COVERAGE:
+            return 'occluded'
+        
+        if gray.std() < QUALITY_MIN_CONTRAST:
+            return 'low_contrast'
+        if cv2.Laplacian(gray, cv2.CV_32F).var() < QUALITY_MIN_SHARPNESS:
+            return 'blurred'
+        return None
+    
+    def assess(self, frame: np.ndarray) -> Optional[str]:
+        """check() with accounting; always None when the gate is disabled"""
+        if not self.enabled:
+            return None
+        started = time.perf_counter()
+        reason = self.check(frame)
+        elapsed = time.perf_counter() - started
+        with self.lock:
+            self.checked += 1
+            self.gate_seconds += elapsed
+            if reason:
+                self.rejected[reason] += 1
+                self.saved_seconds += self.inference_ewma
+        return reason
+    
+    def observe_inference(self, elapsed_seconds: float):
+        """Record the cost of running the full pipeline on a usable frame"""
+        with self.lock:
+            if self.inference_ewma == 0.0:
+                self.inference_ewma = elapsed_seconds
+            else:
+                self.inference_ewma += QUALITY_INFERENCE_EWMA_ALPHA * (elapsed_seconds - self.inference_ewma)
+    
+    def get_stats(self) -> Dict:
+        with self.lock:
+            rejected = sum(self.rejected.values())
+            return {
+                'enabled': self.enabled,
+                'frames_checked': self.checked,
+                'frames_unusable': rejected,
+                'unusable_by_reason': dict(self.rejected),
+                'unusable_pct': round(rejected / self.checked, 3) if self.checked else 0.0,
+                'gate_ms_per_frame': round(1000 * self.gate_seconds / self.checked, 3) if self.checked else 0.0,
+                'inference_ms_per_frame': round(1000 * self.inference_ewma, 2),
+                'inference_seconds_saved': round(self.saved_seconds, 2),
+                'net_seconds_saved': round(self.saved_seconds - self.gate_seconds, 2)
+            }
+
+
+# =============================================================================
+# CAPTURE-RATE GOVERNOR - Server-recommended frame interval per session
+# =============================================================================
+
+class ServiceLoad:
+    """
+    Node-wide load signal: frames currently in flight and an EWMA of
+    per-frame processing latency.
+    """
+    
+    def __init__(self, capacity: int = CAPTURE_WORKER_CAPACITY):
+        self.capacity = capacity
+        self.in_flight = 0
+        self.latency_ewma = 0.0
+        self.lock = threading.Lock()
+    
+    def begin(self):
+        with self.lock:
+            self.in_flight += 1
+    
+    def end(self, elapsed_seconds: float):
+        with self.lock:
+            self.in_flight -= 1
+            self.latency_ewma = 0.9 * self.latency_ewma + 0.1 * elapsed_seconds
+    
+    def queue_depth(self) -> int:
+        """Frames waiting beyond the node's worker capacity"""
+        return max(0, self.in_flight - self.capacity)
+    
+    def utilization(self) -> float:
+        """In-flight frames relative to worker capacity (1.0 = saturated)"""
+        return self.in_flight / self.capacity
+
+
+class CaptureRateGovernor:
+    """
+    Computes the recommended next-frame interval for a session.
+    
+    - Calm sessions (settled batch state, steady single face, mostly
+      duplicate frames) are slowed down by up to CAPTURE_CALM_SLOWDOWN
+    - Sessions whose state is changing stay at the base cadence
+    - Server load (utilization and queue depth) stretches every interval
+    
+    The result is returned in every proctoring response and pushed into the
+    session's BatchFrameProcessor so batch windows follow the cadence.
+    """
+    
+    def __init__(self, load: ServiceLoad):
+        self.load = load
+    
+    def session_stability(self, session: Dict, state: Dict) -> float:
+        """Stability in [0, 1]; 0 = changing, 1 = fully calm"""
+        # Batch inertia: pending state agrees with confirmed and has held
+        if state['pending_state'] != state['confirmed_state']:
+            return 0.0
+        settled = min(1.0, state['consecutive_batches'] / (2 * STATE_CHANGE_REQUIRED_BATCHES))
+        if state['confirmed_state'] != 'normal':
+            settled *= 0.5  # Keep watching non-normal sessions closely
+        
+        # Face stability: same face count with little movement
+        face_stable = min(1.0, session['stable_face_frames'] / CAPTURE_STABLE_FACE_FRAMES)
+        
+        # Change gating: duplicate frames mean the scene is not changing
+        stability = settled * max(face_stable, session['duplicate_ratio'])
+        return max(0.0, min(1.0, stability))
+    
+    def recommend(self, session: Dict, state: Dict) -> Dict:
+        """Compute and store the session's recommended interval"""
+        stability = self.session_stability(session, state)
+        calm_factor = 1.0 + (CAPTURE_CALM_SLOWDOWN - 1.0) * stability
+        
+        utilization = self.load.utilization()
+        queue_depth = self.load.queue_depth()
+        load_factor = max(1.0, utilization) + queue_depth / self.load.capacity
+        
+        interval_ms = CAPTURE_INTERVAL_BASE_MS * calm_factor * load_factor
+        interval_ms = int(max(CAPTURE_INTERVAL_MIN_MS, min(CAPTURE_INTERVAL_MAX_MS, interval_ms)))
+        
+        session['capture_interval_ms'] = interval_ms
+        session['batch_processor'].set_capture_interval(interval_ms / 1000.0)
+        
+        return {
+            'next_frame_interval_ms': interval_ms,
+            'stability': float(round(stability, 3)),
+            'server_load': float(round(utilization, 3)),
+            'queue_depth': queue_depth
+        }
+    
+    @staticmethod
+    def observe_frame(session: Dict, face_count: int, active_faces: List[TrackedFace]):
+        """Update the session's face-stability counter after tracking a frame"""
+        steady = (face_count == session['last_face_count'] and
+                  all(f.movement_magnitude() <= CAPTURE_STABLE_MOVEMENT_PX for f in active_faces))
+        session['stable_face_frames'] = session['stable_face_frames'] + 1 if steady else 0
+        session['last_face_count'] = face_count
+    
+    @staticmethod
+    def observe_duplicate(session: Dict, duplicate: bool):
+        """Update the session's duplicate-frame ratio (change gating)"""
+        session['duplicate_ratio'] += CAPTURE_DUPLICATE_EWMA_ALPHA * (
+            float(duplicate) - session['duplicate_ratio'])
+
+
+def track_service_load(f):
+    """Count a call as an in-flight frame on the node-wide ServiceLoad."""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        service_load.begin()
+        started = time.time()
+        try:
+            return f(*args, **kwargs)
+        finally:
+            service_load.end(time.time() - started)
+    return decorated_function
+
+
+# =============================================================================
+# ADMISSION CONTROLLER - Bounded in-flight budget with batch-aware shedding
+# =============================================================================
+
+class AdmissionController:
+    """
+    Per-node admission control for proctoring frames.
+    
+    - Below ADMISSION_MAX_IN_FLIGHT every frame is admitted
+    - Over budget, frames for sessions whose current batch already has
+      BATCH_MIN_FRAMES samples are shed (low value: the batch is decidable)
+    - Over budget * ADMISSION_HARD_LIMIT_FACTOR, everything is shed
+    - A frame that would close its session's batch is NEVER shed
+    """
+    
+    def __init__(self, max_in_flight: int = CAPTURE_WORKER_CAPACITY * 2):
+        self.max_in_flight = max_in_flight
+        self.hard_limit = int(max_in_flight * ADMISSION_HARD_LIMIT_FACTOR)
+        self.in_flight = 0
+        self.admitted = 0
+        self.shed_counts: Dict[str, int] = {'batch_satisfied': 0, 'hard_limit': 0}
+        self.lock = threading.Lock()
+    
+    def try_admit(self, session: Dict) -> Optional[str]:
+        """
+        Admit a frame for the session. Returns None if admitted (caller must
+        call release()), or the shed reason.
+        """
+        buffer_size, closes_batch = session['batch_processor'].admission_state(time.monotonic())
+        with self.lock:
+            if self.in_flight >= self.max_in_flight and not closes_batch:
+                if self.in_flight >= self.hard_limit:
+                    reason = 'hard_limit'
+                elif buffer_size >= BATCH_MIN_FRAMES:
+                    reason = 'batch_satisfied'
+                else:
+                    reason = None
+                if reason:
+                    self.shed_counts[reason] += 1
+                    return reason
+            self.in_flight += 1
+            self.admitted += 1
+            return None
+    
+    def release(self):
+        with self.lock:
+            self.in_flight -= 1
+    
+    def retry_after_ms(self, session: Dict) -> int:
+        """Back-off for a shed client: at least two capture intervals"""
+        return max(ADMISSION_RETRY_AFTER_MS, 2 * session['capture_interval_ms'])
+    
+    def get_stats(self) -> Dict:
+        with self.lock:
+            return {
+                'max_in_flight': self.max_in_flight,
+                'hard_limit': self.hard_limit,
+                'in_flight': self.in_flight,
+                'admitted': self.admitted,
+                'shed': dict(self.shed_counts),
+                'shed_total': sum(self.shed_counts.values())
+            }
+
+
+def shed_response(session: Dict, reason: str):
+    """Fast explicit back-off response for a shed frame (503 + Retry-After)"""
+    retry_after_ms = admission_controller.retry_after_ms(session)
+    response = jsonify({
+        'success': False,
+        'shed': True,
+        'reason': reason,
+        'error': 'Server overloaded - back off and retry',
+        'retry_after_ms': retry_after_ms,
+        'capture': {'next_frame_interval_ms': retry_after_ms}
+    })
+    response.headers['Retry-After'] = str(max(1, int(np.ceil(retry_after_ms / 1000.0))))
+    return response, 503
+
+
+# =============================================================================
+# REQUEST DEADLINES - Latency budget tracked through the pipeline stages
+# =============================================================================
+
+class StageTimings:
+    """
+    Per-frame cost estimates (EWMA, seconds) of the pipeline stages, used to
+    decide whether an optional stage still fits in a request's budget.
+    
+    'detection' is mandatory (face counting never degrades); the CNN, phone
+    detection and the ensemble are optional.
+    """
+    STAGES = ('detection', 'behavior_cnn', 'phone_detection', 'ensemble')
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.estimates = {stage: 0.0 for stage in self.STAGES}
+        self.frames_run = {stage: 0 for stage in self.STAGES}
+        self.frames_degraded = {stage: 0 for stage in self.STAGES}
+    
+    def observe(self, stage: str, seconds: float, frames: int = 1):
+        if frames <= 0:
+            return
+        per_frame = seconds / frames
+        with self.lock:
+            estimate = self.estimates[stage]
+            self.estimates[stage] = per_frame if estimate == 0.0 else \
+                estimate + DEADLINE_STAGE_EWMA_ALPHA * (per_frame - estimate)
+            self.frames_run[stage] += frames
+    
+    def record_degraded(self, stage: str, frames: int = 1):
+        with self.lock:
+            self.frames_degraded[stage] += frames
+    
+    def estimate(self, stage: str) -> float:
+        """Seconds per frame (0.0 until the stage has run once)"""
+        return self.estimates[stage]
+    
+    def get_stats(self) -> Dict:
+        with self.lock:
+            return {
+                stage: {
+                    'ms_per_frame': round(self.estimates[stage] * 1000, 2),
+                    'frames_run': self.frames_run[stage],
+                    'frames_degraded': self.frames_degraded[stage]
+                }
+                for stage in self.STAGES
+            }
+
+
+class RequestDeadline:
+    """
+    Latency budget of one request, started when the request arrives.
+    
+    The budget comes from the DEADLINE_HEADER header (clamped) or the
+    endpoint's DEADLINE_DEFAULT_MS. affordable() tells a stage how many
+    frames it can still process at its estimated cost, after the reserve
+    and any mandatory work still pending. Stages that were skipped or
+    served from an earlier result are recorded in `degraded` and returned
+    to the client.
+    """
+    __slots__ = ('budget_ms', 'source', 'started', 'degraded')
+    
+    def __init__(self, budget_ms: float, source: str = 'default'):
+        self.budget_ms = budget_ms
+        self.source = source
+        self.started = time.perf_counter()
+        self.degraded: Dict[str, Dict] = {}
+    
+    @classmethod
+    def from_request(cls, endpoint: str) -> 'RequestDeadline':
+        header = request.headers.get(DEADLINE_HEADER)
+        try:
+            budget_ms = float(header) if header else None
+        except ValueError:
+            budget_ms = None
+        if budget_ms is None or not np.isfinite(budget_ms):
+            return cls(DEADLINE_DEFAULT_MS[endpoint], 'default')
+        return cls(min(DEADLINE_MAX_MS, max(DEADLINE_MIN_MS, budget_ms)), 'header')
+    
+    def remaining_ms(self) -> float:
+        return self.budget_ms - (time.perf_counter() - self.started) * 1000
+    
+    def affordable(self, stage: str, frames: int = 1, committed_seconds: float = 0.0) -> int:
+        """Frames (0..frames) of `stage` that fit before the deadline"""
+        cost = stage_timings.estimate(stage)
+        available = (self.remaining_ms() - DEADLINE_RESERVE_MS) / 1000 - committed_seconds
+        if cost <= 0.0:
+            return frames if available > 0 else 0
+        return int(min(frames, max(0, available // cost)))
+    
+    def allows(self, stage: str, committed_seconds: float = 0.0) -> bool:
+        return self.affordable(stage, 1, committed_seconds) == 1
+    
+    def degrade(self, stage: str, mode: str, frames: int = 1):
+        """Record a degraded stage; mode is 'reused' (earlier result) or 'skipped'"""
+        entry = self.degraded.setdefault(stage, {'reused': 0, 'skipped': 0})
+        entry[mode] += frames
+        stage_timings.record_degraded(stage, frames)
+    
+    def summary(self) -> Dict:
+        return {
+            'budget_ms': float(round(self.budget_ms, 1)),
+            'source': self.source,
+            'remaining_ms': float(round(self.remaining_ms(), 1)),
+            'degraded': bool(self.degraded),
+            'degraded_stages': self.degraded
+        }
+
+
+# =============================================================================
+# REQUEST TRACING - Span timings per request, exported in batches
+# =============================================================================
+
+TRACEPARENT_PATTERN = re.compile(r'^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$')
+_current_trace: contextvars.ContextVar = contextvars.ContextVar('current_trace', default=None)
+
+
+def parse_traceparent(header: Optional[str]) -> Optional[Tuple[str, str, bool]]:
+    """W3C traceparent -> (trace_id, parent_span_id, sampled); None if absent or invalid"""
+    if not header:
+        return None
+    match = TRACEPARENT_PATTERN.match(header.strip().lower())
+    if match is None:
+        return None
+    trace_id, parent_id, flags = match.groups()
+    if trace_id == '0' * 32 or parent_id == '0' * 16:
+        return None
+    return trace_id, parent_id, bool(int(flags, 16) & 0x01)
+
+
+class _NoopSpan:
+    """Shared span handed out when the current request is not traced"""
+    __slots__ = ()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        return False
+    
+    def set_attribute(self, key: str, value):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Span:
+    """
+    One timed stage of a trace (perf_counter_ns, converted to wall time on
+    export). Child span ids are drawn only when the trace is exported.
+    """
+    __slots__ = ('trace', 'name', 'span_id', 'parent', 'start_ns', 'end_ns', 'attributes', 'error')
+    
+    def __init__(self, trace: 'Trace', name: str, parent: Optional['Span'], attributes: Optional[Dict] = None):
+        self.trace = trace
+        self.name = name
+        self.span_id: Optional[str] = None
+        self.parent = parent
+        self.start_ns = 0
+        self.end_ns = 0
+        self.attributes = attributes
+        self.error = None
+    
+    def __enter__(self):
+        self.start_ns = time.perf_counter_ns()
+        trace = self.trace
+        if not trace.detailed:
+            if self.start_ns - trace.perf_ns >= trace.detail_after_ns:
+                trace.detailed = True  # Crossed the slow threshold: record attributes from here on
+            else:
+                self.attributes = None
+        trace.stack.append(self)
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.end_ns = time.perf_counter_ns()
+        self.trace.stack.pop()
+        if exc is not None:
+            self.error = f"{exc_type.__name__}: {str(exc)[:200]}"
+        self.trace.spans.append(self)
+        return False
+    
+    def ident(self) -> str:
+        if self.span_id is None:
+            self.span_id = os.urandom(8).hex()
+        return self.span_id
+    
+    def set_attribute(self, key: str, value):
+        if not self.trace.detailed and self is not self.trace.root:
+            return
+        if self.attributes is None:
+            self.attributes = {}
+        self.attributes[key] = value
+
+
+class Trace:
+    """
+    Spans of one request, rooted at a server span.
+    
+    Recorded by the request thread only (work handed to executors is
+    covered by the span around the hand-off). Whether it is exported is
+    decided when the request finishes: head-sampled, or slower than
+    TRACE_SLOW_THRESHOLD_MS.
+    
+    A trace that is not head-sampled may never be exported, so it starts
+    as timings only: child spans get no id and drop their attributes.
+    Once the request has run for detail_after_ns (the slow threshold),
+    spans started from then on record attributes too. The slow stage
+    keeps its detail while the fast early stages cost only two clock
+    reads each.
+    """
+    __slots__ = ('trace_id', 'sampled', 'detailed', 'detail_after_ns', 'remote_parent_id', 'root', 'spans',
+                 'stack', 'wall_ns', 'perf_ns')
+    
+    def __init__(self, name: str, trace_id: str, remote_parent_id: Optional[str], sampled: bool,
+                 detail_after_ms: float = 0.0):
+        self.trace_id = trace_id
+        self.sampled = sampled
+        self.detailed = sampled
+        self.detail_after_ns = int(detail_after_ms * 1e6)
+        self.remote_parent_id = remote_parent_id
+        self.spans: List[Span] = []
+        self.stack: List[Span] = []
+        self.wall_ns = time.time_ns()
+        self.perf_ns = time.perf_counter_ns()
+        self.root = Span(self, name, None)
+        self.root.ident()  # Returned in the traceparent response header
+        self.root.__enter__()
+    
+    def span(self, name: str, attributes: Optional[Dict] = None) -> Span:
+        return Span(self, name, self.stack[-1] if self.stack else self.root, attributes)
+    
+    def finish(self) -> float:
+        """Close the root span; returns the request duration in ms"""
+        if not self.root.end_ns:
+            self.root.__exit__(None, None, None)
+        return (self.root.end_ns - self.root.start_ns) / 1e6
+    
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.root.span_id}-{'01' if self.sampled else '00'}"
+
+
+def trace_span(name: str, **attributes):
+    """
+    `with trace_span('stage'):` - a child span of the current request's
+    trace, or the shared no-op span when the request is not traced (one
+    context-variable lookup, no allocation).
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        return NOOP_SPAN
+    return trace.span(name, attributes or None)
+
+
+def annotate_trace(key: str, value):
+    """Set an attribute on the current request's root span (no-op if untraced)"""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.root.set_attribute(key, value)
+
+
+def otlp_attributes(attributes: Optional[Dict]) -> List[Dict]:
+    """Dict -> OTLP/JSON KeyValue list"""
+    encoded = []
+    for key, value in (attributes or {}).items():
+        if isinstance(value, bool):
+            encoded.append({'key': key, 'value': {'boolValue': value}})
+        elif isinstance(value, (int, np.integer)):
+            encoded.append({'key': key, 'value': {'intValue': str(int(value))}})
+        elif isinstance(value, (float, np.floating)):
+            encoded.append({'key': key, 'value': {'doubleValue': float(value)}})
+        else:
+            encoded.append({'key': key, 'value': {'stringValue': str(value)}})
+    return encoded
+
+
+def otlp_span(trace: Trace, span: Span) -> Dict:
+    encoded = {
+        'traceId': trace.trace_id,
+        'spanId': span.ident(),
+        'name': span.name,
+        'kind': 2 if span is trace.root else 1,  # SERVER / INTERNAL
+        'startTimeUnixNano': str(trace.wall_ns + span.start_ns - trace.perf_ns),
+        'endTimeUnixNano': str(trace.wall_ns + span.end_ns - trace.perf_ns),
+        'attributes': otlp_attributes(span.attributes)
+    }
+    parent_id = span.parent.ident() if span.parent is not None else trace.remote_parent_id
+    if parent_id:
+        encoded['parentSpanId'] = parent_id
+    if span.error:
+        encoded['status'] = {'code': 2, 'message': span.error}
+    return encoded
+
+
+class Tracer:
+    """
+    Per-worker trace recorder and exporter.
+    
+    A trace is started for a request only when it may be kept: tracing is
+    enabled (TRACE_EXPORTER 'otlp' or 'file') and the request is either
+    head-sampled or could still qualify as slow (timings only until the
+    request crosses the threshold, see Trace). Sampling follows the
+    sampled flag of an incoming traceparent header (the Node backend's
+    decision), otherwise TRACE_SAMPLE_RATE. Finished traces go to a
+    bounded queue (dropped when full, never blocking a request); a
+    background thread exports them as OTLP/JSON ExportTraceServiceRequest
+    documents, either POSTed to an OTLP/HTTP collector or appended one per
+    line to a size-rotated file (readable by the collector's otlpjsonfile
+    receiver).
+    """
+    
+    def __init__(self, exporter: str = TRACE_EXPORTER, sample_rate: float = TRACE_SAMPLE_RATE,
+                 slow_threshold_ms: float = TRACE_SLOW_THRESHOLD_MS, file_path: str = TRACE_FILE_PATH,
+                 endpoint: str = TRACE_OTLP_ENDPOINT, slot: int = 0):
+        if exporter not in ('none', 'otlp', 'file'):
+            logger.warning(f"Unknown TRACE_EXPORTER '{exporter}', tracing disabled")
+            exporter = 'none'
+        self.exporter = exporter
+        self.enabled = exporter != 'none'
+        self.sample_rate = min(1.0, max(0.0, sample_rate))
+        self.slow_threshold_ms = slow_threshold_ms
+        self.file_path = file_path
+        self.endpoint = endpoint
+        self.resource = {'attributes': otlp_attributes({
+            'service.name': TRACE_SERVICE_NAME,
+            'service.instance.id': f"{os.uname().nodename}:{os.getpid()}",
+            'evalon.worker_slot': slot
+        })}
+        self.queue: queue.Queue = queue.Queue(maxsize=TRACE_EXPORT_QUEUE_SIZE)
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+        self.started = 0
+        self.kept_sampled = 0
+        self.kept_slow = 0
+        self.discarded = 0
+        self.dropped_queue_full = 0
+        self.exported_spans = 0
+        self.export_failures = 0
+        self.error = None
+    
+    def start(self):
+        if not self.enabled:
+            return
+        self.thread = threading.Thread(target=self._run, name='trace-export', daemon=True)
+        self.thread.start()
+        atexit.register(self.stop)
+    
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout=TRACE_EXPORT_TIMEOUT_SECONDS + 1)
+    
+    def start_request(self, name: str, traceparent: Optional[str]) -> Optional[Trace]:
+        if not self.enabled:
+            return None
+        parent = parse_traceparent(traceparent)
+        if parent is not None:
+            trace_id, parent_id, sampled = parent
+        else:
+            trace_id, parent_id = os.urandom(16).hex(), None
+            sampled = random.random() < self.sample_rate
+        if not sampled and self.slow_threshold_ms <= 0:
+            return None
+        with self.lock:
+            self.started += 1
+        return Trace(name, trace_id, parent_id, sampled, self.slow_threshold_ms)
+    
+    def finish_request(self, trace: Trace):
+        duration_ms = trace.finish()
+        slow = self.slow_threshold_ms > 0 and duration_ms >= self.slow_threshold_ms
+        with self.lock:
+            if trace.sampled:
+                self.kept_sampled += 1
+            elif slow:
+                self.kept_slow += 1
+            else:
+                self.discarded += 1
+                return
+        if slow:
+            trace.root.set_attribute('evalon.trace.slow', True)
+        try:
+            self.queue.put_nowait(trace)
+        except queue.Full:
+            with self.lock:
+                self.dropped_queue_full += 1
+    
+    def _run(self):
+        """Export loop: up to TRACE_EXPORT_BATCH_SPANS spans or TRACE_EXPORT_INTERVAL_SECONDS per export"""
+        while True:
+            batch, spans = [], 0
+            deadline = time.monotonic() + TRACE_EXPORT_INTERVAL_SECONDS
+            while spans < TRACE_EXPORT_BATCH_SPANS:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    trace = self.queue.get(timeout=min(timeout, 0.25))
+                except queue.Empty:
+                    if self.stop_event.is_set():
+                        break
+                    continue
+                batch.append(trace)
+                spans += len(trace.spans)
+            if batch:
+                self.export(batch)
+            if self.stop_event.is_set() and self.queue.empty():
+                return
+    
+    def encode(self, traces: List[Trace]) -> bytes:
+        spans = [otlp_span(trace, span) for trace in traces for span in trace.spans]
+        return json.dumps({'resourceSpans': [{
+            'resource': self.resource,
+            'scopeSpans': [{'scope': {'name': __name__}, 'spans': spans}]
+        }]}, separators=(',', ':')).encode()
+    
+    def export(self, traces: List[Trace]):
+        payload = self.encode(traces)
+        try:
+            if self.exporter == 'otlp':
+                req = urllib.request.Request(self.endpoint, data=payload, method='POST',
+                                             headers={'Content-Type': 'application/json'})
+                with urllib.request.urlopen(req, timeout=TRACE_EXPORT_TIMEOUT_SECONDS) as response:
+                    response.read()
+            else:
+                self._append(payload)
+            with self.lock:
+                self.exported_spans += sum(len(trace.spans) for trace in traces)
+            self.error = None
+        except Exception as e:
+            with self.lock:
+                self.export_failures += 1
+            self.error = str(e)[:200]
+            logger.warning(f"Trace export failed ({len(traces)} traces dropped): {self.error}")
+    
+    def _append(self, payload: bytes):
+        """One OTLP/JSON document per line; rotate to .1 .. .N past TRACE_FILE_MAX_BYTES"""
+        try:
+            size = os.path.getsize(self.file_path)
+        except OSError:
+            size = 0
+        if size and size + len(payload) + 1 > TRACE_FILE_MAX_BYTES:
+            for i in range(TRACE_FILE_BACKUPS - 1, 0, -1):
+                if os.path.exists(f"{self.file_path}.{i}"):
+                    os.replace(f"{self.file_path}.{i}", f"{self.file_path}.{i + 1}")
+            os.replace(self.file_path, f"{self.file_path}.1")
+        with open(self.file_path, 'ab') as f:
+            f.write(payload + b'\n')
+    
+    def get_stats(self) -> Dict:
+        return {
+            'exporter': self.exporter,
+            'destination': self.endpoint if self.exporter == 'otlp' else self.file_path if self.enabled else None,
+            'sample_rate': self.sample_rate,
+            'slow_threshold_ms': self.slow_threshold_ms,
+            'traces_started': self.started,
+            'kept_sampled': self.kept_sampled,
+            'kept_slow': self.kept_slow,
+            'discarded': self.discarded,
+            'dropped_queue_full': self.dropped_queue_full,
+            'queue_depth': self.queue.qsize(),
+            'exported_spans': self.exported_spans,
+            'export_failures': self.export_failures,
+            'error': self.error
+        }
+
+
+# =============================================================================
+# ON-DEMAND PROFILING - Statistical stack sampling of request threads
+# =============================================================================
+
+class ProfilerBusy(RuntimeError):
+    """A capture is already running in this worker"""
+
+
+class SamplingProfiler:
+    """
+    Wall-clock sampling profiler for the running worker.
+    
+    A capture samples sys._current_frames() every interval from the
+    thread that requested it; nothing is hooked into the interpreter, so
+    the service runs at full speed between samples. By default only
+    threads that are serving a request are sampled (request_started /
+    request_finished track them, together with the session each one is
+    working on), so idle pool and background threads do not drown the
+    profile.
+    
+    Overhead cap: sampling holds the GIL, so after each sample the
+    sampler sleeps long enough that sampling time stays below
+    PROFILE_MAX_OVERHEAD of wall time, stretching the interval if needed.
+    Only one capture runs at a time (ProfilerBusy).
+    """
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.request_threads: Dict[int, Optional[str]] = {}  # thread ident -> session_id
+        self.capture: Optional[Dict] = None
+        self.captures = 0
+    
+    def request_started(self):
+        self.request_threads[threading.get_ident()] = None
+    
+    def bind_session(self, session_id: str):
+        ident = threading.get_ident()
+        if ident in self.request_threads:
+            self.request_threads[ident] = session_id
+    
+    def request_finished(self):
+        session_id = self.request_threads.pop(threading.get_ident(), None)
+        capture = self.capture
+        if capture is not None and capture['counting'] and \
+                (capture['session_id'] is None or capture['session_id'] == session_id):
+            capture['requests'] += 1
+    
+    def run(self, seconds: float, requests: Optional[int] = None, function: Optional[str] = None,
+            session_id: Optional[str] = None, interval_ms: float = PROFILE_DEFAULT_INTERVAL_MS,
+            include_background: bool = False) -> Dict:
+        """
+        Sample until `seconds` have passed or `requests` requests (of
+        session_id, if given) have completed. function keeps only stacks
+        passing through that function, rooted at it.
+        """
+        capture = {'session_id': session_id, 'requests': 0, 'counting': True}
+        with self.lock:
+            if self.capture is not None:
+                raise ProfilerBusy('A profile capture is already running')
+            self.capture = capture
+            self.captures += 1
+        
+        own_ident = threading.get_ident()
+        interval = max(PROFILE_MIN_INTERVAL_MS, interval_ms) / 1000
+        stacks: Dict[Tuple, int] = {}
+        samples = 0
+        sampling_seconds = 0.0
+        started = time.perf_counter()
+        deadline = started + seconds
+        try:
+            while time.perf_counter() < deadline and (requests is None or capture['requests'] < requests):
+                sample_started = time.perf_counter()
+                for ident, frame in sys._current_frames().items():
+                    if ident == own_ident:
+                        continue
+                    if not include_background:
+                        if ident not in self.request_threads:
+                            continue
+                        if session_id is not None and self.request_threads.get(ident) != session_id:
+                            continue
+                    stack = []
+                    while frame is not None and len(stack) < PROFILE_MAX_STACK_DEPTH:
+                        stack.append(frame.f_code)
+                        frame = frame.f_back
+                    stack.reverse()
+                    if function is not None:
+                        root = next((i for i, code in enumerate(stack) if code.co_name == function), None)
+                        if root is None:
+                            continue
+                        stack = stack[root:]
+                    key = tuple(stack)
+                    stacks[key] = stacks.get(key, 0) + 1
+                samples += 1
+                cost = time.perf_counter() - sample_started
+                sampling_seconds += cost
+                time.sleep(max(interval, cost / PROFILE_MAX_OVERHEAD - cost))
+        finally:
+            capture['counting'] = False
+            with self.lock:
+                self.capture = None
+        
+        elapsed = time.perf_counter() - started
+        if requests is not None and capture['requests'] >= requests:
+            stop_reason = 'requests'
+        else:
+            stop_reason = 'seconds'
+        return self._summarize(stacks, {
+            'pid': os.getpid(),
+            'worker_slot': worker_slot,
+            'function': function,
+            'session_id': session_id,
+            'include_background': include_background,
+            'duration_seconds': round(elapsed, 3),
+            'stop_reason': stop_reason,
+            'requests_completed': capture['requests'],
+            'samples': samples,
+            'interval_ms': round(interval * 1000, 2),
+            'effective_interval_ms': round(elapsed / samples * 1000, 2) if samples else None,
+            'overhead_pct': round(100 * sampling_seconds / elapsed, 3) if elapsed else 0.0,
+            'overhead_cap_pct': round(100 * PROFILE_MAX_OVERHEAD, 3)
+        })
+    
+    @staticmethod
+    def _frame_label(code) -> str:
+        module = os.path.splitext(os.path.basename(code.co_filename))[0]
+        return f"{module}:{code.co_name}"
+    
+    def _summarize(self, stacks: Dict[Tuple, int], meta: Dict) -> Dict:
+        """Collapsed stacks (flamegraph.pl / speedscope input) and top functions by self time"""
+        labels: Dict = {}
+        collapsed = []
+        self_counts: Dict[str, int] = {}
+        total_counts: Dict[str, int] = {}
+        for stack, count in sorted(stacks.items(), key=lambda item: -item[1]):
+            names = [labels.get(code) or labels.setdefault(code, self._frame_label(code)) for code in stack]
+            collapsed.append(f"{';'.join(names)} {count}")
+            self_counts[names[-1]] = self_counts.get(names[-1], 0) + count
+            for name in set(names):
+                total_counts[name] = total_counts.get(name, 0) + count
+        
+        stack_samples = sum(stacks.values())
+        top = sorted(total_counts, key=lambda name: (-self_counts.get(name, 0), -total_counts[name]))
+        meta['stack_samples'] = stack_samples
+        return {
+            'meta': meta,
+            'top_functions': [{
+                'function': name,
+                'self_samples': self_counts.get(name, 0),
+                'self_pct': round(100 * self_counts.get(name, 0) / stack_samples, 2),
+                'total_samples': total_counts[name],
+                'total_pct': round(100 * total_counts[name] / stack_samples, 2)
+            } for name in top[:PROFILE_TOP_FUNCTIONS]],
+            'collapsed': '\n'.join(collapsed)
+        }
+    
+    def get_stats(self) -> Dict:
+        return {
+            'capturing': self.capture is not None,
+            'captures': self.captures,
+            'request_threads': len(self.request_threads)
+        }
+
+
+# =============================================================================
+# EVENT STREAM - Server-sent batch decisions (asyncio, no thread per client)
+# =============================================================================
+
+class StreamEvent:
+    """One published event, encoded once as an SSE frame and shared by all subscribers"""
+    __slots__ = ('id', 'exam_id', 'session_id', 'type', 'frame')
+    
+    def __init__(self, event_id: int, exam_id: Optional[str], session_id: str, event_type: str, data: Dict):
+        self.id = event_id
+        self.exam_id = exam_id
+        self.session_id = session_id
+        self.type = event_type
+        payload = json.dumps(data, separators=(',', ':'))
+        self.frame = f"id: {event_id}\nevent: {event_type}\ndata: {payload}\n\n".encode()
+
+
+class EventSubscriber:
+    """
+    One SSE connection. Only touched by the event loop thread.
+    
+    pending is bounded by EVENT_STREAM_BUFFER. When a slow consumer fills
+    it, queued events are coalesced to the newest one per (session, type).
+    If that is still too many, the oldest are dropped and a `resync` event
+    tells the client to refetch /api/sessions/state.
+    """
+    __slots__ = ('exam_id', 'session_ids', 'types', 'pending', 'ready', 'last_id', 'needs_resync',
+                 'coalesced', 'dropped')
+    
+    def __init__(self, exam_id: Optional[str], session_ids: set, types: set, last_id: int):
+        self.exam_id = exam_id
+        self.session_ids = session_ids
+        self.types = types
+        self.pending: deque = deque()
+        self.ready = asyncio.Event()
+        self.last_id = last_id  # Newest event queued or replayed (skips duplicates)
+        self.needs_resync = False
+        self.coalesced = 0
+        self.dropped = 0
+    
+    def push(self, event: StreamEvent):
+        if event.id <= self.last_id or event.type not in self.types:
+            return
+        self.last_id = event.id
+        if len(self.pending) >= EVENT_STREAM_BUFFER:
+            self._coalesce()
+        self.pending.append(event)
+        self.ready.set()
+    
+    def _coalesce(self):
+        latest = {(event.session_id, event.type): event for event in self.pending}
+        kept = [event for event in self.pending if latest[(event.session_id, event.type)] is event]
+        self.coalesced += len(self.pending) - len(kept)
+        if len(kept) >= EVENT_STREAM_BUFFER:
+            drop = len(kept) - EVENT_STREAM_BUFFER + 1
+            self.dropped += drop
+            kept = kept[drop:]
+            self.needs_resync = True
+        self.pending = deque(kept)
+
+
+class EventChannel:
+    """
+    Worker side of the event hub: one datagram per batch close (and per
+    session owner or exam change) to the hub's Unix socket.
+    
+    Every worker, the hub's own included, publishes through the channel,
+    so a subscriber sees a session's events whichever worker served its
+    requests. A send waits at most EVENT_HUB_SEND_TIMEOUT_SECONDS for room
+    in the hub's queue. While the hub is down (its worker being respawned)
+    or saturated, messages are dropped and counted rather than queued on
+    the request path; the next message that gets through reports the
+    loss, and the hub sends its subscribers a `resync`.
+    """
+    
+    def __init__(self, path: str = EVENT_HUB_SOCKET, enabled: bool = EVENT_STREAM_ENABLED):
+        self.path = path
+        self.lock = threading.Lock()
+        self.sock: Optional[socket.socket] = None
+        if enabled:
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            self.sock.settimeout(EVENT_HUB_SEND_TIMEOUT_SECONDS)
+        self.sent = 0
+        self.dropped = 0
+        self.unreported = 0  # Drops not yet reported to the hub
+        self.error: Optional[str] = None
+    
+    def send(self, message: Dict):
+        if self.sock is None:
+            return
+        with self.lock:
+            lost, self.unreported = self.unreported, 0
+        if lost:
+            message['lost'] = lost
+        try:
+            self.sock.sendto(json.dumps(message, separators=(',', ':')).encode(), self.path)
+        except OSError as e:  # Hub not listening, queue still full after the timeout
+            with self.lock:
+                self.dropped += 1
+                self.unreported += lost + 1
+                self.error = str(e)[:200]
+            return
+        with self.lock:
+            self.sent += 1
+    
+    def get_stats(self) -> Dict:
+        with self.lock:
+            return {
+                'enabled': self.sock is not None,
+                'socket': self.path,
+                'sent': self.sent,
+                'dropped': self.dropped,
+                'last_error': self.error
+            }
+
+
+class EventHub:
+    """
+    Publish/subscribe for the batch decisions of all workers, served as
+    text/event-stream on EVENT_STREAM_PORT by the worker in EVENT_HUB_SLOT.
+    
+    Workers send batch events through an EventChannel to the hub's Unix
+    datagram socket. The hub's asyncio loop receives them, assigns the
+    event id (clock-seeded, so ids keep increasing across restarts),
+    appends to a bounded history for Last-Event-ID resume and fans the
+    event out to the subscribers indexed under its exam and session. The
+    loop serves every connection on one thread (a coroutine per
+    connection), so idle subscribers only cost their socket and a few kB.
+    
+    The same messages carry each session's exam contribution, so the hub
+    also keeps the ExamAggregates of all workers and serves them at
+    EXAM_SUMMARY_PATH (workers forward GET /api/exams/<id>/summary here).
+    They also carry the session's compact state. The hub gives each
+    changed state the next hub-wide version (clock-seeded, like event
+    ids), so versions and `since` cursors are the same whichever worker
+    served the session, and serves them at SESSION_STATE_PATH (workers
+    forward /api/sessions/state here).
+    
+    Exam streams and summaries need an admin token. Session streams need
+    the token of the session's owner (the user on its proctoring
+    requests, reported by the worker serving them) or an admin token.
+    
+    Sessions that sent nothing for member_ttl seconds are dropped: their
+    owner entry and exam contribution go, and exams left without members
+    and without updates for as long are evicted. A session that reports
+    again later rejoins as new, with its cumulative counts added again.
+    """
+    
+    def __init__(self, port: int = EVENT_STREAM_PORT, socket_path: str = EVENT_HUB_SOCKET,
+                 member_ttl: float = EVENT_HUB_MEMBER_TTL_SECONDS):
+        self.port = port
+        self.socket_path = socket_path
+        self.member_ttl = member_ttl
+        self.lock = threading.Lock()
+        self.last_id = time.time_ns() // 1000
+        self.history: deque = deque(maxlen=EVENT_STREAM_HISTORY)
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.thread: Optional[threading.Thread] = None
+        self.by_exam: Dict[str, set] = {}
+        self.by_session: Dict[str, set] = {}
+        self.owners: Dict[str, str] = {}  # session_id -> userId of its proctoring requests
+        self.exams: Dict[str, ExamAggregate] = {}
+        self.members: Dict[str, Tuple[str, str, float, int, Dict[str, int]]] = {}  # sid -> counted contribution
+        self.last_seen: Dict[str, float] = {}  # sid -> time.monotonic() of its last report
+        self.states: Dict[str, Tuple[int, Dict]] = {}  # sid -> (hub version, compact state)
+        self.state_version = time.time_ns() // 1000
+        self.expired = 0
+        self.subscribers = 0
+        self.connections = 0
+        self.received = 0
+        self.malformed = 0
+        self.lost = 0
+        self.published = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.resyncs = 0
+        self.error = None
+    
+    def start(self):
+        ready = threading.Event()
+        
+        def run():
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            server = channel = None
+            try:
+                server = loop.run_until_complete(asyncio.start_server(
+                    self._handle, EVENT_STREAM_HOST, self.port, backlog=EVENT_STREAM_BACKLOG))
+                channel = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+                try:
+                    os.unlink(self.socket_path)  # Left behind by the hub this worker replaces
+                except FileNotFoundError:
+                    pass
+                channel.bind(self.socket_path)
+            except OSError as e:
+                if server is not None:
+                    server.close()
+                if channel is not None:
+                    channel.close()
+                self.error = str(e)[:200]
+                logger.warning(f"Event stream disabled: cannot listen on port {self.port} "
+                               f"/ {self.socket_path} ({self.error})")
+                ready.set()
+                return
+            channel.setblocking(False)
+            loop.add_reader(channel.fileno(), self._receive, channel)
+            loop.call_later(EVENT_HUB_SWEEP_SECONDS, self._sweep)
+            self.loop = loop
+            ready.set()
+            logger.info(f"Event stream listening on port {self.port} (hub socket {self.socket_path})")
+            loop.run_forever()
+            server.close()  # Loop stopped (tests); free the port and socket
+            loop.run_until_complete(server.wait_closed())
+            loop.remove_reader(channel.fileno())
+            channel.close()
+        
+        self.thread = threading.Thread(target=run, name='event-stream', daemon=True)
+        self.thread.start()
+        ready.wait(timeout=5)
+    
+    def _receive(self, channel: socket.socket):
+        """Drain worker messages from the hub socket (event loop thread)"""
+        while True:
+            try:
+                data = channel.recv(EVENT_HUB_MAX_MESSAGE)
+            except (BlockingIOError, InterruptedError):
+                return
+            try:
+                self._apply(json.loads(data))
+            except (ValueError, KeyError, TypeError):
+                self.malformed += 1
+    
+    def _apply(self, message: Dict):
+        """One worker message: session owner, reported losses and events to publish"""
+        sid = message['session_id']
+        exam_id = message.get('exam_id')
+        self.last_seen[sid] = time.monotonic()
+        if message.get('owner') is not None:
+            self.owners.setdefault(sid, message['owner'])
+        if exam_id is not None and 'state' in message:
+            self._place_in_exam(sid, exam_id, message['state'], float(message['credibility']),
+                                int(message['batches']), message['violations'])
+        if message.get('compact') is not None:
+            version = self._store_state(sid, message['compact'])
+        if message.get('lost'):
+            self._resync_all(message['lost'])
+        for event_type, data in message.get('events', ()):
+            if 'version' in data and message.get('compact') is not None:
+                data['version'] = version  # Same version space as /api/sessions/state
+            self.publish(exam_id, sid, event_type, data)
+        self.received += 1
+    
+    def _store_state(self, sid: str, compact: Dict) -> int:
+        """Keep the session's compact state; a changed state gets the next hub-wide version"""
+        state = {key: value for key, value in compact.items() if key != 'version'}
+        current = self.states.get(sid)
+        if current is not None and current[1] == state:
+            return current[0]
+        self.state_version = max(self.state_version + 1, time.time_ns() // 1000)
+        self.states[sid] = (self.state_version, state)
+        return self.state_version
+    
+    def _place_in_exam(self, sid: str, exam_id: str, state: str, credibility: float, batches: int,
+                       violations: Dict[str, int]):
+        """Replace the session's counted contribution with the one just reported"""
+        if state not in BEHAVIOR_CLASSES:
+            raise KeyError(state)
+        violations = {str(violation): int(count) for violation, count in violations.items()}  # Validate first
+        previous = self.members.get(sid)
+        if previous is not None:
+            self.exams[previous[0]].remove(previous[1], previous[2])
+        aggregate = self.exams.get(exam_id)
+        if aggregate is None:
+            aggregate = self.exams[exam_id] = ExamAggregate(exam_id)
+        aggregate.add(state, credibility)
+        
+        # Counts are cumulative per session: add what is new since the last report. A count
+        # that went down was lost by a restarted worker and starts over, so add all of it.
+        if previous is not None and previous[0] == exam_id:
+            old_batches, old_violations = previous[3], previous[4]
+        else:
+            old_batches, old_violations = 0, {}
+        aggregate.record(
+            batches - old_batches if batches >= old_batches else batches,
+            {violation: count - old_violations.get(violation, 0)
+             if count >= old_violations.get(violation, 0) else count
+             for violation, count in violations.items()})
+        self.members[sid] = (exam_id, state, credibility, batches, dict(violations))
+    
+    def _sweep(self):
+        """Periodic expiry on the event loop thread"""
+        try:
+            self.expire_idle(time.monotonic())
+        finally:
+            self.loop.call_later(EVENT_HUB_SWEEP_SECONDS, self._sweep)
+    
+    def expire_idle(self, now: float) -> int:
+        """Drop sessions idle for member_ttl and exams left empty; returns sessions dropped"""
+        cutoff = now - self.member_ttl
+        idle = [sid for sid, seen in self.last_seen.items() if seen < cutoff]
+        for sid in idle:
+            del self.last_seen[sid]
+            self.owners.pop(sid, None)
+            self.states.pop(sid, None)
+            member = self.members.pop(sid, None)
+            if member is not None:
+                self.exams[member[0]].remove(member[1], member[2])
+        wall_cutoff = time.time() - self.member_ttl
+        for exam_id in [exam_id for exam_id, aggregate in self.exams.items()
+                        if aggregate.sessions == 0 and aggregate.updated_at < wall_cutoff]:
+            del self.exams[exam_id]
+        self.expired += len(idle)
+        return len(idle)
+    
+    def _resync_all(self, lost: int):
+        """A worker dropped messages we cannot attribute: every subscriber may have missed events"""
+        self.lost += lost
+        subscribers = set()
+        for index in (self.by_exam, self.by_session):
+            for members in index.values():
+                subscribers |= members
+        for subscriber in subscribers:
+            subscriber.needs_resync = True
+            subscriber.ready.set()
+    
+    def publish(self, exam_id: Optional[str], session_id: str, event_type: str, data: Dict):
+        """Assign the next id, keep the event for resume and fan it out (event loop thread)"""
+        with self.lock:
+            self.last_id += 1
+            event = StreamEvent(self.last_id, exam_id, session_id, event_type, data)
+            self.history.append(event)
+            self.published += 1
+        self._dispatch(event)
+    
+    def _dispatch(self, event: StreamEvent):
+        targets = self.by_session.get(event.session_id, set())
+        if event.exam_id is not None and event.exam_id in self.by_exam:
+            targets = targets | self.by_exam[event.exam_id]
+        for subscriber in targets:
+            subscriber.push(event)
+    
+    def _subscribe(self, subscriber: EventSubscriber, last_event_id: Optional[int]) -> bool:
+        """Index the subscriber; returns True if Last-Event-ID fell out of history (resync)"""
+        with self.lock:
+            self.subscribers += 1
+            self.connections += 1
+            history = list(self.history) if last_event_id is not None else []
+            oldest_available = self.history[0].id if self.history else self.last_id + 1
+            subscriber.last_id = last_event_id if last_event_id is not None else self.last_id
+        if subscriber.exam_id is not None:
+            self.by_exam.setdefault(subscriber.exam_id, set()).add(subscriber)
+        for sid in subscriber.session_ids:
+            self.by_session.setdefault(sid, set()).add(subscriber)
+        if last_event_id is None:
+            return False
+        for event in history:
+            if (event.exam_id == subscriber.exam_id and event.exam_id is not None) or \
+                    event.session_id in subscriber.session_ids:
+                subscriber.push(event)
+        return oldest_available > last_event_id + 1
+    
+    def _unsubscribe(self, subscriber: EventSubscriber):
+        with self.lock:
+            self.subscribers -= 1
+            self.coalesced += subscriber.coalesced
+            self.dropped += subscriber.dropped
+        for index, key in [(self.by_exam, subscriber.exam_id)] + [(self.by_session, sid) for sid in subscriber.session_ids]:
+            members = index.get(key)
+            if members is not None:
+                members.discard(subscriber)
+                if not members:
+                    del index[key]
+    
+    @staticmethod
+    async def _respond(writer: asyncio.StreamWriter, status: str, body: Dict, headers: str = ''):
+        payload = json.dumps(body).encode()
+        writer.write(f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\nContent-Length: {len(payload)}\r\n"
+                     f"{headers}Connection: close\r\n\r\n".encode() + payload)
+        await writer.drain()
+    
+    async def _respond_summary(self, writer: asyncio.StreamWriter, exam_id: str, claims: Dict, cors: str):
+        if claims.get('userType') not in ADMIN_USER_TYPES:
+            await self._respond(writer, '403 Forbidden',
+                                {'success': False, 'error': 'Forbidden - Admin access required'}, cors)
+            return
+        aggregate = self.exams.get(exam_id)
+        if aggregate is None:
+            await self._respond(writer, '404 Not Found',
+                                {'success': False, 'error': f'Exam {exam_id} not found'}, cors)
+            return
+        await self._respond(writer, '200 OK', {'success': True, **aggregate.summary()}, cors)
+    
+    async def _respond_states(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                              headers: Dict[str, str], claims: Dict, cors: str):
+        """Bulk session state; sessions the caller does not own are reported as missing"""
+        try:
+            length = int(headers.get('content-length', 0))
+            if not 0 < length <= SESSION_STATE_HUB_MAX_BODY:
+                raise ValueError(length)
+            body = json.loads(await reader.readexactly(length))
+            session_ids, since = list(body['session_ids']), int(body.get('since', 0))
+        except (ValueError, KeyError, TypeError, asyncio.IncompleteReadError):
+            await self._respond(writer, '400 Bad Request', {'success': False, 'error': 'Invalid request'}, cors)
+            return
+        admin = claims.get('userType') in ADMIN_USER_TYPES
+        found, missing = [], []
+        for sid in session_ids:
+            entry = self.states.get(sid)
+            if entry is None or not (admin or self.owners.get(sid) == claims.get('userId')):
+                missing.append(sid)
+            else:
+                found.append((sid, entry[0], lambda entry=entry: {**entry[1], 'version': entry[0]}))
+        etag = bulk_state_etag(session_ids, since, found)
+        cache = f'ETag: W/"{etag}"\r\nCache-Control: no-cache\r\n'
+        if f'W/"{etag}"' in [tag.strip() for tag in headers.get('if-none-match', '').split(',')]:
+            writer.write(f"HTTP/1.1 304 Not Modified\r\n{cors}{cache}Connection: close\r\n\r\n".encode())
+            await writer.drain()
+            return
+        await self._respond(writer, '200 OK', bulk_state_body(since, found, missing), cors + cache)
+    
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        subscriber = None
+        try:
+            try:
+                head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), EVENT_STREAM_HEADER_TIMEOUT_SECONDS)
+            except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+                return
+            lines = head.decode('latin-1').split('\r\n')
+            method, target = (lines[0].split(' ') + ['', ''])[:2]
+            headers = {}
+            for line in lines[1:]:
+                name, _, value = line.partition(':')
+                headers[name.strip().lower()] = value.strip()
+            url = urllib.parse.urlsplit(target)
+            params = {k: v[-1] for k, v in urllib.parse.parse_qs(url.query).items()}
+            
+            origin = headers.get('origin')
+            cors = (f"Access-Control-Allow-Origin: {origin}\r\nAccess-Control-Allow-Credentials: true\r\n"
+                    if origin in allowed_origins else '')
+            if method == 'OPTIONS':
+                writer.write(f"HTTP/1.1 204 No Content\r\n{cors}Access-Control-Allow-Headers: Authorization, "
+                             f"Last-Event-ID\r\nAccess-Control-Allow-Methods: GET\r\nConnection: close\r\n\r\n".encode())
+                await writer.drain()
+                return
+            summary_path = EXAM_SUMMARY_PATH.fullmatch(url.path)
+            state_request = method == 'POST' and url.path == SESSION_STATE_PATH
+            if not state_request and (method != 'GET' or (url.path != EVENT_STREAM_PATH and summary_path is None)):
+                await self._respond(writer, '404 Not Found', {'success': False, 'error': 'Not found'}, cors)
+                return
+            
+            # Same JWT as require_auth; EventSource cannot set headers, so ?token= is accepted too
+            auth = headers.get('authorization', '').split()
+            token = auth[1] if len(auth) == 2 and auth[0].lower() == 'bearer' else params.get('token')
+            jwt_secret = os.environ.get('JWT_SECRET')
+            try:
+                if not token or not jwt_secret:
+                    raise jwt.InvalidTokenError('missing token')
+                claims = jwt.decode(token, jwt_secret, algorithms=['HS256'])
+            except jwt.InvalidTokenError:
+                await self._respond(writer, '401 Unauthorized', {'success': False, 'error': 'Unauthorized'}, cors)
+                return
+            if summary_path is not None:
+                await self._respond_summary(writer, urllib.parse.unquote(summary_path.group(1)), claims, cors)
+                return
+            if state_request:
+                await self._respond_states(reader, writer, headers, claims, cors)
+                return
+            
+            exam_id = params.get('exam_id') or None
+            session_ids = {sid for sid in params.get('session_ids', '').split(',') if sid}
+            if exam_id is None and not session_ids:
+                await self._respond(writer, '400 Bad Request',
+                                    {'success': False, 'error': 'exam_id or session_ids required'}, cors)
+                return
+            if claims.get('userType') not in ADMIN_USER_TYPES:
+                user_id = claims.get('userId')
+                if exam_id is not None:
+                    error = 'Forbidden - Admin access required for exam streams'
+                elif user_id is None or any(self.owners.get(sid) != user_id for sid in session_ids):
+                    error = 'Forbidden - Session streams are limited to the session owner'
+                else:
+                    error = None
+                if error:
+                    await self._respond(writer, '403 Forbidden', {'success': False, 'error': error}, cors)
+                    return
+            types = set(EVENT_STREAM_TYPES)
+            if params.get('types'):
+                types &= set(params['types'].split(','))
+            if self.subscribers >= EVENT_STREAM_MAX_SUBSCRIBERS:
+                await self._respond(writer, '503 Service Unavailable',
+                                    {'success': False, 'error': 'Too many subscribers'}, cors + 'Retry-After: 5\r\n')
+                return
+            try:
+                last_event_id = int(headers.get('last-event-id') or params.get('last_event_id'))
+            except (TypeError, ValueError):
+                last_event_id = None
+            
+            writer.write(f"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\n"
+                         f"X-Accel-Buffering: no\r\n{cors}Connection: keep-alive\r\n\r\n"
+                         f"retry: {EVENT_STREAM_RETRY_MS}\n\n".encode())
+            subscriber = EventSubscriber(exam_id, session_ids, types, 0)
+            subscriber.needs_resync = self._subscribe(subscriber, last_event_id)
+            # Clients send nothing after the request, so a completed read means they hung up
+            hangup = asyncio.ensure_future(reader.read(1))
+            
+            while True:
+                if not subscriber.pending and not subscriber.needs_resync:
+                    subscriber.ready.clear()
+                    waiter = asyncio.ensure_future(subscriber.ready.wait())
+                    done, _ = await asyncio.wait({waiter, hangup}, timeout=EVENT_STREAM_HEARTBEAT_SECONDS,
+                                                 return_when=asyncio.FIRST_COMPLETED)
+                    if waiter not in done:
+                        waiter.cancel()
+                    if hangup in done:
+                        break
+                    if not done:
+                        writer.write(b': keepalive\n\n')
+                        await writer.drain()
+                        continue
+                chunks = []
+                if subscriber.needs_resync:
+                    subscriber.needs_resync = False
+                    self.resyncs += 1
+                    chunks.append(b'event: resync\ndata: {"reason":"events were dropped; refetch /api/sessions/state"}\n\n')
+                while subscriber.pending:
+                    chunks.append(subscriber.pending.popleft().frame)
+                writer.write(b''.join(chunks))
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            if subscriber is not None:
+                hangup.cancel()
+                self._unsubscribe(subscriber)
+            writer.close()
+    
+    def get_stats(self) -> Dict:
+        with self.lock:
+            return {
+                'listening': self.loop is not None,
+                'port': self.port,
+                'socket': self.socket_path,
+                'error': self.error,
+                'subscribers': self.subscribers,
+                'connections_total': self.connections,
+                'messages_received': self.received,
+                'messages_malformed': self.malformed,
+                'messages_lost': self.lost,
+                'owned_sessions': len(self.owners),
+                'exams': len(self.exams),
+                'exam_sessions': len(self.members),
+                'session_states': len(self.states),
+                'expired_sessions': self.expired,
+                'published': self.published,
+                'last_event_id': self.last_id,
+                'history_size': len(self.history),
+                'coalesced': self.coalesced,
+                'dropped': self.dropped,
+                'resyncs_sent': self.resyncs
+            }
+
+
+# =============================================================================
+# TRAFFIC CAPTURE - Fixed-record per-frame recordings for offline replay
+# =============================================================================
+
+# Record flags
+CAPTURE_FLAG_PHONE = 0x01
+CAPTURE_FLAG_GAZE_AWAY = 0x02
+CAPTURE_FLAG_BATCH_CLOSED = 0x04
+CAPTURE_FLAG_RESET = 0x08  # Session reset here; no frame data
+CAPTURE_FLAG_MULTI_FACE = 0x10
+CAPTURE_FLAG_NO_FACE = 0x20
+CAPTURE_FLAG_CAMERA_UNUSABLE = 0x40
+
+# Batch-close index (<capture>.idx): record number of each batch-closing frame
+CAPTURE_INDEX_DTYPE = np.dtype([('record', '<u8'), ('timestamp', '<f8'), ('batch_number', '<u4')])
+
+
+def capture_record_dtype(thumbnail_width: int = CAPTURE_THUMBNAIL_WIDTH,
+                         thumbnail_height: int = CAPTURE_THUMBNAIL_HEIGHT,
+                         max_faces: int = CAPTURE_MAX_FACES) -> np.dtype:
+    """
+    One frame as the pipeline saw it: raw detections (before tracking),
+    classifier output, quality and flags, the decision of the batch it
+    closed (if any) and a grayscale thumbnail. Class fields are
+    BEHAVIOR_CLASSES ids (-1 = none), quality is 1 + QUALITY_REASONS index
+    (0 = usable).
+    """
+    return np.dtype([
+        ('timestamp', '<f8'), ('frame_hash', '<u8'),
+        ('boxes', '<i4', (max_faces, 4)), ('detection_confidence', '<f4', (max_faces,)),
+        ('pose', '<f4', (max_faces, 2)),  # yaw, pitch; NaN = no keypoints
+        ('probabilities', '<f4', (len(BEHAVIOR_CLASSES),)),
+        ('classification_confidence', '<f4'), ('classification_weight', '<f4'),
+        ('credibility', '<f4'),  # After the batch this frame closed
+        ('detections', 'u1'), ('face_count', 'u1'), ('classification', 'i1'), ('quality', 'u1'),
+        ('flags', 'u1'), ('batch_classification', 'i1'), ('batch_face_count', 'u1'), ('confirmed_state', 'i1'),
+        ('thumbnail', 'u1', (thumbnail_height, thumbnail_width))
+    ])
+
+
+def read_capture_header(path: str) -> Dict:
+    with open(path, 'rb') as f:
+        preamble = f.read(CAPTURE_HEADER_BYTES)
+    if preamble[:len(CAPTURE_MAGIC)] != CAPTURE_MAGIC:
+        raise ValueError(f'{path} is not a capture file')
+    header_length = struct.unpack_from('<I', preamble, len(CAPTURE_MAGIC))[0]
+    return json.loads(preamble[len(CAPTURE_MAGIC) + 4:len(CAPTURE_MAGIC) + 4 + header_length])
+
+
+def load_capture(path: str) -> Tuple[Dict, np.ndarray, np.ndarray]:
+    """
+    Memory-map a capture: (header, records, batch index). A partial record
+    at the end (capture still open, or the worker died) is ignored.
+    """
+    header = read_capture_header(path)
+    dtype = capture_record_dtype(header['thumbnail_width'], header['thumbnail_height'], header['max_faces'])
+    if dtype.itemsize != header['record_size']:
+        raise ValueError(f'{path}: record size {header["record_size"]} does not match this version ({dtype.itemsize})')
+    count = (os.path.getsize(path) - CAPTURE_HEADER_BYTES) // dtype.itemsize
+    records = (np.memmap(path, dtype=dtype, mode='r', offset=CAPTURE_HEADER_BYTES, shape=(count,))
+               if count else np.zeros(0, dtype=dtype))
+    index_path = path + '.idx'
+    index_count = os.path.getsize(index_path) // CAPTURE_INDEX_DTYPE.itemsize if os.path.exists(index_path) else 0
+    index = (np.memmap(index_path, dtype=CAPTURE_INDEX_DTYPE, mode='r', shape=(index_count,))
+             if index_count else np.zeros(0, dtype=CAPTURE_INDEX_DTYPE))
+    return header, records, index[index['record'] < count]
+
+
+class TrafficCapture:
+    """
+    Opt-in recording of one session's traffic, for reproducing field issues
+    and replaying real load without raw video.
+    
+    Every frame appends one fixed-size record (capture_record_dtype) to
+    `path`, after a CAPTURE_HEADER_BYTES header. Batch-closing frames are
+    also appended to `path`.idx. Fixed records mean the file can be
+    memory-mapped and sliced without parsing (load_capture). Raw
+    detections are handed over by detect_and_track and consumed in frame
+    order when the frame's sample reaches the batch processor. The capture
+    stops itself after max_frames.
+    """
+    
+    def __init__(self, session_id: str, path: str, max_frames: int = CAPTURE_MAX_FRAMES,
+                 request_id: Optional[str] = None):
+        self.session_id = session_id
+        self.request_id = request_id  # CaptureRequests entry this capture belongs to
+        self.path = path
+        self.max_frames = max_frames
+        self.dtype = capture_record_dtype()
+        self.scratch = np.zeros(1, dtype=self.dtype)
+        self.detections = deque()  # (boxes, confidences, poses) of frames not yet recorded
+        self.frames = 0
+        self.batches = 0
+        self.started_at = time.time()
+        self.closed = False
+        self.lock = threading.Lock()
+        
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        header = json.dumps({
+            'session_id': session_id,
+            'request_id': request_id,
+            'started_at': self.started_at,
+            'worker_slot': worker_slot,
+            'record_size': self.dtype.itemsize,
+            'thumbnail_width': CAPTURE_THUMBNAIL_WIDTH,
+            'thumbnail_height': CAPTURE_THUMBNAIL_HEIGHT,
+            'max_faces': CAPTURE_MAX_FACES,
+            'classes': list(BEHAVIOR_CLASSES),
+            'quality_reasons': list(QUALITY_REASONS),
+            'lazy_classification': LAZY_CLASSIFICATION_ENABLED
+        }).encode()
+        preamble = CAPTURE_MAGIC + struct.pack('<I', len(header)) + header
+        if len(preamble) > CAPTURE_HEADER_BYTES:
+            raise ValueError('Capture header too large')
+        self.file = open(path, 'wb')
+        self.file.write(preamble.ljust(CAPTURE_HEADER_BYTES, b'\0'))
+        self.file.flush()  # Header visible to list() on other workers right away
+        self.index_file = open(path + '.idx', 'wb')
+        logger.info(f"Traffic capture started for session {session_id}: {path}")
+    
+    def observe_detections(self, boxes, confidences, poses: Optional[np.ndarray]):
+        """Raw detector output of the next frame to be recorded"""
+        if not self.closed:
+            self.detections.append((boxes, confidences, poses))
+    
+    def record_frame(self, frame: np.ndarray, sample: FrameSample,
+                     batch_result: Optional[BatchAnalysisResult], state: Optional[Dict]):
+        """Append the frame's record; state is the processor state after a batch close"""
+        with self.lock:
+            if self.closed:
+                return
+            self.scratch.fill(0)
+            record = self.scratch[0]
+            record['timestamp'] = sample.timestamp
+            record['frame_hash'] = int(sample.frame_hash[:16], 16) if sample.frame_hash else 0
+            record['pose'] = np.nan
+            if sample.frame_quality is None and self.detections:
+                boxes, confidences, poses = self.detections.popleft()
+                kept = min(len(boxes), CAPTURE_MAX_FACES)
+                record['detections'] = kept
+                if kept:
+                    record['boxes'][:kept] = np.asarray(boxes[:kept], dtype=np.int32)
+                    record['detection_confidence'][:kept] = confidences[:kept]
+                    if poses is not None:
+                        record['pose'][:kept] = poses[:kept]
+            record['face_count'] = min(sample.face_count, 255)
+            record['classification'] = BEHAVIOR_CLASS_IDS.get(sample.classification, -1)
+            record['probabilities'] = [sample.probabilities.get(name, 0.0) for name in BEHAVIOR_CLASSES]
+            record['classification_confidence'] = sample.classification_confidence
+            record['classification_weight'] = sample.classification_weight
+            record['quality'] = QUALITY_REASONS.index(sample.frame_quality) + 1 if sample.frame_quality else 0
+            flags = (CAPTURE_FLAG_PHONE if sample.phone_detected else 0) | \
+                    (CAPTURE_FLAG_GAZE_AWAY if sample.gaze_away else 0)
+            record['batch_classification'] = -1
+            record['confirmed_state'] = -1
+            if batch_result is not None:
+                flags |= CAPTURE_FLAG_BATCH_CLOSED | \
+                    (CAPTURE_FLAG_MULTI_FACE if batch_result.multi_face_confirmed else 0) | \
+                    (CAPTURE_FLAG_NO_FACE if batch_result.no_face_confirmed else 0) | \
+                    (CAPTURE_FLAG_CAMERA_UNUSABLE if batch_result.camera_unusable_confirmed else 0)
+                record['batch_classification'] = BEHAVIOR_CLASS_IDS[batch_result.dominant_classification]
+                record['batch_face_count'] = min(batch_result.dominant_face_count, 255)
+                record['confirmed_state'] = BEHAVIOR_CLASS_IDS[state['confirmed_state']]
+                record['credibility'] = state['credibility_score']
+            record['flags'] = flags
+            # Decimate to ~2x the thumbnail first: area-resampling a full frame costs ~8x more
+            step = max(1, min(frame.shape[0] // (2 * CAPTURE_THUMBNAIL_HEIGHT),
+                              frame.shape[1] // (2 * CAPTURE_THUMBNAIL_WIDTH)))
+            small = np.ascontiguousarray(frame[::step, ::step])
+            if small.ndim == 3:
+                small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+            record['thumbnail'] = cv2.resize(small, (CAPTURE_THUMBNAIL_WIDTH, CAPTURE_THUMBNAIL_HEIGHT),
+                                             interpolation=cv2.INTER_AREA)
+            self._append(batch_result is not None, state)
+    
+    def record_reset(self):
+        """Mark a session reset, so replay resets its tracker and processor at the same point"""
+        with self.lock:
+            if self.closed:
+                return
+            self.scratch.fill(0)
+            self.scratch[0]['timestamp'] = time.time()
+            self.scratch[0]['flags'] = CAPTURE_FLAG_RESET
+            self.scratch[0]['classification'] = -1
+            self.scratch[0]['batch_classification'] = -1
+            self.scratch[0]['confirmed_state'] = -1
+            self.detections.clear()
+            self._append(False, None)
+    
+    def _append(self, batch_closed: bool, state: Optional[Dict]):
+        """Write the scratch record (holds lock); flushed at each batch close"""
+        self.file.write(self.scratch.tobytes())
+        if batch_closed:
+            entry = np.array([(self.frames, self.scratch[0]['timestamp'], state['batch_count'])],
+                             dtype=CAPTURE_INDEX_DTYPE)
+            self.index_file.write(entry.tobytes())
+            self.batches += 1
+            self.file.flush()
+            self.index_file.flush()
+        self.frames += 1
+        if self.frames >= self.max_frames:
+            logger.info(f"Traffic capture for session {self.session_id} reached {self.max_frames} frames")
+            self._close()
+    
+    def close(self):
+        with self.lock:
+            self._close()
+    
+    def _close(self):
+        if not self.closed:
+            self.closed = True
+            self.detections.clear()
+            self.file.close()
+            self.index_file.close()
+    
+    def get_stats(self) -> Dict:
+        return {
+            'session_id': self.session_id,
+            'request_id': self.request_id,
+            'path': self.path,
+            'frames': self.frames,
+            'batches': self.batches,
+            'max_frames': self.max_frames,
+            'bytes': CAPTURE_HEADER_BYTES + self.frames * self.dtype.itemsize,
+            'record_bytes': self.dtype.itemsize,
+            'started_at_ms': int(self.started_at * 1000),
+            'active': not self.closed
+        }
+
+
+def capture_frame(session: Dict, frame: np.ndarray, sample: FrameSample,
+                  batch_result: Optional[BatchAnalysisResult], state: Optional[Dict]):
+    """Record the frame if the session is being captured"""
+    capture = session['capture']
+    if capture is not None:
+        try:
+            capture.record_frame(frame, sample, batch_result, state)
+        except OSError as e:
+            logger.error(f"Traffic capture for session {capture.session_id} failed, stopping: {e}")
+            capture.close()  # Kept on the session, so the watch does not reopen it
+
+
+class CaptureRequests:
+    """
+    The set of sessions to capture, shared by all gunicorn workers as one
+    file per session in CAPTURE_DIR/requests.
+    
+    POST/DELETE on any worker create (O_EXCL, so a session is captured once)
+    or remove the file; every worker's watch() thread then opens or closes
+    a TrafficCapture for the requested sessions it serves. A session moved
+    between workers (restart, reconnect) is recorded into one file per
+    worker; list() reads them all from CAPTURE_DIR.
+    """
+    
+    def __init__(self, root: str = CAPTURE_DIR):
+        self.root = root
+        self.requests_dir = os.path.join(root, 'requests')
+        self.opened: set = set()  # Session ids with a capture opened by this worker
+    
+    def _path(self, session_id: str) -> str:
+        return os.path.join(self.requests_dir, hashlib.sha1(session_id.encode()).hexdigest()[:20] + '.json')
+    
+    def add(self, session_id: str, max_frames: int) -> Optional[Dict]:
+        """New request for the session, or None if it is already being captured"""
+        os.makedirs(self.requests_dir, exist_ok=True)
+        entry = {'session_id': session_id, 'max_frames': max_frames,
+                 'request_id': os.urandom(6).hex(), 'requested_at': time.time()}
+        try:
+            fd = os.open(self._path(session_id), os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+        except FileExistsError:
+            return None
+        with os.fdopen(fd, 'w') as f:
+            json.dump(entry, f)
+        return entry
+    
+    def remove(self, session_id: str) -> bool:
+        try:
+            os.remove(self._path(session_id))
+            return True
+        except FileNotFoundError:
+            return False
+    
+    def get(self, session_id: str) -> Optional[Dict]:
+        try:
+            with open(self._path(session_id)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+    
+    def all(self) -> Dict[str, Dict]:
+        entries = {}
+        try:
+            names = os.listdir(self.requests_dir)
+        except FileNotFoundError:
+            return entries
+        for name in names:
+            try:
+                with open(os.path.join(self.requests_dir, name)) as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                continue  # Being written or removed; picked up on the next poll
+            entries[entry['session_id']] = entry
+        return entries
+    
+    def sync(self, manager: 'SessionManager'):
+        """Open captures for requested sessions served here, close unrequested ones"""
+        entries = self.all()
+        for session_id in set(entries) | self.opened:
+            session = manager.find_session(session_id)
+            if session is None:
+                continue  # Not served by this worker (yet)
+            entry = entries.get(session_id)
+            capture = session['capture']
+            if entry is None:
+                self.opened.discard(session_id)
+                if capture is not None and not capture.closed:
+                    capture.close()
+                    logger.info(f"Traffic capture stopped for session {session_id}: {capture.frames} frames")
+                continue
+            if capture is not None and capture.request_id == entry['request_id']:
+                continue  # Open, or finished after max_frames
+            stamp = time.strftime('%Y%m%dT%H%M%S', time.localtime(entry['requested_at']))
+            name = f"{re.sub(r'[^A-Za-z0-9_.-]', '_', session_id)[:64]}-{stamp}-{entry['request_id']}-w{worker_slot or 0}"
+            try:
+                new_capture = TrafficCapture(session_id, os.path.join(self.root, name + '.evcap'),
+                                             entry['max_frames'], entry['request_id'])
+            except OSError as e:
+                logger.error(f"Could not open capture file for session {session_id}: {e}")
+                continue
+            with manager.lock:
+                session['capture'] = new_capture
+            if capture is not None:
+                capture.close()
+            self.opened.add(session_id)
+    
+    def watch(self, manager: 'SessionManager', interval: float = CAPTURE_POLL_SECONDS) -> threading.Thread:
+        """Per-worker thread: apply capture starts and stops made on any worker"""
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.sync(manager)
+                except Exception as e:
+                    logger.warning(f"Capture request sync error: {e}")
+        
+        thread = threading.Thread(target=run, name='capture-watch', daemon=True)
+        thread.start()
+        return thread
+    
+    def list(self) -> List[Dict]:
+        """Every capture file in CAPTURE_DIR, from all workers"""
+        requested = {entry['request_id'] for entry in self.all().values()}
+        captures = []
+        try:
+            names = sorted(os.listdir(self.root))
+        except FileNotFoundError:
+            return captures
+        for name in names:
+            if not name.endswith('.evcap'):
+                continue
+            path = os.path.join(self.root, name)
+            try:
+                header = read_capture_header(path)
+                frames = (os.path.getsize(path) - CAPTURE_HEADER_BYTES) // header['record_size']
+                index_path = path + '.idx'
+                batches = os.path.getsize(index_path) // CAPTURE_INDEX_DTYPE.itemsize if os.path.exists(index_path) else 0
+            except (OSError, ValueError, KeyError):
+                continue
+            captures.append({
+                'session_id': header['session_id'],
+                'request_id': header.get('request_id'),
+                'worker_slot': header.get('worker_slot'),
+                'path': path,
+                'frames': max(frames, 0),
+                'batches': batches,
+                'bytes': os.path.getsize(path),
+                'record_bytes': header['record_size'],
+                'started_at_ms': int(header['started_at'] * 1000),
+                'requested': header.get('request_id') in requested  # Request still open
+            })
+        return captures
+
+
+# =============================================================================
+# RESULT CACHE - Content-addressed LRU for stateless image endpoints
+# =============================================================================
+
+class ResultCache:
+    """
+    Bounded, memory-budgeted LRU cache of per-image results.
+    
+    Keys are (namespace, model_version, digest of the encoded image bytes), so
+    identical uploads skip decode/detection/classification entirely and a
+    model change can never serve stale results. invalidate() drops entries
+    explicitly when the active model changes.
+    """
+    
+    def __init__(self, max_entries: int = RESULT_CACHE_MAX_ENTRIES,
+                 max_bytes: int = RESULT_CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries: 'OrderedDict[Tuple[str, str, bytes], Tuple[object, int]]' = OrderedDict()
+        self.total_bytes = 0
+        self.hits: Dict[str, int] = {}
+        self.misses: Dict[str, int] = {}
+        self.evictions = 0
+        self.invalidations = 0
+        self.lock = threading.Lock()
+    
+    @staticmethod
+    def digest(encoded: str) -> bytes:
+        """Fast content hash of the encoded (base64) image payload"""
+        if ',' in encoded[:64]:
+            encoded = encoded.split(',', 1)[1]
+        return hashlib.blake2b(encoded.encode('ascii', 'ignore'), digest_size=16).digest()
+    
+    def get(self, namespace: str, version: str, digest: bytes):
+        key = (namespace, version, digest)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses[namespace] = self.misses.get(namespace, 0) + 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits[namespace] = self.hits.get(namespace, 0) + 1
+            return entry[0]
+    
+    def put(self, namespace: str, version: str, digest: bytes, value, size: int):
+        """Store a result; size is the caller's estimate of its footprint in bytes"""
+        key = (namespace, version, digest)
+        size += len(digest) + 200  # Key, tuple and OrderedDict node overhead
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.total_bytes -= old[1]
+            self.entries[key] = (value, size)
+            self.total_bytes += size
+            while len(self.entries) > self.max_entries or self.total_bytes > self.max_bytes:
+                _, (_, evicted_size) = self.entries.popitem(last=False)
+                self.total_bytes -= evicted_size
+                self.evictions += 1
+    
+    def invalidate(self, namespace: Optional[str] = None):
+        """Drop all entries (or one namespace's), e.g. after a model change"""
+        with self.lock:
+            if namespace is None:
+                self.entries.clear()
+                self.total_bytes = 0
+            else:
+                for key in [k for k in self.entries if k[0] == namespace]:
+                    self.total_bytes -= self.entries.pop(key)[1]
+            self.invalidations += 1
+    
+    def get_stats(self) -> Dict:
+        with self.lock:
+            namespaces = set(self.hits) | set(self.misses)
+            return {
+                'entries': len(self.entries),
+                'bytes': self.total_bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'namespaces': {
+                    ns: {
+                        'hits': self.hits.get(ns, 0),
+                        'misses': self.misses.get(ns, 0),
+                        'hit_rate': float(round(self.hits.get(ns, 0) /
+                                                max(1, self.hits.get(ns, 0) + self.misses.get(ns, 0)), 3))
+                    }
+                    for ns in sorted(namespaces)
+                }
+            }
+
+
+# =============================================================================
+# THREAD BUDGET MANAGER - Coordinates OpenCV / TensorFlow / MediaPipe threads
+# =============================================================================
+
+def parse_cpu_list(spec: str) -> List[int]:
+    """Parse a CPU list like "0-3,6" into [0, 1, 2, 3, 6]"""
+    cpus = []
+    for part in spec.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '-' in part:
+            lo, hi = part.split('-', 1)
+            cpus.extend(range(int(lo), int(hi) + 1))
+        else:
+            cpus.append(int(part))
+    return cpus
+
+
+class ThreadBudget:
+    """
+    Splits a CPU core budget between native thread pools and request workers.
+    
+    By default every library sizes itself to all cores and is then used from
+    several Flask threads at once, oversubscribing the node. This component:
+    - OpenCV: cv2.setNumThreads (also sizes the frame-decode pool)
+    - TensorFlow: intra-op / inter-op pools (env + tf.config.threading)
+    - MediaPipe: number of pooled FaceDetection graphs (concurrent detections)
+    - Request workers: the remainder; sizes load/admission capacity
+    - Optionally pins the process to the budgeted CPUs
+    
+    apply() must run before the TF runtime initializes (i.e. before model load).
+    """
+    
+    POOLS = ('opencv', 'tf_intra', 'tf_inter', 'mediapipe')
+    
+    def __init__(self, cores: int = THREAD_BUDGET_CORES, split: str = THREAD_BUDGET_SPLIT,
+                 pin_affinity: bool = THREAD_BUDGET_PIN_AFFINITY, cpus: str = THREAD_BUDGET_CPUS):
+        self.cores = max(1, cores)
+        self.pin_affinity = pin_affinity
+        self.cpus = parse_cpu_list(cpus) if cpus else list(range(self.cores))
+        
+        # Defaults: ~1/8 each to OpenCV and MediaPipe, ~1/4 to TF intra-op
+        self.allocation = {
+            'opencv': max(1, self.cores // 8),
+            'tf_intra': max(1, self.cores // 4),
+            'tf_inter': 1 if self.cores < 8 else 2,
+            'mediapipe': max(1, self.cores // 8),
+        }
+        for item in split.split(','):
+            if '=' in item:
+                key, value = item.split('=', 1)
+                key = key.strip()
+                if key in self.POOLS or key == 'workers':
+                    self.allocation[key] = max(1, int(value))
+        if 'workers' not in self.allocation:
+            used = sum(self.allocation[k] for k in self.POOLS)
+            self.allocation['workers'] = max(1, self.cores - used)
+        
+        self.applied: Dict[str, object] = {}
+    
+    @property
+    def opencv(self) -> int:
+        return self.allocation['opencv']
+    
+    @property
+    def mediapipe(self) -> int:
+        return self.allocation['mediapipe']
+    
+    @property
+    def workers(self) -> int:
+        return self.allocation['workers']
+    
+    def apply(self):
+        """Apply the budget to every library (call once at startup)"""
+        # Env vars read by TF, OpenMP/MKL and TFLite (MediaPipe) at runtime init
+        os.environ['TF_NUM_INTRAOP_THREADS'] = str(self.allocation['tf_intra'])
+        os.environ['TF_NUM_INTEROP_THREADS'] = str(self.allocation['tf_inter'])
+        os.environ.setdefault('OMP_NUM_THREADS', str(self.allocation['tf_intra']))
+        
+        cv2.setNumThreads(self.opencv)
+        self.applied['opencv'] = cv2.getNumThreads()
+        
+        if TENSORFLOW_AVAILABLE:
+            try:
+                import tensorflow as tf
+                tf.config.threading.set_intra_op_parallelism_threads(self.allocation['tf_intra'])
+                tf.config.threading.set_inter_op_parallelism_threads(self.allocation['tf_inter'])
+            except RuntimeError as e:
+                # TF runtime already initialized - pools keep their sizes
+                logger.warning(f"TensorFlow thread budget not applied: {str(e)[:200]}")
+            try:
+                self.applied['tf_intra'] = tf.config.threading.get_intra_op_parallelism_threads()
+                self.applied['tf_inter'] = tf.config.threading.get_inter_op_parallelism_threads()
+            except Exception:
+                pass
+        
+        self.applied['mediapipe'] = self.mediapipe
+        self.applied['workers'] = self.workers
+        
+        if self.pin_affinity and hasattr(os, 'sched_setaffinity'):
+            try:
+                os.sched_setaffinity(0, set(self.cpus))
+            except OSError as e:
+                logger.warning(f"CPU affinity not applied: {e}")
+        
+        logger.info(f"Thread budget applied: cores={self.cores} allocation={self.allocation}")
+    
+    def describe(self) -> Dict:
+        """Effective configuration for the introspection endpoint"""
+        affinity = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else None
+        return {
+            'cores': self.cores,
+            'allocation': dict(self.allocation),
+            'applied': dict(self.applied),
+            'pin_affinity': self.pin_affinity,
+            'cpu_affinity': affinity,
+            'opencv_threads': cv2.getNumThreads(),
+            'env': {k: os.environ.get(k) for k in
+                    ('TF_NUM_INTRAOP_THREADS', 'TF_NUM_INTEROP_THREADS', 'OMP_NUM_THREADS')}
+        }
+
+
+# =============================================================================
+# CLASSICAL-ML ENSEMBLE ENGINE
+# =============================================================================
+
+class EnsembleEngine:
+    """
+    KNN / Naive Bayes / Decision Tree / SVM soft-voting ensemble over
+    per-frame pipeline features (ENSEMBLE_FEATURES, see ML_MODELS_EXPLANATION.md).
+    
+    - Rows submitted by concurrent requests (any session) are coalesced by
+      one scoring thread into a preallocated feature matrix and scored with
+      ONE predict_proba call per model
+    - KNN uses a KD-tree index rather than brute-force search
+    - Fitted models are stored uncompressed with joblib and loaded with
+      mmap_mode='c': the KD-tree, support vectors and tree arrays are paged
+      in from the file (and shared between worker processes) instead of
+      being unpickled into each process. Copy-on-write rather than 'r'
+      because libsvm insists on writable buffers; nothing writes to them
+    """
+    
+    MODEL_NAMES = ('knn', 'naive_bayes', 'decision_tree', 'svm')
+    
+    def __init__(self, path: str = ENSEMBLE_MODEL_PATH, max_rows: int = ENSEMBLE_MAX_BATCH_ROWS,
+                 window_ms: float = ENSEMBLE_BATCH_WINDOW_MS):
+        self.path = path
+        self.max_rows = max_rows
+        self.window_seconds = window_ms / 1000.0
+        self.models: Optional[Dict] = None
+        self.matrix = np.zeros((max_rows, len(ENSEMBLE_FEATURES)), dtype=np.float32)
+        self.pending: deque = deque()  # (rows, Future)
+        self.cond = threading.Condition()
+        self.worker: Optional[threading.Thread] = None
+        
+        # Stats
+        self.batches = 0
+        self.rows_scored = 0
+        self.largest_batch = 0
+        self.predict_seconds = 0.0
+    
+    @property
+    def ready(self) -> bool:
+        return self.models is not None
+    
+    @staticmethod
+    def feature_row(face_count: int, movement: float, phone_prob: float,
+                    probabilities: Dict[str, float], gaze_away: bool) -> np.ndarray:
+        """One ENSEMBLE_FEATURES row from values the pipeline already computed"""
+        return np.array([face_count, movement, phone_prob,
+                         probabilities.get('normal', 0.0), probabilities.get('suspicious', 0.0),
+                         probabilities.get('very_suspicious', 0.0), float(gaze_away)], dtype=np.float32)
+    
+    @staticmethod
+    def synthetic_dataset(samples: int = ENSEMBLE_SYNTHETIC_SAMPLES,
+                          seed: int = 42) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Bootstrap training data (50% normal, 25% suspicious, 25% very suspicious):
+        steady single face / gaze away + movement / extra or missing faces + phone.
+        """
+        rng = np.random.default_rng(seed)
+        counts = (samples // 2, samples // 4, samples - samples // 2 - samples // 4)
+        profiles = (
+            # face counts (p0, p1, p2), movement mean, phone range, CNN alpha, gaze-away rate
+            ((0.02, 0.96, 0.02), 3.0, (0.0, 0.3), (8, 2, 1), 0.1),
+            ((0.2, 0.75, 0.05), 12.0, (0.2, 0.6), (2, 6, 2), 0.6),
+            ((0.2, 0.3, 0.5), 20.0, (0.5, 1.0), (1, 2, 6), 0.5),
+        )
+        X, y = [], []
+        for label, (n, (face_p, movement, phone, alpha, gaze)) in enumerate(zip(counts, profiles)):
+            block = np.empty((n, len(ENSEMBLE_FEATURES)), dtype=np.float32)
+            block[:, 0] = rng.choice(3, size=n, p=face_p)
+            block[:, 1] = np.abs(rng.normal(movement, movement / 2, size=n))
+            block[:, 2] = rng.uniform(*phone, size=n)
+            block[:, 3:6] = rng.dirichlet(alpha, size=n)
+            block[:, 6] = rng.random(n) < gaze
+            X.append(block)
+            y.append(np.full(n, label))
+        return np.concatenate(X), np.concatenate(y)
+    
+    @staticmethod
+    def fit(X: np.ndarray, y: np.ndarray) -> Dict:
+        """Fit the scaler and the four base models"""
+        scaler = StandardScaler().fit(X)
+        scaled = scaler.transform(X)
+        models = {
+            'scaler': scaler,
+            'knn': KNeighborsClassifier(n_neighbors=5, weights='distance', algorithm='kd_tree'),
+            'naive_bayes': GaussianNB(),
+            'decision_tree': DecisionTreeClassifier(max_depth=10, random_state=42),
+            'svm': SVC(kernel='rbf', probability=True, random_state=42),
+        }
+        for name in EnsembleEngine.MODEL_NAMES:
+            models[name].fit(scaled, y)
+        return models
+    
+    def save(self, models: Dict):
+        """Uncompressed joblib dump (required for memory-mapped loading)"""
+        tmp_path = f"{self.path}.tmp"
+        joblib.dump(models, tmp_path, compress=0)
+        os.replace(tmp_path, self.path)
+    
+    def load(self):
+        """
+        Memory-map fitted models. Without an artifact the engine stays not
+        ready (classification falls back to the CNN), unless
+        ENSEMBLE_SYNTHETIC_BOOTSTRAP asks for a synthetic dev/test fit.
+        """
+        if not os.path.exists(self.path):
+            if not ENSEMBLE_SYNTHETIC_BOOTSTRAP:
+                logger.warning(f"No fitted ensemble at {self.path} - ensemble disabled, using the CNN")
+                return
+            X, y = self.synthetic_dataset()
+            self.save(self.fit(X, y))
+            logger.warning(f"Ensemble models fitted on {len(y)} SYNTHETIC samples (dev/test only) -> {self.path}")
+        self.models = joblib.load(self.path, mmap_mode='c')
+        logger.info(f"✅ Loaded ensemble models ({', '.join(self.MODEL_NAMES)}) from {self.path}")
+    
+    def predict_matrix(self, X: np.ndarray) -> np.ndarray:
+        """Soft vote: mean of the base models' (N, 3) class probabilities"""
+        scaled = self.models['scaler'].transform(X)
+        return np.mean([self.models[name].predict_proba(scaled) for name in self.MODEL_NAMES], axis=0)
+    
+    def score(self, rows: np.ndarray) -> np.ndarray:
+        """
+        (N, n_features) rows -> (N, 3) ensemble probabilities.
+        Blocks until the scoring thread has run the batch containing them.
+        """
+        future: Future = Future()
+        with self.cond:
+            if self.worker is None or not self.worker.is_alive():
+                # Started lazily so a forked worker process gets its own thread
+                self.worker = threading.Thread(target=self._run, name='ensemble-scorer', daemon=True)
+                self.worker.start()
+            self.pending.append((np.asarray(rows, dtype=np.float32), future))
+            self.cond.notify()
+        with trace_span('ensemble.score', rows=len(rows)):  # Coalescing window + queue wait + predict
+            return future.result()
+    
+    def classify(self, rows: np.ndarray) -> List[Tuple[str, float, Dict[str, float]]]:
+        """score() converted to (classification, confidence, probabilities) per row"""
+        results = []
+        for row in self.score(rows):
+            probabilities = {BEHAVIOR_CLASSES[i]: float(row[i]) for i in range(len(BEHAVIOR_CLASSES))}
+            predicted_class = BEHAVIOR_CLASSES[int(np.argmax(row))]
+            results.append((predicted_class, probabilities[predicted_class], probabilities))
+        return results
+    
+    def _run(self):
+        """Scoring thread: coalesce pending rows, one predict_proba per model"""
+        while True:
+            with self.cond:
+                while not self.pending:
+                    self.cond.wait()
+            time.sleep(self.window_seconds)  # Let concurrent requests join the batch
+            
+            with self.cond:
+                taken, n = [], 0
+                while self.pending and n + len(self.pending[0][0]) <= self.max_rows:
+                    rows, future = self.pending.popleft()
+                    self.matrix[n:n + len(rows)] = rows
+                    taken.append((n, len(rows), future))
+                    n += len(rows)
+                if not taken:
+                    # Single submission larger than the matrix: score it directly
+                    rows, future = self.pending.popleft()
+                    taken, n = [(0, len(rows), future)], len(rows)
+            
+            X = self.matrix[:n] if n <= self.max_rows else rows
+            started = time.perf_counter()
+            try:
+                probabilities = self.predict_matrix(X)
+            except Exception as e:
+                for _, _, future in taken:
+                    future.set_exception(e)
+                continue
+            elapsed = time.perf_counter() - started
+            
+            for offset, count, future in taken:
+                future.set_result(probabilities[offset:offset + count])
+            with self.cond:
+                self.batches += 1
+                self.rows_scored += n
+                self.largest_batch = max(self.largest_batch, n)
+                self.predict_seconds += elapsed
+    
+    def get_stats(self) -> Dict:
+        with self.cond:
+            return {
+                'enabled': ENABLE_ENSEMBLE_MODELS,
+                'ready': self.ready,
+                'models': list(self.MODEL_NAMES),
+                'features': list(ENSEMBLE_FEATURES),
+                'path': self.path,
+                'artifact_present': os.path.exists(self.path),
+                'batches': self.batches,
+                'rows_scored': self.rows_scored,
+                'mean_rows_per_batch': round(self.rows_scored / self.batches, 2) if self.batches else 0.0,
+                'largest_batch': self.largest_batch,
+                'mean_predict_ms': round(1000 * self.predict_seconds / self.batches, 3) if self.batches else 0.0,
+                'pending': len(self.pending)
+            }
+
+
+# =============================================================================
+# MODEL REGISTRY - Versioned behaviour models with hot swap
+# =============================================================================
+
+def load_behavior_model(model_path: str):
+    """Load a Keras behaviour model, tolerating artifacts saved by newer Keras versions"""
+    import tensorflow as tf
+    from tensorflow.keras.layers import InputLayer
+    
+    class CompatibleInputLayer(InputLayer):
+        def __init__(self, *args, **kwargs):
+            if 'batch_shape' in kwargs:
+                batch_shape = kwargs.pop('batch_shape')
+                if batch_shape and len(batch_shape) > 1:
+                    kwargs['input_shape'] = batch_shape[1:]
+            super().__init__(*args, **kwargs)
+    
+    class CompatibleDTypePolicy(tf.keras.mixed_precision.Policy):
+        def __init__(self, name='float32'):
+            super().__init__(name)
+    
+    custom_objects = {
+        'InputLayer': CompatibleInputLayer,
+        'DTypePolicy': CompatibleDTypePolicy,
+        'Policy': CompatibleDTypePolicy,
+    }
+    
+    model = load_model(model_path, custom_objects=custom_objects, compile=False)
+    model.compile(optimizer='adam', loss='categorical_crossentropy', metrics=['accuracy'])
+    return model
+
+
+class ModelHandle:
+    """A loaded behaviour model plus the number of requests currently using it"""
+    __slots__ = ('model_id', 'model', 'version', 'refs', 'retired')
+    
+    def __init__(self, model_id: str, model, version: str):
+        self.model_id = model_id
+        self.model = model
+        self.version = version  # Part of result cache keys
+        self.refs = 0
+        self.retired = False
+
+
+class ModelRegistry:
+    """
+    Local on-disk registry of behaviour-model versions.
+    
+    Layout: <root>/<model_id>/metadata.json (+ artifact), <root>/active.
+    The bundled suspicious_activity_model.h5 is registered as 'builtin'.
+    
+    Serving: requests acquire() the active ModelHandle (ref-counted) for the
+    duration of an inference. switch() loads and warms the new model in a
+    background thread, then swaps the active handle atomically; in-flight
+    requests finish on the old model, which is unloaded once its reference
+    count drops to zero. Session state is untouched by a swap.
+    
+    The `active` pointer file is the source of truth across gunicorn
+    workers: the worker that handles a switch writes it after its swap,
+    and every worker's watch_active() thread follows pointer changes with
+    the same load + warm-up + swap (without rewriting the pointer, so the
+    latest switch wins everywhere).
+    """
+    
+    def __init__(self, root: str = MODEL_REGISTRY_DIR, loader=load_behavior_model):
+        self.root = root
+        self.loader = loader
+        self.lock = threading.Lock()  # Metadata files and switch state
+        self.handle_lock = threading.Lock()  # Active handle and reference counts
+        self.active_handle: Optional[ModelHandle] = None
+        self.switch_thread: Optional[threading.Thread] = None
+        self.switch_state: Dict = {'state': 'idle', 'model_id': None, 'error': None}
+        self.unloaded = 0
+        os.makedirs(self.root, exist_ok=True)
+    
+    # ------------------------------------------------------------------
+    # Metadata
+    # ------------------------------------------------------------------
+    
+    def _entry_dir(self, model_id: str) -> str:
+        if not re.fullmatch(r'[A-Za-z0-9_.-]+', model_id or '') or model_id.startswith('.'):
+            raise ValueError(f"Invalid model id: {model_id!r}")
+        return os.path.join(self.root, model_id)
+    
+    @staticmethod
+    def _write_json(path: str, data: Dict):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_path, path)
+    
+    def get(self, model_id: str) -> Optional[Dict]:
+        try:
+            with open(os.path.join(self._entry_dir(model_id), 'metadata.json')) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+    
+    def list_models(self) -> List[Dict]:
+        models = [self.get(name) for name in sorted(os.listdir(self.root))
+                  if os.path.isdir(os.path.join(self.root, name))]
+        return sorted((m for m in models if m), key=lambda m: m['createdAt'])
+    
+    def artifact_path(self, metadata: Dict) -> str:
+        return os.path.join(self._entry_dir(metadata['id']), metadata['artifact'])
+    
+    def active_model_id(self) -> Optional[str]:
+        try:
+            with open(os.path.join(self.root, 'active')) as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+    
+    def _set_active_model_id(self, model_id: str):
+        tmp_path = os.path.join(self.root, 'active.tmp')
+        with open(tmp_path, 'w') as f:
+            f.write(model_id)
+        os.replace(tmp_path, os.path.join(self.root, 'active'))
+    
+    def _new_entry(self, model_id: str, name: str, description: str, artifact: str,
+                   sha256: str, status: str, accuracy: Optional[float], version: int) -> Dict:
+        metadata = {
+            'id': model_id,
+            'name': name,
+            'description': description,
+            'version': version,
+            'status': status,
+            'artifact': artifact,
+            'sha256': sha256,
+            'accuracy': accuracy,
+            'createdAt': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'publishedAt': None
+        }
+        os.makedirs(self._entry_dir(model_id), exist_ok=True)
+        self._write_json(os.path.join(self._entry_dir(model_id), 'metadata.json'), metadata)
+        return metadata
+    
+    def bootstrap(self, builtin_path: str = BUILTIN_MODEL_PATH):
+        """Register the bundled model (by absolute path, not copied) on first start"""
+        with self.lock:
+            if os.path.exists(builtin_path) and self.get(BUILTIN_MODEL_ID) is None:
+                with open(builtin_path, 'rb') as f:
+                    sha256 = hashlib.sha256(f.read()).hexdigest()
+                metadata = self._new_entry(BUILTIN_MODEL_ID, 'Bundled behaviour model',
+                                           os.path.basename(builtin_path), os.path.abspath(builtin_path),
+                                           sha256, 'published', None, 1)
+                metadata['publishedAt'] = metadata['createdAt']
+                self._write_json(os.path.join(self._entry_dir(BUILTIN_MODEL_ID), 'metadata.json'), metadata)
+                if self.active_model_id() is None:
+                    self._set_active_model_id(BUILTIN_MODEL_ID)
+    
+    def register(self, name: str, artifact_stream, filename: str, description: str = '',
+                 accuracy: Optional[float] = None) -> Dict:
+        """Store an uploaded artifact as the next version of `name` (status 'trained')"""
+        extension = os.path.splitext(filename or '')[1].lower()
+        if extension not in MODEL_ARTIFACT_EXTENSIONS:
+            raise ValueError(f"Unsupported artifact type {extension!r} (expected {', '.join(MODEL_ARTIFACT_EXTENSIONS)})")
+        slug = re.sub(r'[^a-z0-9]+', '-', name.lower()).strip('-') or 'model'
+        with self.lock:
+            # Next version after the highest one on disk (deleted versions are not reused).
+            # os.mkdir is the claim: another worker registering the same name concurrently
+            # gets FileExistsError and moves on to the following version.
+            pattern = re.compile(rf"{re.escape(slug)}-v(\d+)")
+            versions = [int(m.group(1)) for m in map(pattern.fullmatch, os.listdir(self.root)) if m]
+            version = max(versions, default=0) + 1
+            while True:
+                model_id = f"{slug}-v{version}"
+                entry_dir = self._entry_dir(model_id)
+                try:
+                    os.mkdir(entry_dir)
+                    break
+                except FileExistsError:
+                    version += 1
+            try:
+                artifact = f"model{extension}"
+                digest = hashlib.sha256()
+                with open(os.path.join(entry_dir, artifact), 'wb') as f:
+                    for chunk in iter(lambda: artifact_stream.read(1 << 20), b''):
+                        digest.update(chunk)
+                        f.write(chunk)
+                return self._new_entry(model_id, name, description, artifact, digest.hexdigest(),
+                                       'trained', accuracy, version)
+            except BaseException:
+                shutil.rmtree(entry_dir, ignore_errors=True)  # No half-written version left behind
+                raise
+    
+    def publish(self, model_id: str) -> Dict:
+        with self.lock:
+            metadata = self.get(model_id)
+            if metadata is None:
+                raise KeyError(model_id)
+            if metadata['status'] != 'published':
+                metadata['status'] = 'published'
+                metadata['publishedAt'] = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+                self._write_json(os.path.join(self._entry_dir(model_id), 'metadata.json'), metadata)
+            return metadata
+    
+    def delete(self, model_id: str):
+        """Remove an entry; the active model and a pending switch target are protected"""
+        with self.lock:
+            if self.get(model_id) is None:
+                raise KeyError(model_id)
+            switching = self.switch_state['state'] == 'loading' and self.switch_state['model_id'] == model_id
+            if model_id == self.active_model_id() or switching:
+                raise RuntimeError(f"Model {model_id} is active or being switched to")
+            shutil.rmtree(self._entry_dir(model_id))
+    
+    # ------------------------------------------------------------------
+    # Serving (reference-counted active handle)
+    # ------------------------------------------------------------------
+    
+    def acquire(self) -> Optional[ModelHandle]:
+        with self.handle_lock:
+            handle = self.active_handle
+            if handle is not None:
+                handle.refs += 1
+            return handle
+    
+    def release(self, handle: ModelHandle):
+        with self.handle_lock:
+            handle.refs -= 1
+            unload = handle.retired and handle.refs == 0
+        if unload:
+            self._unload(handle)
+    
+    @contextmanager
+    def active(self):
+        """`with model_registry.active() as handle:` - None when no model is loaded"""
+        handle = self.acquire()
+        try:
+            yield handle
+        finally:
+            if handle is not None:
+                self.release(handle)
+    
+    def active_version(self) -> str:
+        handle = self.active_handle
+        return handle.version if handle is not None else 'none'
+    
+    def _unload(self, handle: ModelHandle):
+        handle.model = None
+        self.unloaded += 1
+        gc.collect()
+        logger.info(f"Unloaded behaviour model {handle.model_id} (no requests left on it)")
+    
+    def load_handle(self, metadata: Dict) -> ModelHandle:
+        """Load and warm up a model (first predict builds the graph)"""
+        model = self.loader(self.artifact_path(metadata))
+        model.predict(np.zeros((MODEL_WARMUP_BATCH, 224, 224, 3), dtype=np.float32), verbose=0)
+        return ModelHandle(metadata['id'], model, f"{metadata['id']}@{metadata['sha256'][:12]}")
+    
+    def _swap(self, handle: ModelHandle, persist: bool = True):
+        with self.handle_lock:
+            old = self.active_handle
+            self.active_handle = handle
+            unload_now = old is not None and old.refs == 0
+            if old is not None:
+                old.retired = True
+        if persist:
+            self._set_active_model_id(handle.model_id)
+        result_cache.invalidate('classify-behavior')
+        if unload_now:
+            self._unload(old)
+        logger.info(f"✅ Active behaviour model: {handle.model_id} ({handle.version})")
+    
+    def load_active(self):
+        """Synchronously load the persisted active model at startup"""
+        model_id = self.active_model_id()
+        metadata = self.get(model_id) if model_id else None
+        if metadata is None:
+            return
+        self._swap(self.load_handle(metadata), persist=False)
+    
+    def switch(self, model_id: str, persist: bool = True) -> threading.Thread:
+        """
+        Start a background load + warm-up + swap; returns the worker thread.
+        persist=False (following another worker's switch) leaves the pointer alone.
+        """
+        with self.lock:
+            metadata = self.get(model_id)
+            if metadata is None:
+                raise KeyError(model_id)
+            if metadata['status'] != 'published':
+                raise ValueError(f"Model {model_id} must be published before switching to it")
+            if self.switch_thread is not None and self.switch_thread.is_alive():
+                raise RuntimeError(f"Switch to {self.switch_state['model_id']} already in progress")
+            self.switch_state = {'state': 'loading', 'model_id': model_id, 'error': None,
+                                 'started_at': time.time()}
+            self.switch_thread = threading.Thread(target=self._switch_worker, args=(metadata, persist),
+                                                  name='model-switch', daemon=True)
+            self.switch_thread.start()
+            return self.switch_thread
+    
+    def _switch_worker(self, metadata: Dict, persist: bool = True):
+        started = time.time()
+        try:
+            handle = self.load_handle(metadata)
+            self._swap(handle, persist)
+            state = {'state': 'active', 'error': None}
+        except Exception as e:
+            logger.warning(f"Model switch to {metadata['id']} failed: {str(e)[:200]}")
+            state = {'state': 'failed', 'error': str(e)[:200]}
+        with self.lock:
+            self.switch_state.update(state, load_seconds=round(time.time() - started, 2))
+    
+    def watch_active(self, interval: float = MODEL_ACTIVE_POLL_SECONDS) -> threading.Thread:
+        """Per-worker thread: switch to the pointer's model when another worker changes it"""
+        def run():
+            failed = None  # Pointer target whose load failed here; retried only once the pointer moves
+            while True:
+                time.sleep(interval)
+                model_id = self.active_model_id()
+                handle = self.active_handle
+                if model_id is None or model_id == failed or (handle is not None and handle.model_id == model_id):
+                    continue
+                if self.switch_thread is not None and self.switch_thread.is_alive():
+                    continue  # Re-checked after the running switch
+                logger.info(f"Active model pointer moved to {model_id}, following")
+                try:
+                    self.switch(model_id, persist=False).join()
+                except (KeyError, ValueError, RuntimeError) as e:
+                    logger.warning(f"Cannot follow active model {model_id}: {e}")
+                    failed = model_id
+                    continue
+                failed = model_id if self.switch_state['state'] == 'failed' else None
         
-        if session['last_frame_hash'] == frame_hash:
-            return True
+        thread = threading.Thread(target=run, name='model-pointer-watch', daemon=True)
+        thread.start()
+        return thread
+    
+    def get_status(self) -> Dict:
+        with self.handle_lock:
+            handle = self.active_handle
+            active = {'model_id': handle.model_id, 'version': handle.version,
+                      'in_flight': handle.refs} if handle is not None else None
+        pointer = self.active_model_id()
+        with self.lock:
+            return {'active': active, 'pointer': pointer,
+                    'in_sync': active is not None and active['model_id'] == pointer,
+                    'worker_slot': worker_slot, 'switch': dict(self.switch_state), 'unloaded': self.unloaded}
+
+
+# =============================================================================
+# SHADOW EVALUATION - Candidate model on sampled live frames
+# =============================================================================
+
+class ShadowEvaluator:
+    """
+    Scores a candidate behaviour model on a sample of live frames without
+    touching the request path.
+    
+    offer() copies a SHADOW_SAMPLE_RATE fraction of frames that were
+    classified by the active model (frame reference + active label) into a
+    bounded queue with put_nowait: a full queue or a busy node drops the
+    sample instead of slowing the request. One background thread scores
+    queued frames in small batches and aggregates agreement with the
+    active model:
+    - per frame: 3x3 confusion matrix (active x candidate) and per-class agreement
+    - per batch decision: when a session's batch closes, the candidate's
+      decision over that batch's sampled frames (same dominance rule as
+      BatchFrameProcessor) is compared with the primary batch decision
+    
+    Under gunicorn, the `shadow` pointer file in the registry root is the
+    source of truth, like the registry's `active` pointer: start() and
+    stop() write or remove it, and every worker's watch() thread follows
+    it. Each run has a run_id so a restart of the same candidate resets
+    the counters everywhere. Workers publish their counters for the run
+    to shadow-stats[.<slot>].json, and get_stats() sums them.
+    """
+    
+    def __init__(self, sample_rate: float = SHADOW_SAMPLE_RATE, queue_size: int = SHADOW_QUEUE_SIZE,
+                 root: Optional[str] = None, slot: int = 0):
+        self.sample_rate = sample_rate
+        self.root = root  # Registry dir holding the shared pointer; None = this process only
+        self.slot = slot
+        self.run_id: Optional[str] = None  # Run this worker is loading or scoring
+        self.queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.lock = threading.Lock()
+        self.candidate: Optional[ModelHandle] = None
+        self.state = 'idle'
+        self.error: Optional[str] = None
+        self.worker: Optional[threading.Thread] = None
+        self.rng = np.random.default_rng()
+        self._reset_stats()
+    
+    def _reset_stats(self):
+        self.offered = 0
+        self.enqueued = 0
+        self.dropped_full = 0
+        self.skipped_load = 0
+        self.scored = 0
+        self.score_seconds = 0.0
+        self.frame_confusion = np.zeros((len(BEHAVIOR_CLASSES), len(BEHAVIOR_CLASSES)), dtype=np.int64)
+        self.batch_confusion = np.zeros((len(BEHAVIOR_CLASSES), len(BEHAVIOR_CLASSES)), dtype=np.int64)
+        self.session_votes: Dict[str, np.ndarray] = {}  # Candidate class counts for the open batch
+    
+    def start(self, metadata: Dict, sample_rate: Optional[float] = None, run_id: Optional[str] = None):
+        """
+        Load the candidate (background) and start sampling once it is warm.
+        run_id=None starts a new run and writes the shared pointer; watch()
+        passes the pointer's run_id when following another worker.
+        """
+        with self.lock:
+            if self.state == 'loading':
+                raise RuntimeError('Candidate model is still loading')
+            if run_id is not None and (self._read_pointer() or {}).get('run_id') != run_id:
+                return  # Pointer moved on since it was read
+            self.candidate = None
+            self.state = 'loading'
+            self.error = None
+            if sample_rate is not None:
+                self.sample_rate = min(1.0, max(0.0, sample_rate))
+            self._reset_stats()
+            self.run_id = run_id or os.urandom(8).hex()
+            if run_id is None and self.root is not None:
+                ModelRegistry._write_json(self._pointer_path(), {
+                    'run_id': self.run_id, 'model_id': metadata['id'], 'sample_rate': self.sample_rate})
+        self._drain()
+        threading.Thread(target=self._load, args=(metadata,), name='shadow-load', daemon=True).start()
+    
+    def stop(self, persist: bool = True):
+        """Stop sampling; persist=False (following the pointer) leaves the pointer alone"""
+        with self.lock:
+            self.candidate = None
+            self.state = 'idle'
+            self.run_id = None
+            if persist and self.root is not None:
+                try:
+                    os.remove(self._pointer_path())
+                except FileNotFoundError:
+                    pass
+        self._drain()
+    
+    def _pointer_path(self) -> str:
+        return os.path.join(self.root, 'shadow')
+    
+    def _stats_path(self) -> str:
+        return worker_file_path(os.path.join(self.root, 'shadow-stats.json'), self.slot)
+    
+    def _read_pointer(self) -> Optional[Dict]:
+        if self.root is None:
+            return None
+        try:
+            with open(self._pointer_path()) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+    
+    def follow(self):
+        """One watch() tick: follow the pointer, then publish this worker's counters"""
+        pointer = self._read_pointer()
+        if pointer is None:
+            if self.run_id is not None:
+                logger.info("Shadow pointer removed, stopping shadow evaluation")
+                self.stop(persist=False)
+        elif pointer.get('run_id') != self.run_id:
+            metadata = model_registry.get(pointer.get('model_id') or '')
+            if metadata is None:
+                with self.lock:  # Not retried until the pointer moves
+                    self.run_id, self.state = pointer.get('run_id'), 'failed'
+                    self.error = f"Model {pointer.get('model_id')} not found"
+                return
+            logger.info(f"Shadow pointer moved to {metadata['id']}, following")
+            try:
+                self.start(metadata, pointer.get('sample_rate'), run_id=pointer.get('run_id'))
+            except RuntimeError:
+                pass  # Re-checked once the running load finishes
+        with self.lock:
+            counts = self._counts() if self.state == 'running' else None
+        if counts is not None:
+            try:
+                ModelRegistry._write_json(self._stats_path(), counts)
+            except OSError as e:
+                logger.warning(f"Cannot publish shadow stats: {e}")
+    
+    def watch(self, interval: float = MODEL_ACTIVE_POLL_SECONDS) -> threading.Thread:
+        """Per-worker thread: follow shadow runs started or stopped by another worker"""
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.follow()
+                except Exception as e:
+                    logger.warning(f"Shadow pointer watch error: {e}")
         
-        session['last_frame_hash'] = frame_hash
-        session['frame_count'] += 1
-        return False
+        thread = threading.Thread(target=run, name='shadow-pointer-watch', daemon=True)
+        thread.start()
+        return thread
+    
+    def _drain(self):
+        while True:
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                return
+    
+    def _load(self, metadata: Dict):
+        try:
+            handle = model_registry.load_handle(metadata)
+        except Exception as e:
+            logger.warning(f"Shadow candidate {metadata['id']} failed to load: {str(e)[:200]}")
+            with self.lock:
+                self.state, self.error = 'failed', str(e)[:200]
+            return
+        with self.lock:
+            if self.state != 'loading':
+                return  # Stopped while loading
+            self.candidate = handle
+            self.state = 'running'
+            if self.worker is None or not self.worker.is_alive():
+                self.worker = threading.Thread(target=self._run, name='shadow-eval', daemon=True)
+                self.worker.start()
+        logger.info(f"Shadow evaluation running: candidate {handle.model_id} at {self.sample_rate:.0%} of frames")
+    
+    def offer(self, session_id: str, frame: np.ndarray, active_classification: str):
+        """Request path: sample a classified frame (never blocks)"""
+        if self.candidate is None or active_classification not in BEHAVIOR_CLASS_IDS:
+            return
+        if self.rng.random() >= self.sample_rate:
+            return
+        with self.lock:
+            self.offered += 1
+            if service_load.utilization() > SHADOW_MAX_UTILIZATION:
+                self.skipped_load += 1
+                return
+        try:
+            self.queue.put_nowait(('frame', session_id, frame, BEHAVIOR_CLASS_IDS[active_classification]))
+            with self.lock:
+                self.enqueued += 1
+        except queue.Full:
+            with self.lock:
+                self.dropped_full += 1
+    
+    def observe_batch(self, session_id: str, batch_result: BatchAnalysisResult):
+        """Request path: mark a closed batch (ordered after its frames in the queue)"""
+        if self.candidate is None:
+            return
+        histogram = batch_result.classification_histogram
+        dominant = max(histogram, key=histogram.get)
+        primary = dominant if histogram[dominant] >= CLASSIFICATION_DOMINANCE_THRESHOLD else 'normal'
+        try:
+            self.queue.put_nowait(('batch', session_id, None, BEHAVIOR_CLASS_IDS[primary]))
+        except queue.Full:
+            pass  # The candidate's votes then roll into the session's next batch
+    
+    def _run(self):
+        """Background scorer: up to SHADOW_BATCH_SIZE frames per forward pass"""
+        while True:
+            items = [self.queue.get()]
+            while len(items) < SHADOW_BATCH_SIZE:
+                try:
+                    items.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            
+            candidate = self.candidate
+            if candidate is None:
+                continue
+            frames = [item for item in items if item[0] == 'frame']
+            labels = []
+            if frames:
+                started = time.perf_counter()
+                try:
+                    input_array = np.stack([preprocess_behavior_input(item[2]) for item in frames])
+                    predictions = candidate.model.predict(input_array, batch_size=len(frames), verbose=0)
+                    labels = [BEHAVIOR_CLASS_IDS[c] for c, _, _ in behavior_results_from_predictions(predictions)]
+                except Exception as e:
+                    logger.warning(f"Shadow scoring error: {str(e)[:200]}")
+                    continue
+                elapsed = time.perf_counter() - started
+            
+            with self.lock:
+                if candidate is not self.candidate:
+                    continue  # Stopped or restarted meanwhile
+                labels = iter(labels)
+                for kind, session_id, _, active_id in items:
+                    votes = self.session_votes.setdefault(session_id, np.zeros(len(BEHAVIOR_CLASSES), dtype=np.int64))
+                    if kind == 'frame':
+                        candidate_id = next(labels)
+                        self.frame_confusion[active_id, candidate_id] += 1
+                        votes[candidate_id] += 1
+                        self.scored += 1
+                    elif votes.sum():
+                        dominant = int(np.argmax(votes))
+                        decision = dominant if votes[dominant] / votes.sum() >= CLASSIFICATION_DOMINANCE_THRESHOLD \
+                            else BEHAVIOR_CLASS_IDS['normal']
+                        self.batch_confusion[active_id, decision] += 1
+                        votes[:] = 0
+                if frames:
+                    self.score_seconds += elapsed
+    
+    @staticmethod
+    def _agreement(confusion: np.ndarray) -> Dict:
+        total = int(confusion.sum())
+        return {
+            'compared': total,
+            'agreement': round(float(np.trace(confusion)) / total, 4) if total else None,
+            'per_class': {
+                name: {
+                    'active': int(confusion[i].sum()),
+                    'agreement': round(float(confusion[i, i]) / confusion[i].sum(), 4) if confusion[i].sum() else None
+                }
+                for i, name in enumerate(BEHAVIOR_CLASSES)
+            },
+            'confusion': confusion.tolist()  # rows: active, columns: candidate
+        }
+    
+    def _counts(self) -> Dict:
+        """This worker's counters for the current run (caller holds self.lock)"""
+        return {
+            'run_id': self.run_id,
+            'slot': self.slot,
+            'offered': self.offered,
+            'enqueued': self.enqueued,
+            'dropped_queue_full': self.dropped_full,
+            'skipped_under_load': self.skipped_load,
+            'scored': self.scored,
+            'score_seconds': self.score_seconds,
+            'frame_confusion': self.frame_confusion.tolist(),
+            'batch_confusion': self.batch_confusion.tolist()
+        }
+    
+    def _peer_counts(self, run_id: Optional[str]) -> List[Dict]:
+        """Counters other workers published for the same run"""
+        if self.root is None or run_id is None:
+            return []
+        peers = []
+        for name in os.listdir(self.root):
+            if not re.fullmatch(r'shadow-stats(\.\d+)?\.json', name):
+                continue
+            try:
+                with open(os.path.join(self.root, name)) as f:
+                    counts = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if counts.get('run_id') == run_id and counts.get('slot') != self.slot:
+                peers.append(counts)
+        return peers
+    
+    def get_stats(self) -> Dict:
+        """Run state of this worker; counters and agreement summed over all workers in the run"""
+        with self.lock:
+            candidate = self.candidate
+            state, error, sample_rate = self.state, self.error, self.sample_rate
+            total = self._counts()
+        peers = self._peer_counts(total['run_id'])
+        for counts in peers:
+            for key in ('offered', 'enqueued', 'dropped_queue_full', 'skipped_under_load', 'scored', 'score_seconds'):
+                total[key] += counts[key]
+            for key in ('frame_confusion', 'batch_confusion'):
+                total[key] = (np.asarray(total[key]) + np.asarray(counts[key])).tolist()
+        scored = total['scored']
+        return {
+            'state': state,
+            'error': error,
+            'candidate': candidate.model_id if candidate else None,
+            'active': model_registry.active_handle.model_id if model_registry.active_handle else None,
+            'sample_rate': sample_rate,
+            'workers': 1 + len(peers),
+            'offered': total['offered'],
+            'enqueued': total['enqueued'],
+            'dropped_queue_full': total['dropped_queue_full'],
+            'skipped_under_load': total['skipped_under_load'],
+            'queue_depth': self.queue.qsize(),
+            'scored': scored,
+            'mean_score_ms_per_frame': round(1000 * total['score_seconds'] / scored, 2) if scored else 0.0,
+            'frames': self._agreement(np.asarray(total['frame_confusion'])),
+            'batch_decisions': self._agreement(np.asarray(total['batch_confusion']))
+        }
 
 
 # =============================================================================
 # INITIALIZE GLOBAL COMPONENTS
 # =============================================================================
 
-detector = FaceDetector()
-session_manager = SessionManager()
+# Process-wide components, built by init_shared() before any fork and shared
+# copy-on-write by forked workers
+thread_budget: Optional[ThreadBudget] = None
+model_registry: Optional[ModelRegistry] = None
+ensemble_engine: Optional[EnsembleEngine] = None
 
-# Load behavior model
-behavior_model = None
-if TENSORFLOW_AVAILABLE:
-    try:
-        model_path = os.path.join(os.path.dirname(__file__), 'suspicious_activity_model.h5')
-        if os.path.exists(model_path):
+# Per-worker components, built by init_worker() after fork (native thread
+# pools, MediaPipe graphs and TF runtimes do not survive a fork)
+detector: Optional[FaceDetector] = None
+session_manager: Optional[SessionManager] = None
+session_snapshots: Optional[SessionSnapshotter] = None
+service_load: Optional[ServiceLoad] = None
+capture_governor: Optional[CaptureRateGovernor] = None
+admission_controller: Optional[AdmissionController] = None
+result_cache: Optional[ResultCache] = None
+quality_gate: Optional[FrameQualityGate] = None
+stage_timings: Optional[StageTimings] = None
+decode_executor: Optional[ThreadPoolExecutor] = None
+shadow_evaluator: Optional[ShadowEvaluator] = None
+tracer: Optional[Tracer] = None
+profiler: Optional[SamplingProfiler] = None
+event_channel: Optional[EventChannel] = None
+capture_requests: Optional[CaptureRequests] = None
+event_hub: Optional[EventHub] = None  # Only in the worker hosting the hub (EVENT_HUB_SLOT)
+
+_init_lock = threading.RLock()
+worker_slot: Optional[int] = None
+
+
+def init_shared():
+    """
+    Pre-fork initialization (idempotent): thread budget, model registry
+    metadata and the classical-ML ensemble.
+    
+    Everything created here is read-only afterwards. The ensemble's fitted
+    arrays are memory-mapped (mmap_mode='c'), and the gc.freeze() at the end
+    moves all preloaded objects to the permanent generation, so collections
+    in workers do not write to their pages and keep them shared.
+    No threads are started here.
+    """
+    global thread_budget, model_registry, ensemble_engine
+    with _init_lock:
+        if thread_budget is not None:
+            return
+        thread_budget = ThreadBudget()
+        thread_budget.apply()
+        
+        # Registry metadata only; the CNN itself is loaded per worker
+        model_registry = ModelRegistry()
+        model_registry.bootstrap()
+        
+        # Load classical-ML ensemble (NumPy/scikit-learn, fork-safe)
+        ensemble_engine = EnsembleEngine()
+        if ENABLE_ENSEMBLE_MODELS and SKLEARN_AVAILABLE:
             try:
-                import tensorflow as tf
-                from tensorflow.keras.layers import InputLayer
-                
-                class CompatibleInputLayer(InputLayer):
-                    def __init__(self, *args, **kwargs):
-                        if 'batch_shape' in kwargs:
-                            batch_shape = kwargs.pop('batch_shape')
-                            if batch_shape and len(batch_shape) > 1:
-                                kwargs['input_shape'] = batch_shape[1:]
-                        super().__init__(*args, **kwargs)
-                
-                class CompatibleDTypePolicy(tf.keras.mixed_precision.Policy):
-                    def __init__(self, name='float32'):
-                        super().__init__(name)
-                
-                custom_objects = {
-                    'InputLayer': CompatibleInputLayer,
-                    'DTypePolicy': CompatibleDTypePolicy,
-                    'Policy': CompatibleDTypePolicy,
-                }
-                
-                behavior_model = load_model(model_path, custom_objects=custom_objects, compile=False)
-                behavior_model.compile(optimizer='adam', loss='categorical_crossentropy', metrics=['accuracy'])
-                logger.info("✅ Loaded behavior classification model")
+                ensemble_engine.load()
+            except Exception as e:
+                logger.warning(f"Ensemble model loading failed: {str(e)[:200]}")
+        
+        gc.collect()
+        gc.freeze()
+
+
+def worker_file_path(path: str, slot: int) -> str:
+    """Per-worker-slot variant of a file path (slot 0 keeps the path itself)"""
+    if slot == 0:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.{slot}{ext}"
+
+
+def session_snapshot_path(slot: int) -> str:
+    """Journal per worker slot (slot 0 keeps SESSION_SNAPSHOT_PATH)"""
+    return worker_file_path(SESSION_SNAPSHOT_PATH, slot)
+
+
+def init_worker(slot: int = 0):
+    """
+    Post-fork initialization (idempotent per process): detector, sessions,
+    load/admission control, caches, executors and the behaviour CNN.
+    
+    slot is a stable worker index (see gunicorn.conf.py). A replacement
+    worker gets the slot of the one it replaces, so it restores that
+    worker's session journal.
+    """
+    global detector, session_manager, session_snapshots, service_load, capture_governor
+    global admission_controller, result_cache, quality_gate, stage_timings, decode_executor, shadow_evaluator
+    global tracer, profiler, event_channel, event_hub, capture_requests, worker_slot
+    with _init_lock:
+        init_shared()
+        if detector is not None:
+            return
+        worker_slot = slot
+        cv2.setNumThreads(thread_budget.opencv)  # OpenCV's pool is per process
+        
+        detector = FaceDetector(mediapipe_instances=thread_budget.mediapipe)
+        session_manager = SessionManager()
+        session_snapshots = SessionSnapshotter(session_manager, session_snapshot_path(slot))
+        if SESSION_SNAPSHOT_ENABLED:
+            try:
+                session_snapshots.restore()
+            except Exception as e:
+                logger.warning(f"Session snapshot restore failed, starting fresh: {e}")
+            session_snapshots.start()
+        service_load = ServiceLoad(capacity=thread_budget.workers)
+        capture_governor = CaptureRateGovernor(service_load)
+        admission_controller = AdmissionController(ADMISSION_MAX_IN_FLIGHT or 2 * thread_budget.workers)
+        result_cache = ResultCache()
+        quality_gate = FrameQualityGate()
+        stage_timings = StageTimings()
+        decode_executor = ThreadPoolExecutor(max_workers=min(MULTI_FRAME_DECODE_WORKERS, thread_budget.opencv),
+                                             thread_name_prefix='frame-decode')
+        
+        # Behaviour model (loads the persisted active model, default: bundled model)
+        if TENSORFLOW_AVAILABLE:
+            try:
+                model_registry.load_active()
             except Exception as e:
                 logger.warning(f"Model loading failed: {str(e)[:200]}")
-    except Exception as e:
-        logger.warning(f"TensorFlow available but model loading failed: {str(e)[:200]}")
+            model_registry.watch_active()
+        
+        shadow_evaluator = ShadowEvaluator(root=model_registry.root, slot=slot)
+        if TENSORFLOW_AVAILABLE:
+            shadow_evaluator.watch()
+        tracer = Tracer(file_path=worker_file_path(TRACE_FILE_PATH, slot), slot=slot)
+        tracer.start()
+        profiler = SamplingProfiler()
+        if EVENT_STREAM_ENABLED and slot == EVENT_HUB_SLOT:
+            event_hub = EventHub()
+            event_hub.start()
+        event_channel = EventChannel()
+        capture_requests = CaptureRequests()
+        capture_requests.watch(session_manager)
+        logger.info(f"Worker initialized (pid={os.getpid()}, slot={slot})")
+
+
+@api.before_app_request
+def _ensure_worker_initialized():
+    """Fallback when no post-fork hook ran (e.g. gunicorn without gunicorn.conf.py)"""
+    if detector is None:
+        init_worker()
+
+
+@api.before_app_request
+def _register_request_thread():
+    profiler.request_started()
+
+
+@api.teardown_app_request
+def _unregister_request_thread(exc):
+    profiler.request_finished()
+
+
+@api.before_app_request
+def _start_trace():
+    trace = tracer.start_request(f"{request.method} {request.url_rule or request.path}",
+                                 request.headers.get(TRACEPARENT_HEADER))
+    if trace is not None:
+        trace.root.attributes = {'http.request.method': request.method, 'url.path': request.path}
+    _current_trace.set(trace)
+
+
+@api.after_app_request
+def _finish_trace(response):
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.root.set_attribute('http.response.status_code', response.status_code)
+        if response.status_code >= 500:
+            trace.root.error = f"HTTP {response.status_code}"
+        response.headers[TRACEPARENT_HEADER] = trace.traceparent()
+        _current_trace.set(None)
+        tracer.finish_request(trace)
+    return response
+
+
+@api.teardown_app_request
+def _finish_trace_on_teardown(exc):
+    """Unhandled exceptions skip after_request; still export the trace"""
+    trace = _current_trace.get()
+    if trace is not None:
+        if exc is not None:
+            trace.root.error = f"{type(exc).__name__}: {str(exc)[:200]}"
+        _current_trace.set(None)
+        tracer.finish_request(trace)
+
+
+def create_app() -> Flask:
+    """
+    Application factory.
+    
+    Runs the pre-fork half of initialization and returns the Flask app.
+    With gunicorn's preload_app (gunicorn.conf.py) this runs once in the
+    master, and each worker calls init_worker() from the post_fork hook.
+    Single-process callers (python face_detection_service.py, tests) call
+    init_worker() themselves, or leave it to the first request.
+    """
+    init_shared()
+    app = Flask(__name__)
+    CORS(app, 
+         origins=allowed_origins, 
+         supports_credentials=True,
+         methods=['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS'],
+         allow_headers=['Content-Type', 'Authorization', DEADLINE_HEADER, TRACEPARENT_HEADER],
+         expose_headers=[TRACEPARENT_HEADER])
+    app.register_blueprint(api)
+    return app
 
 
 # =============================================================================
@@ -1349,6 +5904,129 @@ def decode_base64_image(image_str: str) -> Optional[np.ndarray]:
         return None
 
 
+def split_mjpeg(data: bytes) -> List[bytes]:
+    """Split a raw MJPEG stream into its JPEG frames (SOI..EOI markers)"""
+    jpegs = []
+    pos = 0
+    while True:
+        start = data.find(b'\xff\xd8', pos)
+        if start < 0:
+            break
+        end = data.find(b'\xff\xd9', start + 2)
+        if end < 0:
+            break
+        jpegs.append(data[start:end + 2])
+        pos = end + 2
+    return jpegs
+
+
+def _sample_indices(frame_count: int, source_fps: float, sample_fps: float) -> List[int]:
+    """Indices of frames to keep when resampling source_fps down to sample_fps"""
+    if sample_fps >= source_fps:
+        return list(range(frame_count))
+    step = source_fps / sample_fps
+    indices = []
+    next_index = 0.0
+    while int(next_index) < frame_count:
+        indices.append(int(next_index))
+        next_index += step
+    return indices
+
+
+def sample_video_segment(data: bytes, container: str,
+                         sample_fps: float = VIDEO_SAMPLE_FPS,
+                         source_fps: Optional[float] = None) -> Tuple[List[np.ndarray], List[float]]:
+    """
+    Decode an encoded video segment and sample frames at sample_fps.
+    
+    Returns (frames, offsets) where offsets are seconds from segment start.
+    - mjpeg: split on JPEG markers; only sampled frames are decoded
+    - webm/mp4/avi/mkv: OpenCV VideoCapture; skipped frames are grab()'ed
+      without colour conversion
+    """
+    if container == 'mjpeg':
+        jpegs = split_mjpeg(data)
+        fps = source_fps or VIDEO_MJPEG_DEFAULT_FPS
+        indices = _sample_indices(len(jpegs), fps, sample_fps)
+        frames = list(decode_executor.map(
+            lambda i: cv2.imdecode(np.frombuffer(jpegs[i], np.uint8), cv2.IMREAD_COLOR), indices))
+        pairs = [(frame, i / fps) for i, frame in zip(indices, frames) if frame is not None]
+        return [f for f, _ in pairs], [t for _, t in pairs]
+    
+    suffix = VIDEO_CONTAINER_SUFFIXES.get(container)
+    if suffix is None:
+        raise ValueError(f'Unsupported video format: {container}')
+    
+    # OpenCV's container demuxers read from files, not memory
+    frames = []
+    offsets = []
+    with tempfile.NamedTemporaryFile(suffix=suffix) as tmp:
+        tmp.write(data)
+        tmp.flush()
+        capture = cv2.VideoCapture(tmp.name)
+        try:
+            fps = source_fps or capture.get(cv2.CAP_PROP_FPS) or VIDEO_MJPEG_DEFAULT_FPS
+            interval = 1.0 / sample_fps
+            next_sample = 0.0
+            index = 0
+            while capture.grab():
+                offset = index / fps
+                if offset + 1e-6 >= next_sample:
+                    ok, frame = capture.retrieve()
+                    if ok and frame is not None:
+                        frames.append(frame)
+                        offsets.append(offset)
+                    next_sample += interval
+                index += 1
+        finally:
+            capture.release()
+    return frames, offsets
+
+
+def estimate_pose_from_keypoints(keypoints: np.ndarray) -> np.ndarray:
+    """
+    Vectorized yaw/pitch estimate from MediaPipe detection keypoints.
+    
+    keypoints: (N, 6, 2) pixel coords [right eye, left eye, nose tip, mouth,
+    right ear, left ear]. Returns (N, 2) [yaw, pitch] in degrees; positive yaw
+    = nose towards image right, positive pitch = looking down. Rows with
+    missing keypoints are NaN.
+    - Yaw: nose offset from the ear midpoint, relative to half the ear span
+    - Pitch: nose position between eye line and mouth vs. its level position
+    """
+    kp = np.asarray(keypoints, dtype=np.float32)
+    eyes_mid = (kp[:, 0] + kp[:, 1]) / 2
+    ears_mid = (kp[:, 4] + kp[:, 5]) / 2
+    nose = kp[:, 2]
+    mouth = kp[:, 3]
+    
+    half_span = np.linalg.norm(kp[:, 5] - kp[:, 4], axis=1) / 2
+    yaw_ratio = (nose[:, 0] - ears_mid[:, 0]) / np.maximum(half_span, 1e-6)
+    
+    eye_to_mouth = mouth[:, 1] - eyes_mid[:, 1]
+    nose_ratio = (nose[:, 1] - eyes_mid[:, 1]) / np.where(np.abs(eye_to_mouth) > 1e-6, eye_to_mouth, np.nan)
+    pitch_ratio = (nose_ratio - HEAD_PITCH_NEUTRAL_RATIO) / HEAD_PITCH_NEUTRAL_RATIO
+    
+    yaw = np.degrees(np.arcsin(np.clip(yaw_ratio, -1.0, 1.0)))
+    pitch = np.degrees(np.arcsin(np.clip(pitch_ratio, -1.0, 1.0)))
+    return np.stack([yaw, pitch], axis=1)
+
+
+def head_pose_summary(face: Optional[TrackedFace], frame: np.ndarray) -> Dict:
+    """Response 'head_pose' for the primary face (bbox heuristic when no keypoints)"""
+    if face is None:
+        return {'direction': 'unknown', 'gaze_away': False, 'yaw': None, 'pitch': None}
+    if face.yaw is None:
+        return {'direction': estimate_head_pose(face.bbox, frame), 'gaze_away': False,
+                'yaw': None, 'pitch': None}
+    return {
+        'direction': face.head_direction(),
+        'gaze_away': face.is_gaze_away(),
+        'yaw': float(round(face.yaw, 1)),
+        'pitch': float(round(face.pitch, 1))
+    }
+
+
 def estimate_head_pose(face_bbox: Tuple[int, int, int, int], 
                        frame: np.ndarray) -> str:
     """Estimate head pose based on face position"""
@@ -1396,59 +6074,250 @@ def detect_phone_usage(frame: np.ndarray, face_bbox: Tuple[int, int, int, int])
         return 0.0
 
 
+# Bias correction applied to raw CNN outputs (model over-predicts very_suspicious):
+# adjusted = raw @ BEHAVIOR_BIAS_MATRIX, then renormalized per row
+BEHAVIOR_BIAS_MATRIX = np.array([
+    [1.0, 0.0, 0.0],     # normal
+    [0.0, 1.0, 0.0],     # suspicious
+    [0.35, 0.25, 0.40],  # very_suspicious -> redistributed
+], dtype=np.float32)
+
+
+def default_behavior_result() -> Tuple[str, float, Dict[str, float]]:
+    """Neutral classification used when the model is unavailable or fails"""
+    return 'normal', 0.5, {'normal': 0.7, 'suspicious': 0.2, 'very_suspicious': 0.1}
+
+
+def preprocess_behavior_input(frame: np.ndarray) -> np.ndarray:
+    """Resize/convert a BGR frame to the CNN's (224, 224, 3) float32 input"""
+    resized = cv2.resize(frame, (224, 224))
+    rgb_frame = cv2.cvtColor(resized, cv2.COLOR_BGR2RGB)
+    return rgb_frame.astype(np.float32) / 255.0
+
+
+def behavior_results_from_predictions(predictions: np.ndarray) -> List[Tuple[str, float, Dict[str, float]]]:
+    """Apply bias correction to (N, 3) CNN outputs and convert to result tuples"""
+    adjusted = np.asarray(predictions, dtype=np.float32) @ BEHAVIOR_BIAS_MATRIX
+    adjusted /= adjusted.sum(axis=1, keepdims=True)
+    
+    results = []
+    for row in adjusted:
+        probabilities = {BEHAVIOR_CLASSES[i]: float(row[i]) for i in range(len(BEHAVIOR_CLASSES))}
+        predicted_class = BEHAVIOR_CLASSES[int(np.argmax(row))]
+        results.append((predicted_class, probabilities[predicted_class], probabilities))
+    return results
+
+
+def ensemble_feature_row(face_count: int, active_faces: List[TrackedFace], phone_prob: float,
+                         probabilities: Dict[str, float]) -> np.ndarray:
+    """EnsembleEngine feature row for one frame (primary track's movement and gaze)"""
+    primary = active_faces[0] if active_faces else None
+    return EnsembleEngine.feature_row(face_count,
+                                      primary.movement_magnitude() if primary else 0.0,
+                                      phone_prob, probabilities,
+                                      primary.is_gaze_away() if primary else False)
+
+
+def compact_behavior_input(frame: np.ndarray) -> np.ndarray:
+    """Small uint8 RGB tensor kept per frame for lazy (batch-close) classification"""
+    size = (LAZY_CLASSIFICATION_INPUT_SIZE, LAZY_CLASSIFICATION_INPUT_SIZE)
+    return cv2.cvtColor(cv2.resize(frame, size, interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2RGB)
+
+
 def classify_behavior_raw(frame: np.ndarray) -> Tuple[str, float, Dict[str, float]]:
     """
     Raw behavior classification from CNN model.
     Returns (classification, confidence, probabilities)
     """
-    if behavior_model is None:
-        return 'normal', 0.5, {'normal': 0.7, 'suspicious': 0.2, 'very_suspicious': 0.1}
-    
-    try:
-        resized = cv2.resize(frame, (224, 224))
-        rgb_frame = cv2.cvtColor(resized, cv2.COLOR_BGR2RGB)
-        normalized = rgb_frame.astype(np.float32) / 255.0
-        input_array = np.expand_dims(normalized, axis=0)
-        
-        predictions = behavior_model.predict(input_array, verbose=0)
-        class_names = ['normal', 'suspicious', 'very_suspicious']
-        
-        probabilities = {
-                    class_names[i]: float(predictions[0][i])
-                    for i in range(len(class_names))
-        }
-        
-        # Adjust for model bias (model over-predicts very_suspicious)
-        adjusted_normal = probabilities['normal'] + probabilities['very_suspicious'] * 0.35
-        adjusted_suspicious = probabilities['suspicious'] + probabilities['very_suspicious'] * 0.25
-        adjusted_very_suspicious = probabilities['very_suspicious'] * 0.40
-        
-        total = adjusted_normal + adjusted_suspicious + adjusted_very_suspicious
-        probabilities = {
-                    'normal': adjusted_normal / total,
-                    'suspicious': adjusted_suspicious / total,
-                    'very_suspicious': adjusted_very_suspicious / total
-        }
+    with model_registry.active() as handle:
+        if handle is None:
+            return default_behavior_result()
         
-        predicted_class = max(probabilities, key=probabilities.get)
-        confidence = probabilities[predicted_class]
+        try:
+            with trace_span('behavior_cnn.predict', frames=1, model=handle.version):
+                input_array = np.expand_dims(preprocess_behavior_input(frame), axis=0)
+                predictions = handle.model.predict(input_array, verbose=0)
+            return behavior_results_from_predictions(predictions)[0]
+            
+        except Exception as e:
+            logger.warning(f"Classification error: {str(e)[:200]}")
+            return default_behavior_result()
+
+
+def classify_behavior_batch(frames: List[np.ndarray]) -> List[Tuple[str, float, Dict[str, float]]]:
+    """
+    Classify several frames with ONE batched CNN forward pass.
+    Returns one (classification, confidence, probabilities) per frame.
+    """
+    if not frames:
+        return []
+    with model_registry.active() as handle:
+        if handle is None:
+            return [default_behavior_result() for _ in frames]
         
-        return predicted_class, confidence, probabilities
+        try:
+            with trace_span('behavior_cnn.predict', frames=len(frames), model=handle.version):
+                input_array = np.stack([preprocess_behavior_input(frame) for frame in frames])
+                predictions = handle.model.predict(input_array, batch_size=len(frames), verbose=0)
+            return behavior_results_from_predictions(predictions)
+            
+        except Exception as e:
+            logger.warning(f"Batch classification error: {str(e)[:200]}")
+            return [default_behavior_result() for _ in frames]
+
+
+def classify_behavior_inputs(inputs: np.ndarray) -> List[Tuple[str, float, Dict[str, float]]]:
+    """
+    Classify (N, S, S, 3) uint8 compact_behavior_input tensors with ONE
+    batched CNN forward pass (lazy classification at batch close).
+    """
+    if len(inputs) == 0:
+        return []
+    with model_registry.active() as handle:
+        if handle is None:
+            return [default_behavior_result() for _ in range(len(inputs))]
         
-    except Exception as e:
-        logger.warning(f"Classification error: {str(e)[:200]}")
-        return 'normal', 0.5, {'normal': 0.7, 'suspicious': 0.2, 'very_suspicious': 0.1}
+        try:
+            with trace_span('behavior_cnn.predict', frames=len(inputs), model=handle.version, lazy=True):
+                input_array = np.stack([cv2.resize(tensor, (224, 224)) for tensor in inputs]).astype(np.float32) / 255.0
+                predictions = handle.model.predict(input_array, batch_size=len(inputs), verbose=0)
+            return behavior_results_from_predictions(predictions)
+            
+        except Exception as e:
+            logger.warning(f"Lazy classification error: {str(e)[:200]}")
+            return [default_behavior_result() for _ in range(len(inputs))]
+
+
+# =============================================================================
+# MAIN PROCESSING FUNCTION
+# =============================================================================
+
+def detect_and_track(session: Dict, frame: np.ndarray) -> Tuple[List[TrackedFace], int, List[float]]:
+    """
+    Raw detection for one frame followed by the session's tracker update.
+    Haar ROI search is steered by the session's current tracks.
+    """
+    roi_state = session['roi_state']
+    with trace_span('detection') as span:
+        boxes, confidences, keypoints = detector.detect_faces_with_keypoints(frame, roi_state)
+        poses = estimate_pose_from_keypoints(keypoints) if keypoints is not None else None
+        if session['capture'] is not None:
+            session['capture'].observe_detections(boxes, confidences, poses)
+        result = session['face_tracker'].update(boxes, confidences, poses)
+        roi_state.hints = session['face_tracker'].track_boxes()
+        span.set_attribute('faces', result[1])
+    return result
+
+
+def build_batch_events(batch_result: BatchAnalysisResult, batch_number: int) -> List[Dict]:
+    """Events reported for a closed batch"""
+    events = []
+    
+    if batch_result.multi_face_confirmed:
+        events.append({
+            'type': 'multiple_faces',
+            'severity': 'very_suspicious',
+            'message': f'Multiple faces BATCH-CONFIRMED ({batch_result.dominant_face_count} faces in {batch_result.face_count_dominance_pct:.0%} of batch)'
+        })
+    
+    if batch_result.camera_unusable_confirmed:
+        events.append({
+            'type': 'camera_unusable',
+            'severity': 'suspicious',
+            'message': f'Camera view unusable BATCH-CONFIRMED ({batch_result.unusable_pct:.0%} of batch: '
+                       f'{", ".join(batch_result.unusable_reasons)})'
+        })
+    
+    if batch_result.no_face_confirmed:
+        events.append({
+            'type': 'no_face',
+            'severity': 'suspicious',
+            'message': f'No face BATCH-CONFIRMED (in {batch_result.face_count_histogram.get(0, 0):.0%} of batch)'
+        })
+    
+    if batch_result.gaze_away_pct >= GAZE_AWAY_BATCH_THRESHOLD:
+        events.append({
+            'type': 'gaze_away',
+            'severity': 'info',
+            'message': f'Looking away from screen in {batch_result.gaze_away_pct:.0%} of batch'
+        })
+    
+    # Batch analysis event
+    events.append({
+        'type': 'batch_analysis',
+        'severity': 'info' if batch_result.dominant_classification == 'normal' else batch_result.dominant_classification.replace('_', ' '),
+        'message': f'Batch #{batch_number}: {batch_result.total_frames} frames, {batch_result.batch_duration:.1f}s'
+    })
+    return events
 
 
-# =============================================================================
-# MAIN PROCESSING FUNCTION
-# =============================================================================
 
+def batch_violation_types(batch_result: BatchAnalysisResult) -> List[str]:
+    """Violation event types of a closed batch (as in build_batch_events), for exam aggregates"""
+    violations = []
+    if batch_result.multi_face_confirmed:
+        violations.append('multiple_faces')
+    if batch_result.camera_unusable_confirmed:
+        violations.append('camera_unusable')
+    if batch_result.no_face_confirmed:
+        violations.append('no_face')
+    if batch_result.gaze_away_pct >= GAZE_AWAY_BATCH_THRESHOLD:
+        violations.append('gaze_away')
+    return violations
+
+
+def session_update(session_id: str, session: Dict, events: List[Tuple[str, Dict]] = ()) -> Dict:
+    """
+    Event hub message: the session's owner, its compact state (for
+    /api/sessions/state) and full exam contribution (state, credibility,
+    cumulative counts), plus events to publish. Each message replaces the
+    previous one, so a lost message is repaired by the next and a
+    restarted hub rebuilds its state within one batch.
+    """
+    message = {'session_id': session_id, 'exam_id': session['exam_id'], 'owner': session['owner'],
+               'compact': session['batch_processor'].compact_state(), 'events': list(events)}
+    if session['exam_id'] is not None:
+        processor = session['batch_processor']
+        message.update({
+            'state': processor.confirmed_state,
+            'credibility': float(round(processor.credibility_score, 2)),
+            'batches': session['exam_batches'],
+            'violations': dict(session['exam_violations'])
+        })
+    return message
+
+
+def publish_batch_events(session_id: Optional[str], session: Dict, batch_result: BatchAnalysisResult,
+                         state: Dict):
+    """Batch-close events for event stream subscribers of the session and its exam (one hub message)"""
+    sid = session_id or session_manager.default_session_id
+    base = {'session_id': sid, 'exam_id': session['exam_id'], 'batch_number': state['batch_count']}
+    events = [('batch', {
+        **base,
+        'version': session['batch_processor'].state_version,
+        'confirmed_state': state['confirmed_state'],
+        'pending_state': state['pending_state'],
+        'credibility_score': float(round(state['credibility_score'], 1)),
+        'face_count': int(batch_result.dominant_face_count),
+        'decision_reason': batch_result.decision_reason
+    })]
+    if batch_result.state_changed_from is not None:
+        events.append(('state_change', {
+            **base, 'from': batch_result.state_changed_from, 'to': state['confirmed_state']}))
+    if batch_result.multi_face_confirmed:
+        events.append(('multi_face_confirmed', {**base, 'face_count': int(batch_result.dominant_face_count)}))
+    if batch_result.no_face_confirmed:
+        events.append(('no_face_confirmed', base))
+    event_channel.send(session_update(sid, session, events))
+
+
+@track_service_load
 def process_comprehensive_proctoring(frame: np.ndarray, 
                                      no_face_duration_from_frontend: int,
                                      is_idle: bool, 
                                      audio_level: float,
-                                     session_id: str = None) -> Dict:
+                                     session_id: str = None,
+                                     deadline: Optional[RequestDeadline] = None) -> Dict:
     """
     BATCH-BASED COMPREHENSIVE PROCTORING
     
@@ -1461,15 +6330,24 @@ def process_comprehensive_proctoring(frame: np.ndarray,
     TASK 7: Debug logging per batch
     
     NO PER-FRAME DECISIONS. Batch certainty > frame certainty.
+    
+    Every response carries 'capture' with the server-recommended
+    next_frame_interval_ms for this session (CaptureRateGovernor).
+    
+    With a deadline, the CNN, phone detection and ensemble run only if
+    their estimated cost fits in the remaining budget; otherwise the
+    session's last result is reused (the sample's class vote then carries
+    DEGRADED_SAMPLE_WEIGHT) and the stage is recorded in deadline.degraded.
     """
     session = session_manager.get_session(session_id)
-    face_tracker = session['face_tracker']
     batch_processor = session['batch_processor']
     
     # Check for duplicate frame (loopback bug prevention)
     if session_manager.is_duplicate_frame(session_id, frame):
         # Return last batch result if available
+        capture_governor.observe_duplicate(session, True)
         state = batch_processor.get_current_state()
+        capture = capture_governor.recommend(session, state)
         return {
             'success': True,
             'classification': state['confirmed_state'],
@@ -1484,7 +6362,8 @@ def process_comprehensive_proctoring(frame: np.ndarray,
             },
             'credibility_score': float(round(state['credibility_score'], 1)),
             'message': 'Duplicate frame skipped',
-            'batch_pending': True
+            'batch_pending': True,
+            'capture': capture
         }
     
     # =========================================================================
@@ -1492,19 +6371,72 @@ def process_comprehensive_proctoring(frame: np.ndarray,
     # =========================================================================
     current_time = time.time()
     frame_hash = hashlib.md5(frame.tobytes()[:1000]).hexdigest()[:16]
+    capture_governor.observe_duplicate(session, False)
     
-    # Face detection (raw, per-frame)
-    boxes, confidences = detector.detect_faces_raw(frame)
-    active_faces, face_count, face_confidences = face_tracker.update(boxes, confidences)
-    
-    # Behavior classification (raw, per-frame)
-    raw_classification, raw_confidence, raw_probs = classify_behavior_raw(frame)
-    
-    # Phone detection (raw, per-frame)
-    phone_detected = False
-    if face_count > 0 and len(active_faces) > 0:
-        phone_prob = detect_phone_usage(frame, active_faces[0].bbox)
+    # Quality gate: dark/covered/blurred frames skip every inference stage
+    with trace_span('quality_gate'):
+        frame_quality = quality_gate.assess(frame)
+    behavior_input = None
+    classification_weight = 1.0
+    if frame_quality:
+        active_faces, face_count, face_confidences = [], 0, []
+        raw_classification, raw_confidence, raw_probs = None, 0.0, {}
+        phone_detected = False
+    else:
+        inference_started = time.perf_counter()
+        
+        # Face detection (raw, per-frame) + tracking - never degraded
+        active_faces, face_count, face_confidences = detect_and_track(session, frame)
+        stage_timings.observe('detection', time.perf_counter() - inference_started)
+        capture_governor.observe_frame(session, face_count, active_faces)
+        
+        # Behavior classification (raw, per-frame) - or deferred to batch close
+        if batch_processor.lazy_classification:
+            behavior_input = compact_behavior_input(frame)
+            raw_classification, raw_confidence, raw_probs = None, 0.0, {}
+        elif deadline is None or deadline.allows('behavior_cnn'):
+            stage_started = time.perf_counter()
+            raw_classification, raw_confidence, raw_probs = classify_behavior_raw(frame)
+            stage_timings.observe('behavior_cnn', time.perf_counter() - stage_started)
+            session['last_behavior'] = (raw_classification, raw_confidence, raw_probs)
+            shadow_evaluator.offer(session_id or 'default', frame, raw_classification)
+        elif session['last_behavior'] is not None:
+            raw_classification, raw_confidence, raw_probs = session['last_behavior']
+            classification_weight = DEGRADED_SAMPLE_WEIGHT
+            deadline.degrade('behavior_cnn', 'reused')
+        else:
+            raw_classification, raw_confidence, raw_probs = None, 0.0, {}
+            classification_weight = 0.0
+            deadline.degrade('behavior_cnn', 'skipped')
+        
+        # Phone detection (raw, per-frame)
+        phone_prob = 0.0
+        if face_count > 0 and len(active_faces) > 0:
+            if deadline is None or deadline.allows('phone_detection'):
+                stage_started = time.perf_counter()
+                with trace_span('phone_detection'):
+                    phone_prob = detect_phone_usage(frame, active_faces[0].bbox)
+                stage_timings.observe('phone_detection', time.perf_counter() - stage_started)
+                session['last_phone_prob'] = phone_prob
+            else:
+                phone_prob = session['last_phone_prob']
+                deadline.degrade('phone_detection', 'reused')
         phone_detected = phone_prob > 0.5
+        
+        # Ensemble soft vote over the frame's features (needs per-frame CNN output)
+        if ensemble_engine.ready and raw_probs:
+            if deadline is None or deadline.allows('ensemble'):
+                stage_started = time.perf_counter()
+                raw_classification, raw_confidence, raw_probs = ensemble_engine.classify(
+                    ensemble_feature_row(face_count, active_faces, phone_prob, raw_probs)[None])[0]
+                stage_timings.observe('ensemble', time.perf_counter() - stage_started)
+            else:
+                deadline.degrade('ensemble', 'skipped')
+        
+        quality_gate.observe_inference(time.perf_counter() - inference_started)
+    
+    # Head pose (from detection keypoints, smoothed per track - no extra inference)
+    head_pose = head_pose_summary(active_faces[0] if active_faces else None, frame)
     
     # =========================================================================
     # STEP 2: ADD FRAME TO BATCH (TASK 1: Frame Collection)
@@ -1517,44 +6449,33 @@ def process_comprehensive_proctoring(frame: np.ndarray,
         classification_confidence=raw_confidence,
         probabilities=raw_probs,
         phone_detected=phone_detected,
-        frame_hash=frame_hash
+        frame_hash=frame_hash,
+        gaze_away=head_pose['gaze_away'],
+        frame_quality=frame_quality,
+        classification_weight=classification_weight
     )
     
-    # Add to batch and check if batch is ready
-    batch_result = batch_processor.add_frame(frame_sample)
+    # Add to batch and check if batch is ready (closing a batch runs lazy classification)
+    with trace_span('batch.add_frame') as span:
+        batch_result = batch_processor.add_frame(frame_sample, behavior_input)
+        span.set_attribute('batch.closed', batch_result is not None)
     
     # =========================================================================
     # STEP 3: BUILD RESPONSE
     # =========================================================================
     state = batch_processor.get_current_state()
+    capture_frame(session, frame, frame_sample, batch_result, state)
+    capture = capture_governor.recommend(session, state)
     
     if batch_result:
         # BATCH WAS PROCESSED - Return batch decision
         session['last_batch_result'] = batch_result
+        shadow_evaluator.observe_batch(session_id or 'default', batch_result)
+        session_manager.record_batch(session, batch_result)
+        publish_batch_events(session_id, session, batch_result, state)
         
         # Generate events based on batch result
-        events = []
-        
-        if batch_result.multi_face_confirmed:
-            events.append({
-                'type': 'multiple_faces',
-                'severity': 'very_suspicious',
-                'message': f'Multiple faces BATCH-CONFIRMED ({batch_result.dominant_face_count} faces in {batch_result.face_count_dominance_pct:.0%} of batch)'
-            })
-        
-        if batch_result.no_face_confirmed:
-            events.append({
-                'type': 'no_face',
-                'severity': 'suspicious',
-                'message': f'No face BATCH-CONFIRMED (in {batch_result.face_count_histogram.get(0, 0):.0%} of batch)'
-            })
-        
-        # Batch analysis event
-        events.append({
-            'type': 'batch_analysis',
-            'severity': 'info' if batch_result.dominant_classification == 'normal' else batch_result.dominant_classification.replace('_', ' '),
-            'message': f'Batch #{state["batch_count"]}: {batch_result.total_frames} frames, {batch_result.batch_duration:.1f}s'
-        })
+        events = build_batch_events(batch_result, state['batch_count'])
         
         return {
             'success': True,
@@ -1568,7 +6489,8 @@ def process_comprehensive_proctoring(frame: np.ndarray,
                 'no_face_duration': 0.0,
                 'no_face_confirmed': batch_result.no_face_confirmed
             },
-            'head_pose': {'direction': 'unknown', 'gaze_away': False},
+            'head_pose': head_pose,
+            'frame_quality': {'usable': frame_quality is None, 'reason': frame_quality},
             'phone_detection': {'detected': phone_detected, 'probability': 0.0},
             'idle_detection': {'is_idle': is_idle},
             'audio_monitoring': {'noise_detected': audio_level > 0.5, 'level': float(round(audio_level, 3))},
@@ -1579,6 +6501,7 @@ def process_comprehensive_proctoring(frame: np.ndarray,
             'frame_number': session['frame_count'],
             'batch_processed': True,
             'batch_number': state['batch_count'],
+            'capture': capture,
             # TASK 7: Debug verification data
             'debug': {
                 'batch': {
@@ -1590,8 +6513,15 @@ def process_comprehensive_proctoring(frame: np.ndarray,
                     'classification_histogram': {k: float(round(v, 3)) for k, v in batch_result.classification_histogram.items()},
                     'classification_dominant': batch_result.dominant_classification,
                     'classification_dominance_pct': float(round(batch_result.classification_dominance_pct, 3)),
+                    'classification_dominance_bounds': [float(round(b, 3)) for b in batch_result.classification_dominance_bounds],
+                    'classification_sampled_frames': batch_result.classification_sampled_frames,
                     'multi_face_confirmed': batch_result.multi_face_confirmed,
                     'no_face_confirmed': batch_result.no_face_confirmed,
+                    'gaze_away_frames': batch_result.gaze_away_frames,
+                    'gaze_away_pct': float(round(batch_result.gaze_away_pct, 3)),
+                    'unusable_frames': batch_result.unusable_frames,
+                    'unusable_reasons': batch_result.unusable_reasons,
+                    'degraded_frames': batch_result.degraded_frames,
                     'decision_reason': batch_result.decision_reason
                 },
                 'state': {
@@ -1616,7 +6546,8 @@ def process_comprehensive_proctoring(frame: np.ndarray,
                 'no_face_duration': 0.0,
                 'no_face_confirmed': False
             },
-            'head_pose': {'direction': 'unknown', 'gaze_away': False},
+            'head_pose': head_pose,
+            'frame_quality': {'usable': frame_quality is None, 'reason': frame_quality},
             'phone_detection': {'detected': phone_detected, 'probability': 0.0},
             'idle_detection': {'is_idle': is_idle},
             'audio_monitoring': {'noise_detected': audio_level > 0.5, 'level': float(round(audio_level, 3))},
@@ -1627,16 +6558,18 @@ def process_comprehensive_proctoring(frame: np.ndarray,
             'frame_number': session['frame_count'],
             'batch_pending': True,
             'batch_buffer_size': state['buffer_size'],
+            'capture': capture,
             # TASK 7: Debug info for pending batch
             'debug': {
                 'batch_pending': {
                     'buffer_size': state['buffer_size'],
                     'max_frames': BATCH_MAX_FRAMES,
-                    'max_duration': BATCH_MAX_DURATION_SECONDS
+                    'max_duration': state['max_duration']
                 },
                 'raw_frame': {
                     'face_count': face_count,
-                    'classification': raw_classification,
+                    'classification': raw_classification or ('unusable' if frame_quality else
+                                                              'skipped' if classification_weight == 0.0 else 'deferred'),
                     'confidence': float(round(raw_confidence, 3))
                 },
                 'state': {
@@ -1648,11 +6581,218 @@ def process_comprehensive_proctoring(frame: np.ndarray,
         }
 
 
+def batch_decision_summary(batch_result: BatchAnalysisResult, batch_number: int) -> Dict:
+    """Compact JSON form of a closed batch's decision"""
+    return {
+        'batch_number': batch_number,
+        'classification': batch_result.dominant_classification,
+        'confidence': float(round(batch_result.classification_dominance_pct, 3)),
+        'face_count': int(batch_result.dominant_face_count),
+        'multiple_faces_confirmed': batch_result.multi_face_confirmed,
+        'no_face_confirmed': batch_result.no_face_confirmed,
+        'gaze_away_pct': float(round(batch_result.gaze_away_pct, 3)),
+        'unusable_frames': batch_result.unusable_frames,
+        'unusable_reasons': batch_result.unusable_reasons,
+        'degraded_frames': batch_result.degraded_frames,
+        'face_count_histogram': {str(k): float(round(v, 3)) for k, v in batch_result.face_count_histogram.items()},
+        'classification_histogram': {k: float(round(v, 3)) for k, v in batch_result.classification_histogram.items()},
+        'classification_dominance_bounds': [float(round(b, 3)) for b in batch_result.classification_dominance_bounds],
+        'classification_sampled_frames': batch_result.classification_sampled_frames,
+        'total_frames': batch_result.total_frames,
+        'duration': float(round(batch_result.batch_duration, 2)),
+        'decision_reason': batch_result.decision_reason,
+        'events': build_batch_events(batch_result, batch_number)
+    }
+
+
+@track_service_load
+def process_proctoring_frames(frames: List[np.ndarray], timestamps: List[float],
+                              session_id: str = None,
+                              deadline: Optional[RequestDeadline] = None) -> Dict:
+    """
+    MULTI-FRAME (MINI-BATCH) PROCTORING
+    
+    Processes an ordered window of client-buffered frames for one session:
+    - Frames failing the quality gate skip every inference stage
+    - Detection runs per frame in order (detectors are stateful, not batchable)
+    - The behaviour CNN runs ONCE over all usable frames (single batched forward
+      pass), or is deferred to batch close in lazy classification mode
+    - With ENABLE_ENSEMBLE_MODELS the ensemble scores the window in one call
+    - Results feed FaceTracker and BatchFrameProcessor in timestamp order
+    
+    With a deadline, the CNN classifies only as many (evenly spaced) frames
+    as the budget allows after reserving per-frame detection; the others
+    reuse the nearest earlier result at DEGRADED_SAMPLE_WEIGHT. Phone
+    detection and the ensemble are skipped when they no longer fit.
+    
+    Returns every batch decision closed by this window plus the final state.
+    """
+    session = session_manager.get_session(session_id)
+    batch_processor = session['batch_processor']
+    
+    # Change gating per frame (duplicates are dropped before inference)
+    kept = []
+    with trace_span('duplicate_check', frames=len(frames)):
+        for frame, timestamp in zip(frames, timestamps):
+            duplicate = session_manager.is_duplicate_frame(session_id, frame)
+            capture_governor.observe_duplicate(session, duplicate)
+            if not duplicate:
+                kept.append((frame, timestamp))
+    
+    with trace_span('quality_gate', frames=len(kept)):
+        qualities = [quality_gate.assess(frame) for frame, _ in kept]
+    usable = [frame for (frame, _), quality in zip(kept, qualities) if not quality]
+    
+    # One batched CNN pass over the whole window (lazy mode: at batch close)
+    lazy = batch_processor.lazy_classification
+    cnn_started = time.perf_counter()
+    usable_weights = [1.0] * len(usable)
+    usable_fresh = [not lazy] * len(usable)
+    if lazy:
+        usable_results = [(None, 0.0, {})] * len(usable)
+    else:
+        fit = len(usable) if deadline is None else deadline.affordable(
+            'behavior_cnn', len(usable), stage_timings.estimate('detection') * len(usable))
+        if fit >= len(usable):
+            usable_results = classify_behavior_batch(usable)
+        else:
+            picks = ((np.arange(fit) + 0.5) * len(usable) / fit).astype(int).tolist() if fit else []
+            picked = dict(zip(picks, classify_behavior_batch([usable[i] for i in picks])))
+            usable_results = []
+            last = session['last_behavior']
+            for i in range(len(usable)):
+                if i in picked:
+                    last = picked[i]
+                    usable_results.append(last)
+                    continue
+                usable_fresh[i] = False
+                if last is not None:
+                    usable_results.append(last)
+                    usable_weights[i] = DEGRADED_SAMPLE_WEIGHT
+                    deadline.degrade('behavior_cnn', 'reused')
+                else:
+                    usable_results.append((None, 0.0, {}))
+                    usable_weights[i] = 0.0
+                    deadline.degrade('behavior_cnn', 'skipped')
+        classified = sum(usable_fresh)
+        if classified:
+            stage_timings.observe('behavior_cnn', time.perf_counter() - cnn_started, classified)
+            session['last_behavior'] = [r for r, f in zip(usable_results, usable_fresh) if f][-1]
+    cnn_seconds_per_frame = (time.perf_counter() - cnn_started) / max(1, len(usable))
+    usable_results = iter(zip(usable_results, usable_weights, usable_fresh))
+    frames_left = len(usable)
+    
+    # Per-frame detection/tracking in order (stateful, not batchable); track
+    # state is read here since later frames keep updating the same tracks
+    use_ensemble = ensemble_engine.ready and not lazy
+    analyses = []
+    cnn_labels = []  # Active model's own label per frame, for shadow comparison
+    ensemble_rows = []
+    for (frame, timestamp), frame_quality in zip(kept, qualities):
+        if frame_quality:
+            analyses.append((0, [], (None, 0.0, {}), 0.0, False, 1.0))
+            cnn_labels.append(None)
+            continue
+        inference_started = time.perf_counter()
+        active_faces, face_count, face_confidences = detect_and_track(session, frame)
+        stage_timings.observe('detection', time.perf_counter() - inference_started)
+        capture_governor.observe_frame(session, face_count, active_faces)
+        behavior_result, classification_weight, fresh = next(usable_results)
+        frames_left -= 1
+        
+        phone_prob = 0.0
+        if face_count > 0 and len(active_faces) > 0:
+            if deadline is None or deadline.allows('phone_detection',
+                                                   stage_timings.estimate('detection') * frames_left):
+                stage_started = time.perf_counter()
+                with trace_span('phone_detection'):
+                    phone_prob = detect_phone_usage(frame, active_faces[0].bbox)
+                stage_timings.observe('phone_detection', time.perf_counter() - stage_started)
+                session['last_phone_prob'] = phone_prob
+            else:
+                phone_prob = session['last_phone_prob']
+                deadline.degrade('phone_detection', 'reused')
+        gaze_away = active_faces[0].is_gaze_away() if active_faces else False
+        if use_ensemble and behavior_result[2]:
+            ensemble_rows.append((len(analyses), ensemble_feature_row(face_count, active_faces, phone_prob,
+                                                                     behavior_result[2])))
+        analyses.append((face_count, face_confidences, behavior_result, phone_prob, gaze_away,
+                         classification_weight))
+        cnn_labels.append(behavior_result[0] if fresh else None)
+        quality_gate.observe_inference(time.perf_counter() - inference_started + cnn_seconds_per_frame)
+    
+    # Ensemble: ONE scoring call for all usable frames of the window
+    if ensemble_rows:
+        if deadline is None or deadline.affordable('ensemble', len(ensemble_rows)) == len(ensemble_rows):
+            stage_started = time.perf_counter()
+            results = ensemble_engine.classify(np.stack([row for _, row in ensemble_rows]))
+            stage_timings.observe('ensemble', time.perf_counter() - stage_started, len(ensemble_rows))
+            for (i, _), result in zip(ensemble_rows, results):
+                analyses[i] = analyses[i][:2] + (result,) + analyses[i][3:]
+        else:
+            deadline.degrade('ensemble', 'skipped', len(ensemble_rows))
+    
+    batch_decisions = []
+    for (frame, timestamp), frame_quality, analysis, cnn_label in zip(kept, qualities, analyses, cnn_labels):
+        face_count, face_confidences, behavior_result, phone_prob, gaze_away, classification_weight = analysis
+        raw_classification, raw_confidence, raw_probs = behavior_result
+        
+        frame_sample = FrameSample(
+            timestamp=timestamp,
+            face_count=face_count,
+            face_confidences=face_confidences,
+            classification=raw_classification,
+            classification_confidence=raw_confidence,
+            probabilities=raw_probs,
+            phone_detected=phone_prob > 0.5,
+            frame_hash=hashlib.md5(frame.tobytes()[:1000]).hexdigest()[:16],
+            gaze_away=gaze_away,
+            frame_quality=frame_quality,
+            classification_weight=classification_weight
+        )
+        with trace_span('batch.add_frame'):
+            batch_result = batch_processor.add_frame(
+                frame_sample, compact_behavior_input(frame) if lazy and not frame_quality else None)
+        batch_state = batch_processor.get_current_state() if batch_result else None
+        capture_frame(session, frame, frame_sample, batch_result, batch_state)
+        if cnn_label is not None:
+            shadow_evaluator.offer(session_id or 'default', frame, cnn_label)
+        if batch_result:
+            session['last_batch_result'] = batch_result
+            shadow_evaluator.observe_batch(session_id or 'default', batch_result)
+            session_manager.record_batch(session, batch_result)
+            publish_batch_events(session_id, session, batch_result, batch_state)
+            batch_decisions.append(batch_decision_summary(batch_result, batch_state['batch_count']))
+    
+    state = batch_processor.get_current_state()
+    capture = capture_governor.recommend(session, state)
+    
+    return {
+        'success': True,
+        'classification': state['confirmed_state'],
+        'credibility_score': float(round(state['credibility_score'], 1)),
+        'frames_received': len(frames),
+        'frames_processed': len(kept),
+        'duplicates_skipped': len(frames) - len(kept),
+        'unusable_frames': len(kept) - len(usable),
+        'batches': batch_decisions,
+        'batch_processed': len(batch_decisions) > 0,
+        'batch_buffer_size': state['buffer_size'],
+        'frame_number': session['frame_count'],
+        'capture': capture,
+        'state': {
+            'confirmed_state': state['confirmed_state'],
+            'pending_state': state['pending_state'],
+            'consecutive_batches': state['consecutive_batches']
+        }
+    }
+
+
 # =============================================================================
 # API ENDPOINTS
 # =============================================================================
 
-@app.route('/health', methods=['GET'])
+@api.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
     return jsonify({
@@ -1663,12 +6803,13 @@ def health_check():
             'temporal_tracking': True,
             'classification_smoothing': True,
             'credibility_ema': True,
-            'multi_face_confirmation': True
+            'multi_face_confirmation': True,
+            'ensemble_models': ensemble_engine.ready
         }
     })
 
 
-@app.route('/api/reset-session', methods=['POST'])
+@api.route('/api/reset-session', methods=['POST'])
 def reset_session():
     """Reset session state (call at start of new exam)"""
     try:
@@ -1680,7 +6821,7 @@ def reset_session():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
-@app.route('/api/detect-faces', methods=['POST'])
+@api.route('/api/detect-faces', methods=['POST'])
 @require_auth
 def detect_faces_endpoint():
     """Face detection endpoint (requires authentication)"""
@@ -1690,12 +6831,18 @@ def detect_faces_endpoint():
         if not data or 'image' not in data:
             return jsonify({'success': False, 'error': 'Missing image data'}), 400
         
-        frame = decode_base64_image(data['image'])
-        if frame is None:
-            return jsonify({'success': False, 'error': 'Failed to decode image'}), 400
-        
-        # Raw detection (no tracking)
-        boxes, confidences = detector.detect_faces_raw(frame)
+        # Raw detection (no tracking) - served from the result cache for repeated images
+        digest = ResultCache.digest(data['image'])
+        cached = result_cache.get('detect-faces', str(detector.detection_method), digest)
+        if cached is not None:
+            boxes, confidences = cached
+        else:
+            frame = decode_base64_image(data['image'])
+            if frame is None:
+                return jsonify({'success': False, 'error': 'Failed to decode image'}), 400
+            boxes, confidences = detector.detect_faces_raw(frame)
+            result_cache.put('detect-faces', str(detector.detection_method), digest,
+                             (boxes, confidences), 64 + 48 * len(boxes))
         
         # For single-frame detection, use tracker briefly
         session = session_manager.get_session()
@@ -1723,7 +6870,7 @@ def detect_faces_endpoint():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
-@app.route('/api/validate-setup', methods=['POST'])
+@api.route('/api/validate-setup', methods=['POST'])
 @require_auth
 def validate_setup():
     """Validate webcam setup with multiple frames"""
@@ -1786,28 +6933,46 @@ def validate_setup():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
-@app.route('/api/comprehensive-proctoring', methods=['POST'])
+@api.route('/api/comprehensive-proctoring', methods=['POST'])
 @require_auth
 def comprehensive_proctoring():
-    """Comprehensive proctoring endpoint (requires authentication)"""
+    """
+    Comprehensive proctoring endpoint (requires authentication).
+    
+    Optional X-Request-Deadline-Ms header: latency budget for this frame
+    (default DEADLINE_DEFAULT_MS); see 'deadline' in the response.
+    """
+    deadline = RequestDeadline.from_request('comprehensive-proctoring')
     try:
         data = request.get_json()
         
         if not data or 'image' not in data:
             return jsonify({'success': False, 'error': 'Missing image data'}), 400
         
-        frame = decode_base64_image(data['image'])
-        if frame is None:
-            return jsonify({'success': False, 'error': 'Failed to decode image'}), 400
-        
-        no_face_duration = data.get('no_face_duration', 0)
-        is_idle = data.get('is_idle', False)
-        audio_level = data.get('audio_level', 0.0)
         session_id = data.get('session_id')
         
-        response = process_comprehensive_proctoring(
-            frame, no_face_duration, is_idle, audio_level, session_id
-        )
+        # Admission control before any decode work
+        session = session_manager.get_session(session_id, data.get('exam_id'), request.user_id)
+        shed_reason = admission_controller.try_admit(session)
+        if shed_reason:
+            return shed_response(session, shed_reason)
+        
+        try:
+            with trace_span('decode'):
+                frame = decode_base64_image(data['image'])
+            if frame is None:
+                return jsonify({'success': False, 'error': 'Failed to decode image'}), 400
+            
+            no_face_duration = data.get('no_face_duration', 0)
+            is_idle = data.get('is_idle', False)
+            audio_level = data.get('audio_level', 0.0)
+            
+            response = process_comprehensive_proctoring(
+                frame, no_face_duration, is_idle, audio_level, session_id, deadline
+            )
+            response['deadline'] = deadline.summary()
+        finally:
+            admission_controller.release()
         
         return jsonify(response)
         
@@ -1818,33 +6983,179 @@ def comprehensive_proctoring():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
-@app.route('/api/comprehensive-proctoring-test', methods=['POST', 'OPTIONS'])
+@api.route('/api/comprehensive-proctoring/frames', methods=['POST'])
+@require_auth
+def comprehensive_proctoring_frames():
+    """
+    Multi-frame proctoring endpoint (requires authentication).
+    
+    Request body:
+    {
+        "session_id": "...",
+        "exam_id": "...",  # optional, groups sessions for /api/events
+        "frames": [{"image": "base64...", "timestamp": 1700000000123}, ...]
+    }
+    Timestamps are client capture times in milliseconds since epoch.
+    Optional X-Request-Deadline-Ms header: latency budget for the window.
+    """
+    deadline = RequestDeadline.from_request('comprehensive-proctoring-frames')
+    try:
+        data = request.get_json()
+        
+        frames_data = data.get('frames') if data else None
+        if not isinstance(frames_data, list) or len(frames_data) == 0:
+            return jsonify({'success': False, 'error': 'Missing frames data'}), 400
+        if len(frames_data) > MULTI_FRAME_MAX_FRAMES:
+            return jsonify({'success': False, 'error': f'Too many frames (max {MULTI_FRAME_MAX_FRAMES})'}), 400
+        if not all(isinstance(item, dict) and 'image' in item for item in frames_data):
+            return jsonify({'success': False, 'error': 'Each frame needs image data'}), 400
+        
+        session_id = data.get('session_id')
+        
+        session = session_manager.get_session(session_id, data.get('exam_id'), request.user_id)
+        shed_reason = admission_controller.try_admit(session)
+        if shed_reason:
+            return shed_response(session, shed_reason)
+        
+        try:
+            # Order by client capture time, then decode in parallel
+            now_ms = time.time() * 1000.0
+            ordered = sorted(frames_data, key=lambda item: float(item.get('timestamp', now_ms)))
+            with trace_span('decode', frames=len(ordered)):
+                decoded = list(decode_executor.map(decode_base64_image, [item['image'] for item in ordered]))
+            
+            frames = []
+            timestamps = []
+            for item, frame in zip(ordered, decoded):
+                if frame is not None:
+                    frames.append(frame)
+                    timestamps.append(float(item.get('timestamp', now_ms)) / 1000.0)
+            if not frames:
+                return jsonify({'success': False, 'error': 'Failed to decode frames'}), 400
+            
+            response = process_proctoring_frames(frames, timestamps, session_id, deadline)
+            response['frames_undecodable'] = len(ordered) - len(frames)
+            response['deadline'] = deadline.summary()
+        finally:
+            admission_controller.release()
+        
+        return jsonify(response)
+        
+    except Exception as e:
+        import traceback
+        logger.error(f"Error in comprehensive_proctoring_frames: {str(e)}")
+        logger.error(traceback.format_exc())
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@api.route('/api/comprehensive-proctoring/video', methods=['POST'])
+@require_auth
+def comprehensive_proctoring_video():
+    """
+    Video-chunk proctoring endpoint (requires authentication).
+    
+    Request body:
+    {
+        "session_id": "...",
+        "exam_id": "...",                   # optional, groups sessions for /api/events
+        "video": "base64 encoded segment",
+        "format": "webm" | "mp4" | "avi" | "mkv" | "mjpeg",
+        "start_timestamp": 1700000000000,   # segment start, ms since epoch
+        "fps": 30,                          # optional source fps (needed for raw mjpeg)
+        "sample_fps": 10                    # optional server-side sampling rate
+    }
+    Optional X-Request-Deadline-Ms header: latency budget for the segment.
+    """
+    deadline = RequestDeadline.from_request('comprehensive-proctoring-video')
+    try:
+        data = request.get_json()
+        
+        if not data or 'video' not in data:
+            return jsonify({'success': False, 'error': 'Missing video data'}), 400
+        
+        container = str(data.get('format', 'webm')).lower()
+        if container != 'mjpeg' and container not in VIDEO_CONTAINER_SUFFIXES:
+            return jsonify({'success': False, 'error': f'Unsupported video format: {container}'}), 400
+        
+        session_id = data.get('session_id')
+        
+        session = session_manager.get_session(session_id, data.get('exam_id'), request.user_id)
+        shed_reason = admission_controller.try_admit(session)
+        if shed_reason:
+            return shed_response(session, shed_reason)
+        
+        try:
+            video_str = data['video']
+            if ',' in video_str:
+                video_str = video_str.split(',')[1]
+            video_bytes = base64.b64decode(video_str)
+            if len(video_bytes) > VIDEO_MAX_SEGMENT_BYTES:
+                return jsonify({'success': False, 'error': 'Video segment too large'}), 413
+            
+            sample_fps = float(data.get('sample_fps', VIDEO_SAMPLE_FPS))
+            source_fps = float(data['fps']) if data.get('fps') else None
+            with trace_span('decode', container=container, bytes=len(video_bytes)):
+                frames, offsets = sample_video_segment(video_bytes, container, sample_fps, source_fps)
+            if not frames:
+                return jsonify({'success': False, 'error': 'Failed to decode video'}), 400
+            frames, offsets = frames[:MULTI_FRAME_MAX_FRAMES], offsets[:MULTI_FRAME_MAX_FRAMES]
+            
+            start_time = float(data.get('start_timestamp', time.time() * 1000.0)) / 1000.0
+            response = process_proctoring_frames(frames, [start_time + o for o in offsets], session_id, deadline)
+            response['segment_bytes'] = len(video_bytes)
+            response['deadline'] = deadline.summary()
+        finally:
+            admission_controller.release()
+        
+        return jsonify(response)
+        
+    except Exception as e:
+        import traceback
+        logger.error(f"Error in comprehensive_proctoring_video: {str(e)}")
+        logger.error(traceback.format_exc())
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@api.route('/api/comprehensive-proctoring-test', methods=['POST', 'OPTIONS'])
 def comprehensive_proctoring_test():
     """Test endpoint (no auth required)"""
     if request.method == 'OPTIONS':
         response = jsonify({'success': True})
         response.headers.add('Access-Control-Allow-Origin', '*')
-        response.headers.add('Access-Control-Allow-Headers', 'Content-Type')
+        response.headers.add('Access-Control-Allow-Headers', f'Content-Type, {DEADLINE_HEADER}')
         response.headers.add('Access-Control-Allow-Methods', 'POST, OPTIONS')
         return response, 200
     
+    deadline = RequestDeadline.from_request('comprehensive-proctoring')
     try:
         data = request.get_json()
         
         if not data or 'image' not in data:
             return jsonify({'success': False, 'error': 'Missing image data'}), 400
         
-        frame = decode_base64_image(data['image'])
-        if frame is None:
-            return jsonify({'success': False, 'error': 'Failed to decode image'}), 400
-        
-        no_face_duration = data.get('no_face_duration', 0)
-        is_idle = data.get('is_idle', False)
-        audio_level = data.get('audio_level', 0.0)
+        session = session_manager.get_session('test')
+        shed_reason = admission_controller.try_admit(session)
+        if shed_reason:
+            response, status = shed_response(session, shed_reason)
+            response.headers.add('Access-Control-Allow-Origin', '*')
+            return response, status
         
-        response_data = process_comprehensive_proctoring(
-            frame, no_face_duration, is_idle, audio_level, 'test'
-        )
+        try:
+            with trace_span('decode'):
+                frame = decode_base64_image(data['image'])
+            if frame is None:
+                return jsonify({'success': False, 'error': 'Failed to decode image'}), 400
+            
+            no_face_duration = data.get('no_face_duration', 0)
+            is_idle = data.get('is_idle', False)
+            audio_level = data.get('audio_level', 0.0)
+            
+            response_data = process_comprehensive_proctoring(
+                frame, no_face_duration, is_idle, audio_level, 'test', deadline
+            )
+            response_data['deadline'] = deadline.summary()
+        finally:
+            admission_controller.release()
         
         response = jsonify(response_data)
         response.headers.add('Access-Control-Allow-Origin', '*')
@@ -1856,17 +7167,24 @@ def comprehensive_proctoring_test():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
-@app.route('/api/classify-behavior', methods=['POST'])
+@api.route('/api/classify-behavior', methods=['POST'])
 def classify_behavior():
     """Classify behavior using CNN model"""
     try:
-        if behavior_model is None:
+        if model_registry.active_handle is None:
             return jsonify({'success': False, 'error': 'Model not available'}), 503
         
         data = request.get_json()
         if not data or 'image' not in data:
             return jsonify({'success': False, 'error': 'Missing image data'}), 400
         
+        # Identical image + model version -> cached result, no decode/inference
+        digest = ResultCache.digest(data['image'])
+        version = f"{model_registry.active_version()}|{detector.detection_method}"
+        cached = result_cache.get('classify-behavior', version, digest)
+        if cached is not None:
+            return jsonify(cached)
+        
         frame = decode_base64_image(data['image'])
         if frame is None:
             return jsonify({'success': False, 'error': 'Failed to decode image'}), 400
@@ -1878,7 +7196,7 @@ def classify_behavior():
         face_count = len(boxes)
         multiple_faces = face_count > 1
         
-        return jsonify({
+        result = {
             'success': True,
             'classification': classification,
             'confidence': round(confidence, 3),
@@ -1886,54 +7204,508 @@ def classify_behavior():
             'face_count': face_count,
             'multiple_faces': multiple_faces,
             'faces_detected': face_count > 0
-        })
+        }
+        result_cache.put('classify-behavior', version, digest, result, 600)
+        return jsonify(result)
         
     except Exception as e:
         logger.error(f"Error in classify_behavior: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
-# Model management stubs
-@app.route('/api/models', methods=['GET', 'OPTIONS'])
-def get_all_models():
-    if request.method == 'OPTIONS':
-        return jsonify({'success': True}), 200
-    return jsonify({'success': True, 'models': [], 'activeModelId': None})
+@api.route('/api/cache/stats', methods=['GET'])
+@require_admin
+def cache_stats():
+    """Result cache hit/miss metrics"""
+    return jsonify({'success': True, 'cache': result_cache.get_stats()})
+
+
+@api.route('/api/cache/invalidate', methods=['POST'])
+@require_admin
+def cache_invalidate():
+    """Explicitly drop cached results (all, or one namespace)"""
+    data = request.get_json(silent=True) or {}
+    result_cache.invalidate(data.get('namespace'))
+    return jsonify({'success': True, 'cache': result_cache.get_stats()})
+
+
+@api.route('/api/runtime/threads', methods=['GET'])
+@require_admin
+def runtime_threads():
+    """Effective thread budget / CPU affinity configuration"""
+    return jsonify({'success': True, 'threads': thread_budget.describe()})
+
+
+@api.route('/api/admission/stats', methods=['GET'])
+@require_admin
+def admission_stats():
+    """Admission control counters (in-flight budget, admitted, shed by reason)"""
+    return jsonify({'success': True, 'admission': admission_controller.get_stats()})
+
+
+@api.route('/api/quality-gate/stats', methods=['GET'])
+@require_admin
+def quality_gate_stats():
+    """Frame-quality gate counters and estimated inference time saved"""
+    return jsonify({'success': True, 'quality_gate': quality_gate.get_stats()})
+
+
+@api.route('/api/deadlines/stats', methods=['GET'])
+@require_admin
+def deadline_stats():
+    """Per-stage cost estimates used for deadline decisions, and degraded-frame counts"""
+    return jsonify({'success': True, 'stages': stage_timings.get_stats(),
+                    'default_budget_ms': DEADLINE_DEFAULT_MS, 'header': DEADLINE_HEADER})
+
+
+@api.route('/api/sessions/state', methods=['GET', 'POST'])
+@require_auth
+def bulk_session_state():
+    """
+    Compact state of many sessions in one call (requires authentication).
+    
+    GET  /api/sessions/state?session_ids=a,b,c&since=<version>
+    POST /api/sessions/state  {"session_ids": [...], "since": <version>}  (long id lists)
+    
+    Each session's version increases on every batch close (and reset),
+    and versions are comparable across sessions: `since` returns only the
+    sessions changed after it, and the response's `version` is the cursor
+    for the next poll. The weak ETag is derived from the requested ids,
+    `since` and the newest version among them, so If-None-Match answers
+    304 without building any session state.
+    
+    Non-admin callers only see sessions they own; others are listed as
+    missing. The state of all workers' sessions is kept by the event hub,
+    which assigns the versions, so this forwards the request there. With
+    EVENT_STREAM_ENABLED=false it answers from this worker's sessions
+    (complete only with a single worker).
+    """
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        session_ids = data.get('session_ids')
+        since = data.get('since', 0)
+    else:
+        session_ids = [sid for sid in request.args.get('session_ids', '').split(',') if sid]
+        since = request.args.get('since', 0)
+    if not isinstance(session_ids, list) or not session_ids or \
+            not all(isinstance(sid, str) and sid for sid in session_ids):
+        return jsonify({'success': False, 'error': 'session_ids must be a non-empty list of ids'}), 400
+    if len(session_ids) > SESSION_STATE_MAX_SESSIONS:
+        return jsonify({'success': False, 'error': f'Too many sessions (max {SESSION_STATE_MAX_SESSIONS})'}), 400
+    try:
+        since = int(since)
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'error': 'since must be an integer version'}), 400
+    
+    if EVENT_STREAM_ENABLED:
+        return forward_session_state(session_ids, since)
+    admin = request.user_type in ADMIN_USER_TYPES
+    found = []
+    missing = []
+    for sid in session_ids:
+        session = session_manager.find_session(sid)
+        if session is None or not (admin or session['owner'] == request.user_id):
+            missing.append(sid)
+        else:
+            processor = session['batch_processor']
+            found.append((sid, processor.state_version, processor.compact_state))
+    etag = bulk_state_etag(session_ids, since, found)
+    if request.if_none_match.contains_weak(etag):
+        response = make_response('', 304)
+    else:
+        response = jsonify(bulk_state_body(since, found, missing))
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def forward_session_state(session_ids: List[str], since: int):
+    """Bulk state from the event hub, with the caller's token and If-None-Match"""
+    host = '127.0.0.1' if EVENT_STREAM_HOST in ('0.0.0.0', '::', '') else EVENT_STREAM_HOST
+    headers = {'Authorization': request.headers['Authorization'], 'Content-Type': 'application/json'}
+    if request.headers.get('If-None-Match'):
+        headers['If-None-Match'] = request.headers['If-None-Match']
+    hub_request = urllib.request.Request(
+        f"http://{host}:{EVENT_STREAM_PORT}{SESSION_STATE_PATH}",
+        data=json.dumps({'session_ids': session_ids, 'since': since}).encode(), headers=headers, method='POST')
+    try:
+        with urllib.request.urlopen(hub_request, timeout=EXAM_SUMMARY_HUB_TIMEOUT_SECONDS) as response:
+            status, body, etag = response.status, response.read(), response.headers.get('ETag')
+    except urllib.error.HTTPError as e:
+        status, body, etag = e.code, e.read(), e.headers.get('ETag')
+    except OSError as e:  # Hub worker restarting
+        logger.warning(f"Session state: event hub unreachable ({str(e)[:200]})")
+        return jsonify({'success': False, 'error': 'Event hub unavailable - retry shortly'}), 503
+    response = make_response(body if status != 304 else '', status)
+    if status != 304:
+        response.headers['Content-Type'] = 'application/json'
+    if etag:
+        response.headers['ETag'] = etag
+        response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+@api.route('/api/sessions/<session_id>/credibility-timeline', methods=['GET'])
+@require_auth
+def credibility_timeline(session_id):
+    """
+    Whole-exam credibility curve of a session (requires authentication).
+    
+    Query: ?points=500 (max CREDIBILITY_TIMELINE_MAX_POINTS), optional
+    from_ms / to_ms (epoch ms) to zoom in. The curve is downsampled with
+    LTTB; state_changes lists every confirmed-state transition in the
+    range at full resolution, so no transition is lost to downsampling.
+    
+    Only the session's owner and admins can read it (404 for anyone else,
+    like an unknown session). The timeline lives in the answering worker,
+    so the curve is only complete when every frame of the session reaches
+    the same worker (a single worker, or session-sticky routing).
+    """
+    try:
+        points = int(request.args.get('points', CREDIBILITY_TIMELINE_DEFAULT_POINTS))
+        from_ms = float(request.args['from_ms']) if 'from_ms' in request.args else None
+        to_ms = float(request.args['to_ms']) if 'to_ms' in request.args else None
+    except ValueError:
+        return jsonify({'success': False, 'error': 'points, from_ms and to_ms must be numbers'}), 400
+    if not 3 <= points <= CREDIBILITY_TIMELINE_MAX_POINTS:
+        return jsonify({'success': False,
+                        'error': f'points must be between 3 and {CREDIBILITY_TIMELINE_MAX_POINTS}'}), 400
+    
+    session = session_manager.find_session(session_id)
+    if session is None or not (request.user_type in ADMIN_USER_TYPES or session['owner'] == request.user_id):
+        return jsonify({'success': False, 'error': f'Session {session_id} not found'}), 404
+    processor = session['batch_processor']
+    times, credibility, states, decisions = processor.timeline_columns()
+    batches = len(times)
+    
+    if from_ms is not None or to_ms is not None:
+        lo = np.searchsorted(times, from_ms / 1000.0, 'left') if from_ms is not None else 0
+        hi = np.searchsorted(times, to_ms / 1000.0, 'right') if to_ms is not None else batches
+        times, credibility, states, decisions = times[lo:hi], credibility[lo:hi], states[lo:hi], decisions[lo:hi]
+    
+    changes = np.flatnonzero(np.diff(states.astype(np.int16))) + 1
+    keep = lttb_indices(times, credibility, points)
+    state_changes = [{'timestamp_ms': int(round(times[i] * 1000)), 'state': BEHAVIOR_CLASSES[states[i]]}
+                     for i in changes.tolist()]
+    
+    return jsonify({
+        'success': True,
+        'session_id': session_id,
+        'batches': batches,
+        'batches_in_range': len(times),
+        'points': len(keep),
+        'downsampled': len(keep) < len(times),
+        'algorithm': 'lttb',
+        'timeline': {
+            'timestamp_ms': np.round(times[keep] * 1000).astype(np.int64).tolist(),
+            'credibility': np.round(credibility[keep].astype(np.float64), 2).tolist(),
+            'state': [BEHAVIOR_CLASSES[i] for i in states[keep].tolist()],
+            'decision': [BEHAVIOR_CLASSES[i] for i in decisions[keep].tolist()]
+        },
+        'initial_state': BEHAVIOR_CLASSES[states[0]] if len(states) else None,
+        'state_changes': state_changes,
+        'current': {
+            'credibility_score': float(round(processor.credibility_score, 1)),
+            'state': processor.confirmed_state
+        },
+        'storage_bytes': processor.timeline.nbytes
+    })
+
+
+@api.route('/api/exams/<exam_id>/summary', methods=['GET'])
+@require_admin
+def exam_summary(exam_id):
+    """
+    Exam-wide summary across all workers (requires admin).
+    
+    Sessions join an exam when a proctoring request carries exam_id. The
+    counters are kept by the event hub, which every worker updates at
+    batch close, so this forwards the request (and the caller's token)
+    to the hub listener. The summary does not iterate the exam's sessions.
+    """
+    if not EVENT_STREAM_ENABLED:
+        return jsonify({'success': False, 'error': 'Exam summaries need the event hub (EVENT_STREAM_ENABLED)'}), 503
+    host = '127.0.0.1' if EVENT_STREAM_HOST in ('0.0.0.0', '::', '') else EVENT_STREAM_HOST
+    hub_request = urllib.request.Request(
+        f"http://{host}:{EVENT_STREAM_PORT}/api/exams/{urllib.parse.quote(exam_id, safe='')}/summary",
+        headers={'Authorization': request.headers['Authorization']})
+    try:
+        with urllib.request.urlopen(hub_request, timeout=EXAM_SUMMARY_HUB_TIMEOUT_SECONDS) as response:
+            return make_response(response.read(), response.status, {'Content-Type': 'application/json'})
+    except urllib.error.HTTPError as e:
+        return make_response(e.read(), e.code, {'Content-Type': 'application/json'})
+    except OSError as e:  # Hub worker restarting
+        logger.warning(f"Exam summary: event hub unreachable ({str(e)[:200]})")
+        return jsonify({'success': False, 'error': 'Event hub unavailable - retry shortly'}), 503
+
+
+@api.route('/api/events/stats', methods=['GET'])
+@require_admin
+def event_stream_stats():
+    """This worker's hub channel counters, plus listener/subscriber counters if it hosts the hub"""
+    return jsonify({
+        'success': True,
+        'worker_slot': worker_slot,
+        'channel': event_channel.get_stats(),
+        'events': event_hub.get_stats() if event_hub is not None else None
+    })
+
+
+@api.route('/api/tracing/stats', methods=['GET'])
+@require_admin
+def tracing_stats():
+    """Trace sampling/keep counters and exporter health for this worker"""
+    return jsonify({'success': True, 'tracing': tracer.get_stats()})
+
+
+@api.route('/api/admin/profile', methods=['GET'])
+@require_admin
+def profile_status():
+    """Whether a capture is running in this worker"""
+    return jsonify({'success': True, 'profiler': profiler.get_stats()})
+
+
+@api.route('/api/admin/profile', methods=['POST'])
+@require_admin
+def capture_profile():
+    """
+    Sample this worker's request threads and return collapsed stacks.
+    
+    Request body (all optional):
+    {
+        "seconds": 10,                                  # stop after this long (max PROFILE_MAX_SECONDS)
+        "requests": 50,                                 # or after this many completed requests
+        "function": "process_comprehensive_proctoring", # only stacks through this function
+        "session_id": "...",                            # only threads serving this session
+        "interval_ms": 10,
+        "include_background": false                     # also sample non-request threads
+    }
+    ?format=collapsed returns the collapsed stacks as text/plain
+    (flamegraph.pl input) instead of JSON.
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        seconds = float(data.get('seconds', PROFILE_MAX_SECONDS if data.get('requests') else PROFILE_DEFAULT_SECONDS))
+        requests_limit = int(data['requests']) if data.get('requests') else None
+        interval_ms = float(data.get('interval_ms', PROFILE_DEFAULT_INTERVAL_MS))
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'error': 'seconds, requests and interval_ms must be numbers'}), 400
+    if not 0 < seconds <= PROFILE_MAX_SECONDS:
+        return jsonify({'success': False, 'error': f'seconds must be in (0, {PROFILE_MAX_SECONDS:g}]'}), 400
+    if requests_limit is not None and requests_limit <= 0:
+        return jsonify({'success': False, 'error': 'requests must be positive'}), 400
+    
+    try:
+        result = profiler.run(seconds, requests_limit, data.get('function') or None,
+                              data.get('session_id') or None, interval_ms, bool(data.get('include_background')))
+    except ProfilerBusy as e:
+        return jsonify({'success': False, 'error': str(e)}), 409
+    
+    if request.args.get('format') == 'collapsed':
+        return result['collapsed'] + '\n', 200, {'Content-Type': 'text/plain; charset=utf-8'}
+    return jsonify({'success': True, 'profile': result})
+
+
+@api.route('/api/admin/captures', methods=['GET'])
+@require_admin
+def list_captures():
+    """Traffic captures of all workers in CAPTURE_DIR, open and finished (requires an admin token)"""
+    return jsonify({'success': True, 'captures': capture_requests.list(),
+                    'requests': list(capture_requests.all().values())})
+
+
+@api.route('/api/admin/captures/<session_id>', methods=['POST'])
+@require_admin
+def start_capture(session_id):
+    """
+    Start recording a session's traffic to CAPTURE_DIR (requires an admin token).
+    
+    Request body (optional): {"max_frames": 200000}
+    Each frame becomes a fixed-size record with a grayscale thumbnail, raw
+    detections, classifier probabilities and the batch decisions; replay
+    with benchmarks/capture_replay.py. Other workers serving the session
+    start recording within CAPTURE_POLL_SECONDS (see CaptureRequests).
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        max_frames = int(data.get('max_frames', CAPTURE_MAX_FRAMES))
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'error': 'max_frames must be an integer'}), 400
+    if not 0 < max_frames <= CAPTURE_MAX_FRAMES:
+        return jsonify({'success': False, 'error': f'max_frames must be between 1 and {CAPTURE_MAX_FRAMES}'}), 400
+    
+    try:
+        entry = capture_requests.add(session_id, max_frames)
+    except OSError as e:
+        return jsonify({'success': False, 'error': f'Could not store capture request: {e}'}), 500
+    if entry is None:
+        return jsonify({'success': False, 'error': f'Session {session_id} is already being captured',
+                        'request': capture_requests.get(session_id)}), 409
+    session = session_manager.get_session(session_id)
+    capture_requests.sync(session_manager)  # Opens it here right away
+    capture = session['capture']
+    if capture is None or capture.request_id != entry['request_id']:
+        capture_requests.remove(session_id)
+        return jsonify({'success': False, 'error': 'Could not open capture file'}), 500
+    return jsonify({'success': True, 'capture': capture.get_stats(), 'request': entry})
 
-@app.route('/api/models/train', methods=['POST', 'OPTIONS'])
+
+@api.route('/api/admin/captures/<session_id>', methods=['DELETE'])
+@require_admin
+def stop_capture(session_id):
+    """
+    Stop a session's traffic capture on all workers (requires an admin token).
+    Returns this worker's capture stats, if it served the session.
+    """
+    if not capture_requests.remove(session_id):
+        return jsonify({'success': False, 'error': f'Session {session_id} has no capture'}), 404
+    capture_requests.sync(session_manager)
+    session = session_manager.find_session(session_id)
+    capture = session['capture'] if session is not None else None
+    return jsonify({'success': True, 'capture': capture.get_stats() if capture is not None else None})
+
+
+@api.route('/api/session-snapshots/stats', methods=['GET'])
+@require_admin
+def session_snapshot_stats():
+    """Snapshot journal size, incremental write counters and last restore time"""
+    return jsonify({'success': True, 'session_snapshots': session_snapshots.get_stats()})
+
+
+@api.route('/api/ensemble/stats', methods=['GET'])
+@require_admin
+def ensemble_stats():
+    """Ensemble engine state and batching counters (rows per predict_proba call)"""
+    return jsonify({'success': True, 'ensemble': ensemble_engine.get_stats()})
+
+
+# Shadow evaluation of a candidate model on sampled live frames
+@api.route('/api/shadow', methods=['GET'])
+@require_admin
+def shadow_stats():
+    """Agreement of the candidate with the active model, per class and per batch decision"""
+    return jsonify({'success': True, 'shadow': shadow_evaluator.get_stats()})
+
+@api.route('/api/shadow', methods=['POST'])
+@require_admin
+def start_shadow():
+    """Shadow a registered model: {"model_id": ..., "sample_rate": 0.1}"""
+    if not TENSORFLOW_AVAILABLE:
+        return jsonify({'success': False, 'error': 'TensorFlow not available'}), 503
+    data = request.get_json(silent=True) or {}
+    metadata = model_registry.get(data.get('model_id') or '')
+    if metadata is None:
+        return jsonify({'success': False, 'error': f"Model {data.get('model_id')} not found"}), 404
+    if metadata['id'] == model_registry.active_model_id():
+        return jsonify({'success': False, 'error': 'Candidate is already the active model'}), 409
+    try:
+        sample_rate = float(data['sample_rate']) if 'sample_rate' in data else None
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'error': 'sample_rate must be a number'}), 400
+    try:
+        shadow_evaluator.start(metadata, sample_rate)
+    except RuntimeError as e:
+        return jsonify({'success': False, 'error': str(e)}), 409
+    return jsonify({'success': True, 'shadow': shadow_evaluator.get_stats()}), 202
+
+@api.route('/api/shadow', methods=['DELETE'])
+@require_admin
+def stop_shadow():
+    shadow_evaluator.stop()
+    return jsonify({'success': True, 'shadow': shadow_evaluator.get_stats()})
+
+
+# Model management (on-disk registry, hot swap)
+@api.route('/api/models', methods=['GET'])
 @require_auth
+def get_all_models():
+    status = model_registry.get_status()
+    return jsonify({
+        'success': True,
+        'models': model_registry.list_models(),
+        'activeModelId': status['active']['model_id'] if status['active'] else model_registry.active_model_id(),
+        'serving': status
+    })
+
+@api.route('/api/models', methods=['POST'])
+@require_admin
+def register_model():
+    """Upload a model artifact (multipart 'model' file + name/description/accuracy fields)"""
+    upload = request.files.get('model')
+    name = request.form.get('name', '').strip()
+    if upload is None or not name:
+        return jsonify({'success': False, 'error': "Missing 'model' file or 'name'"}), 400
+    try:
+        accuracy = float(request.form['accuracy']) if request.form.get('accuracy') else None
+        metadata = model_registry.register(name, upload.stream, upload.filename,
+                                           request.form.get('description', ''), accuracy)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except OSError as e:
+        logger.error(f"Model upload failed: {e}")
+        return jsonify({'success': False, 'error': 'Could not store the model artifact'}), 500
+    return jsonify({'success': True, 'model': metadata, 'modelId': metadata['id']}), 201
+
+@api.route('/api/models/train', methods=['POST', 'OPTIONS'])
+@require_admin
 def start_training():
     if request.method == 'OPTIONS':
         return jsonify({'success': True}), 200
     return jsonify({'success': False, 'error': 'Not implemented'}), 501
 
-@app.route('/api/models/<model_id>/progress', methods=['GET', 'OPTIONS'])
+@api.route('/api/models/<model_id>/progress', methods=['GET', 'OPTIONS'])
 @require_auth
 def get_training_progress(model_id):
     if request.method == 'OPTIONS':
         return jsonify({'success': True}), 200
     return jsonify({'success': False, 'error': 'Not implemented'}), 501
 
-@app.route('/api/models/<model_id>/publish', methods=['POST', 'OPTIONS'])
-@require_auth
+@api.route('/api/models/<model_id>/publish', methods=['POST', 'OPTIONS'])
+@require_admin
 def publish_model(model_id):
     if request.method == 'OPTIONS':
         return jsonify({'success': True}), 200
-    return jsonify({'success': False, 'error': 'Not implemented'}), 501
+    try:
+        return jsonify({'success': True, 'model': model_registry.publish(model_id)})
+    except (KeyError, ValueError):
+        return jsonify({'success': False, 'error': f'Model {model_id} not found'}), 404
 
-@app.route('/api/models/<model_id>/switch', methods=['POST', 'OPTIONS'])
-@require_auth
+@api.route('/api/models/<model_id>/switch', methods=['POST', 'OPTIONS'])
+@require_admin
 def switch_model(model_id):
+    """Load + warm up in the background, then swap; ?wait=true blocks until done"""
     if request.method == 'OPTIONS':
         return jsonify({'success': True}), 200
-    return jsonify({'success': False, 'error': 'Not implemented'}), 501
+    if not TENSORFLOW_AVAILABLE:
+        return jsonify({'success': False, 'error': 'TensorFlow not available'}), 503
+    try:
+        worker = model_registry.switch(model_id)
+    except (KeyError, ValueError) as e:
+        if model_registry.get(model_id) is None:
+            return jsonify({'success': False, 'error': f'Model {model_id} not found'}), 404
+        return jsonify({'success': False, 'error': str(e)}), 409
+    except RuntimeError as e:
+        return jsonify({'success': False, 'error': str(e)}), 409
+    
+    if request.args.get('wait', 'false').lower() == 'true':
+        worker.join()
+        status = model_registry.get_status()
+        ok = status['switch']['state'] == 'active'
+        return jsonify({'success': ok, 'serving': status, 'error': status['switch']['error']}), 200 if ok else 500
+    return jsonify({'success': True, 'serving': model_registry.get_status()}), 202
 
-@app.route('/api/models/<model_id>', methods=['DELETE', 'OPTIONS'])
-@require_auth
+@api.route('/api/models/<model_id>', methods=['DELETE', 'OPTIONS'])
+@require_admin
 def delete_model(model_id):
     if request.method == 'OPTIONS':
         return jsonify({'success': True}), 200
-    return jsonify({'success': False, 'error': 'Not implemented'}), 501
+    try:
+        model_registry.delete(model_id)
+    except (KeyError, ValueError):
+        return jsonify({'success': False, 'error': f'Model {model_id} not found'}), 404
+    except RuntimeError as e:
+        return jsonify({'success': False, 'error': str(e)}), 409
+    return jsonify({'success': True})
 
 
 def find_free_port(start_port=5002, max_attempts=10):
@@ -1961,6 +7733,8 @@ if __name__ == '__main__':
     logger.info(f"Starting Face Detection Service v2.0 on port {port}")
     logger.info(f"Features: Temporal tracking, Classification smoothing, EMA credibility")
     
+    app = create_app()
+    init_worker()
     try:
         app.run(host='0.0.0.0', port=port, debug=debug_mode, use_reloader=False)
     except KeyboardInterrupt:
@@ -0,0 +1,32 @@
+"""
+Gunicorn configuration for the Evalon AI service.
+
+    gunicorn -c gunicorn.conf.py    # serves wsgi:app (python/wsgi.py)
+
+The app is preloaded: create_app() runs init_shared() once in the master
+(thread budget, model registry metadata, ensemble), and forked workers
+share those pages copy-on-write. Each worker then runs init_worker() in
+post_fork, creating its own detector, sessions, executors and CNN.
+Workers get a stable slot index, so a replacement worker restores the
+session journal of the worker it replaces.
+"""
+
+import os
+
+wsgi_app = 'wsgi:app'
+preload_app = True
+bind = f"0.0.0.0:{os.environ.get('PORT', 5002)}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+timeout = 120
+
+
+def pre_fork(server, worker):
+    """Master: give the new worker the lowest slot not held by a live worker"""
+    taken = {getattr(w, 'slot', None) for w in server.WORKERS.values()}
+    worker.slot = next(slot for slot in range(len(taken) + 1) if slot not in taken)
+
+
+def post_fork(server, worker):
+    import face_detection_service
+    face_detection_service.init_worker(worker.slot)
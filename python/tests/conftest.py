@@ -0,0 +1,43 @@
+"""Shared setup: import the service module without background state on disk."""
+
+import asyncio
+import os
+import sys
+import time
+
+import pytest
+
+os.environ.setdefault('SESSION_SNAPSHOT_ENABLED', 'false')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import face_detection_service as fds  # noqa: E402
+
+JWT_TEST_SECRET = 's' * 32
+
+
+@pytest.fixture
+def hub(tmp_path, monkeypatch):
+    """Event hub on a free port and a private socket"""
+    monkeypatch.setenv('JWT_SECRET', JWT_TEST_SECRET)
+    hub = fds.EventHub(port=fds.find_free_port(15102), socket_path=str(tmp_path / 'hub.sock'))
+    hub.start()
+    assert hub.loop is not None, hub.error
+    yield hub
+
+    async def close_connections():
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    asyncio.run_coroutine_threadsafe(close_connections(), hub.loop).result(timeout=5)
+    hub.loop.call_soon_threadsafe(hub.loop.stop)
+    hub.thread.join(timeout=5)
+
+
+def wait_for(condition, timeout=3.0):
+    """Poll until condition() holds (hub messages are applied asynchronously)"""
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    return condition()
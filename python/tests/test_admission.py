@@ -0,0 +1,37 @@
+"""Admission control: batch-closing frames are predicted on the server clock."""
+
+import face_detection_service as fds
+
+
+def add_frames(processor, count, client_start):
+    for i in range(count):
+        assert processor.add_frame(fds.FrameSample(
+            client_start + i * 0.1, 1, [0.9], 'normal', 0.9, {'normal': 0.9}, False,
+            'ab' * 8, False, None, 1.0)) is None
+
+
+def overloaded_controller():
+    controller = fds.AdmissionController(max_in_flight=1)
+    controller.in_flight = 1  # At budget, below the hard limit
+    return controller
+
+
+def test_client_clock_skew_does_not_mark_batch_closing(monkeypatch):
+    monkeypatch.setattr(fds, 'DEBUG_BATCH_PROCESSING', False)
+    session = fds.SessionManager().get_session('skewed')
+    # Video/multi-frame clients send media-relative or skewed timestamps
+    add_frames(session['batch_processor'], fds.BATCH_MIN_FRAMES, client_start=12.0)
+
+    assert overloaded_controller().try_admit(session) == 'batch_satisfied'
+
+
+def test_batch_age_measured_from_server_open(monkeypatch):
+    monkeypatch.setattr(fds, 'DEBUG_BATCH_PROCESSING', False)
+    session = fds.SessionManager().get_session('stale')
+    processor = session['batch_processor']
+    add_frames(processor, fds.BATCH_MIN_FRAMES, client_start=4.0e9)  # Client clock far ahead
+    processor.batch_opened_at -= processor.max_duration_seconds
+
+    controller = overloaded_controller()
+    assert controller.try_admit(session) is None
+    assert controller.in_flight == 2
@@ -0,0 +1,42 @@
+"""Capture requests: started on one worker, recorded by every worker serving the session."""
+
+import face_detection_service as fds
+
+
+def test_capture_follows_requests_across_workers(tmp_path, monkeypatch):
+    workers = [(fds.SessionManager(), fds.CaptureRequests(str(tmp_path))) for _ in range(2)]
+    for manager, _ in workers:
+        manager.get_session('s1')
+    first, second = workers
+
+    entry = first[1].add('s1', 100)
+    assert entry is not None
+    assert first[1].add('s1', 100) is None  # Already requested
+    for slot, (manager, requests) in enumerate(workers):
+        monkeypatch.setattr(fds, 'worker_slot', slot)
+        requests.sync(manager)
+        assert manager.find_session('s1')['capture'].request_id == entry['request_id']
+
+    captures = second[1].list()
+    assert sorted(c['worker_slot'] for c in captures) == [0, 1]
+    assert all(c['requested'] and c['frames'] == 0 for c in captures)
+
+    assert first[1].remove('s1')
+    second[1].sync(second[0])
+    assert second[0].find_session('s1')['capture'].closed
+    assert not any(c['requested'] for c in first[1].list())
+
+
+def test_sessions_served_later_are_picked_up(tmp_path):
+    manager, requests = fds.SessionManager(), fds.CaptureRequests(str(tmp_path))
+    requests.add('late', 10)
+    requests.sync(manager)  # Not served here yet
+    assert requests.list() == []
+
+    manager.get_session('late')
+    requests.sync(manager)
+    capture = manager.find_session('late')['capture']
+    assert capture is not None and not capture.closed
+    capture.close()  # e.g. max_frames reached
+    requests.sync(manager)
+    assert manager.find_session('late')['capture'] is capture  # Not reopened for the same request
@@ -0,0 +1,100 @@
+"""Credibility timeline storage and its LTTB downsampling."""
+
+import math
+
+import jwt
+import numpy as np
+import pytest
+from flask import Flask
+
+import face_detection_service as fds
+from conftest import JWT_TEST_SECRET
+
+
+def reference_lttb(x, y, threshold):
+    """Steinarsson's original Largest-Triangle-Three-Buckets, point by point"""
+    n = len(x)
+    every = (n - 2) / (threshold - 2)
+    selected = [0]
+    a = 0
+    for i in range(threshold - 2):
+        avg_start = int(math.floor((i + 1) * every)) + 1
+        avg_end = min(int(math.floor((i + 2) * every)) + 1, n)
+        avg_x = sum(x[avg_start:avg_end]) / (avg_end - avg_start)
+        avg_y = sum(y[avg_start:avg_end]) / (avg_end - avg_start)
+        best, best_area = None, -1.0
+        for j in range(int(math.floor(i * every)) + 1, int(math.floor((i + 1) * every)) + 1):
+            area = abs((x[a] - avg_x) * (y[j] - y[a]) - (x[a] - x[j]) * (avg_y - y[a]))
+            if area > best_area:
+                best, best_area = j, area
+        selected.append(best)
+        a = best
+    selected.append(n - 1)
+    return selected
+
+
+def test_known_points():
+    # Buckets [1, 4) and [4, 7); the spike (2) and the dip (5) form the largest triangles
+    x = np.arange(8, dtype=np.float32)
+    y = np.array([0, 0, 5, 0, 0, -3, 0, 0], dtype=np.float32)
+    assert fds.lttb_indices(x, y, 4).tolist() == [0, 2, 5, 7]
+
+
+def test_matches_reference_implementation():
+    rng = np.random.default_rng(0)
+    x = np.cumsum(rng.uniform(2.0, 3.0, size=1002)).astype(np.float32)
+    y = (95 + np.cumsum(rng.normal(0, 1, size=1002))).astype(np.float32)
+    expected = reference_lttb(x.astype(float).tolist(), y.astype(float).tolist(), 102)
+    assert fds.lttb_indices(x, y, 102).tolist() == expected
+
+
+def test_keeps_endpoints_and_extremes():
+    x = np.arange(5000, dtype=np.float32)
+    y = np.full(5000, 90.0, dtype=np.float32)
+    y[1234] = 10.0  # A single sharp drop must survive 100x downsampling
+    keep = fds.lttb_indices(x, y, 50)
+    assert len(keep) == 50
+    assert keep[0] == 0 and keep[-1] == 4999
+    assert np.all(np.diff(keep) > 0)
+    assert 1234 in keep
+
+
+@pytest.mark.parametrize('points', [2, 10, 11])
+def test_small_series_returned_whole(points):
+    x = np.arange(10, dtype=np.float32)
+    assert fds.lttb_indices(x, x, points).tolist() == list(range(10))
+
+
+def test_timeline_columns_round_trip_across_chunks():
+    timeline = fds.CredibilityTimeline()
+    count = fds.CREDIBILITY_TIMELINE_FIRST_CHUNK + fds.CREDIBILITY_TIMELINE_CHUNK + 10
+    for i in range(count):
+        timeline.append(1.7e9 + i * 2.5, 100.0 - i * 0.01, i % 3, (i + 1) % 3)
+    times, credibility, states, decisions = timeline.columns()
+    assert len(timeline) == len(times) == count
+    assert times[-1] == pytest.approx((count - 1) * 2.5, abs=1e-3)
+    assert credibility[-1] == pytest.approx(100.0 - (count - 1) * 0.01, abs=1e-4)
+    assert states.tolist() == [i % 3 for i in range(count)]
+    assert decisions.tolist() == [(i + 1) % 3 for i in range(count)]
+
+
+def test_endpoint_is_owner_only(monkeypatch):
+    monkeypatch.setenv('JWT_SECRET', JWT_TEST_SECRET)
+    manager = fds.SessionManager()
+    monkeypatch.setattr(fds, 'session_manager', manager)
+    monkeypatch.setattr(fds, 'detector', object())  # Worker already initialized: no model load
+    monkeypatch.setattr(fds, 'profiler', fds.SamplingProfiler())
+    monkeypatch.setattr(fds, 'tracer', fds.Tracer(exporter='none'))
+    manager.get_session('s', 'e', 'u1')
+    app = Flask(__name__)
+    app.register_blueprint(fds.api)
+    client = app.test_client()
+
+    def status(user_id, user_type='student'):
+        auth = jwt.encode({'userId': user_id, 'userType': user_type}, JWT_TEST_SECRET, algorithm='HS256')
+        return client.get('/api/sessions/s/credibility-timeline',
+                          headers={'Authorization': f'Bearer {auth}'}).status_code
+
+    assert status('u1') == 200
+    assert status('u2') == 404
+    assert status('admin', 'organization_admin') == 200
@@ -0,0 +1,81 @@
+"""Event hub: events from any worker's channel reach subscribers; stream access rules."""
+
+import socket
+import time
+
+import jwt
+
+import face_detection_service as fds
+from conftest import JWT_TEST_SECRET, wait_for
+
+
+def member(sid, owner=None):
+    return fds.SessionManager().get_session(sid, 'e1', owner)
+
+
+def token(user_id, user_type='student'):
+    return jwt.encode({'userId': user_id, 'userType': user_type}, JWT_TEST_SECRET, algorithm='HS256')
+
+
+def open_stream(hub, query, user_token):
+    conn = socket.create_connection(('127.0.0.1', hub.port), timeout=3)
+    conn.sendall(f"GET {fds.EVENT_STREAM_PATH}?{query}&token={user_token} HTTP/1.1\r\n\r\n".encode())
+    head = conn.recv(4096).decode()
+    return conn, head.split('\r\n')[0]
+
+
+def status(hub, query, user_token):
+    conn, line = open_stream(hub, query, user_token)
+    conn.close()
+    return line.split(' ')[1]
+
+
+def read_until(conn, marker, timeout=3.0):
+    data, deadline = b'', time.time() + timeout
+    while marker not in data and time.time() < deadline:
+        try:
+            data += conn.recv(65536)
+        except socket.timeout:
+            break
+    return data.decode()
+
+
+def test_stream_access(hub):
+    channel = fds.EventChannel(hub.socket_path, enabled=True)
+    channel.send(fds.session_update('s1', member('s1', 'u1')))
+    assert wait_for(lambda: hub.owners.get('s1') == 'u1')
+
+    assert status(hub, 'session_ids=s1', token('u1')) == '200'
+    assert status(hub, 'session_ids=s1,s2', token('u1')) == '403'  # s2 has no known owner
+    assert status(hub, 'session_ids=s1', token('u2')) == '403'
+    assert status(hub, 'exam_id=e1', token('u1')) == '403'
+    assert status(hub, 'exam_id=e1', token('admin', 'organization_admin')) == '200'
+    assert status(hub, 'exam_id=e1', 'not-a-token') == '401'
+
+
+def test_events_from_several_channels_reach_exam_subscriber(hub):
+    conn, line = open_stream(hub, 'exam_id=e1', token('admin', 'organization_admin'))
+    assert line.endswith('200 OK')
+    assert wait_for(lambda: hub.subscribers == 1)
+    for worker, sid in enumerate(('s1', 's2')):  # One channel per worker process
+        channel = fds.EventChannel(hub.socket_path, enabled=True)
+        channel.send(fds.session_update(sid, member(sid), [('batch', {'session_id': sid, 'worker': worker})]))
+
+    received = read_until(conn, b'"worker":1')
+    conn.close()
+    assert '"session_id":"s1"' in received and '"session_id":"s2"' in received
+
+
+def test_dropped_messages_trigger_resync(hub, tmp_path):
+    conn, _ = open_stream(hub, 'exam_id=e1', token('admin', 'organization_admin'))
+    assert wait_for(lambda: hub.subscribers == 1)
+    channel = fds.EventChannel(str(tmp_path / 'no-hub.sock'), enabled=True)
+    channel.send(fds.session_update('s1', member('s1'), [('batch', {})]))
+    assert channel.get_stats()['dropped'] == 1
+
+    channel.path = hub.socket_path
+    channel.send(fds.session_update('s1', member('s1'), [('batch', {'n': 2})]))
+    received = read_until(conn, b'"n":2')
+    conn.close()
+    assert 'event: resync' in received
+    assert hub.get_stats()['messages_lost'] == 1
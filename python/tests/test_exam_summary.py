@@ -0,0 +1,123 @@
+"""Exam summaries kept by the event hub from the session updates of several workers."""
+
+import json
+import time
+import urllib.error
+import urllib.request
+
+import jwt
+import pytest
+
+import face_detection_service as fds
+from conftest import JWT_TEST_SECRET, wait_for
+
+ADMIN = jwt.encode({'userId': 'admin', 'userType': 'organization_admin'}, JWT_TEST_SECRET, algorithm='HS256')
+
+
+class Worker:
+    """One worker's sessions and its channel to the hub"""
+
+    def __init__(self, hub):
+        self.hub = hub
+        self.manager = fds.SessionManager()
+        self.channel = fds.EventChannel(hub.socket_path, enabled=True)
+        self.clock = 1.7e9
+
+    def join(self, sid, exam_id):
+        self.report(sid, self.manager.get_session(sid, exam_id))
+
+    def close_batch(self, sid, face_count):
+        session = self.manager.get_session(sid)
+        processor = session['batch_processor']
+        result = None
+        while result is None:
+            self.clock += 0.1
+            result = processor.add_frame(fds.FrameSample(
+                self.clock, face_count, [0.9] * face_count, 'normal', 0.9, {'normal': 0.9}, False,
+                'ab' * 8, False, None, 1.0))
+        self.manager.record_batch(session, result)
+        self.report(sid, session)
+
+    def report(self, sid, session):
+        received = self.hub.received
+        self.channel.send(fds.session_update(sid, session))
+        assert wait_for(lambda: self.hub.received > received)
+
+
+def summary(hub, exam_id, token=ADMIN):
+    request = urllib.request.Request(f'http://127.0.0.1:{hub.port}/api/exams/{exam_id}/summary',
+                                     headers={'Authorization': f'Bearer {token}'})
+    try:
+        with urllib.request.urlopen(request, timeout=3) as response:
+            return response.status, json.load(response)
+    except urllib.error.HTTPError as e:
+        return e.code, json.load(e)
+
+
+@pytest.fixture(autouse=True)
+def quiet_batches(monkeypatch):
+    monkeypatch.setattr(fds, 'DEBUG_BATCH_PROCESSING', False)
+
+
+def test_sessions_on_several_workers_are_counted_once(hub):
+    first, second = Worker(hub), Worker(hub)
+    for sid in ('a0', 'a1', 'a2'):
+        first.join(sid, 'E')
+    for sid in ('b0', 'b1'):
+        second.join(sid, 'E')
+    first.close_batch('a0', 2)
+    second.close_batch('b0', 0)
+    second.close_batch('b0', 0)
+
+    status, body = summary(hub, 'E')
+    assert status == 200
+    assert body['sessions'] == 5
+    assert sum(body['states'].values()) == 5
+    assert sum(body['credibility']['histogram']['counts']) == 5
+    assert body['batches'] == 3
+    assert {v['type']: v['count'] for v in body['violations']} == {'multiple_faces': 1, 'no_face': 2}
+
+    second.report('b0', second.manager.get_session('b0'))  # Repeated update: nothing new to count
+    assert summary(hub, 'E')[1]['batches'] == 3
+
+
+def test_exam_move_and_worker_restart(hub):
+    first = Worker(hub)
+    first.join('s', 'E')
+    first.close_batch('s', 2)
+    first.join('s', 'F')  # Moves its state; E keeps the violations counted so far
+
+    exam_e, exam_f = summary(hub, 'E')[1], summary(hub, 'F')[1]
+    assert (exam_e['sessions'], exam_f['sessions']) == (0, 1)
+    assert exam_e['batches'] == 1 and exam_f['batches'] == 0
+
+    restarted = Worker(hub)  # Same session on a fresh worker: its counts start at zero again
+    restarted.join('s', 'F')
+    restarted.close_batch('s', 2)
+    exam_f = summary(hub, 'F')[1]
+    assert exam_f['sessions'] == 1
+    assert exam_f['batches'] == 1
+
+
+def test_summary_access(hub):
+    Worker(hub).join('s', 'E')
+    student = jwt.encode({'userId': 's', 'userType': 'student'}, JWT_TEST_SECRET, algorithm='HS256')
+    assert summary(hub, 'E', student)[0] == 403
+    assert summary(hub, 'missing')[0] == 404
+
+
+def test_idle_sessions_leave_the_hub(hub):
+    worker = Worker(hub)
+    worker.join('idle', 'E')
+    worker.join('gone', 'G')
+    worker.join('active', 'E')
+    hub.member_ttl = 60.0
+    for sid in ('idle', 'gone'):
+        hub.last_seen[sid] -= 120
+    hub.exams['G'].updated_at -= 120
+
+    assert hub.expire_idle(time.monotonic()) == 2
+    assert summary(hub, 'E')[1]['sessions'] == 1
+    assert summary(hub, 'G')[0] == 404
+    assert set(hub.members) == {'active'}
+    assert hub.get_stats()['expired_sessions'] == 2
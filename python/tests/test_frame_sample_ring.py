@@ -0,0 +1,81 @@
+"""FrameSampleRing: incremental batch counters must always equal a full recount."""
+
+import numpy as np
+import pytest
+
+import face_detection_service as fds
+
+
+def random_sample(rng, t):
+    quality = fds.QUALITY_REASONS[rng.integers(len(fds.QUALITY_REASONS))] if rng.random() < 0.1 else None
+    classification = None if rng.random() < 0.1 else fds.BEHAVIOR_CLASSES[rng.integers(3)]
+    weight = float(rng.choice([1.0, fds.DEGRADED_SAMPLE_WEIGHT, 0.0]))
+    return fds.FrameSample(t, int(rng.integers(0, 4)), [], classification, float(rng.random()), {},
+                           bool(rng.random() < 0.2), f'{int(rng.integers(1 << 62)):016x}',
+                           bool(rng.random() < 0.3), quality, weight)
+
+
+def recount(ring):
+    """The statistics BatchFrameProcessor needs, recomputed from the live samples"""
+    live = (ring.head + np.arange(ring.size)) % ring.capacity
+    quality = ring.quality_ids[live]
+    usable = live[quality < 0]
+    faces = ring.face_counts[usable].astype(int)
+    classes = ring.class_ids[usable]
+    weights = ring.weights[usable].astype(float)
+    return {
+        'face_count_freq': {int(k): int(v) for k, v in zip(*np.unique(faces, return_counts=True))},
+        'class_freq': [float(weights[classes == c].sum()) for c in range(len(fds.BEHAVIOR_CLASSES))],
+        'class_weight': float(weights.sum()),
+        'degraded_frames': int((weights < 1.0).sum()),
+        'multi_face_frames': int((faces >= 2).sum()),
+        'no_face_frames': int((faces == 0).sum()),
+        'phone_frames': int(ring.phone_flags[usable].sum()),
+        'gaze_away_frames': int(ring.gaze_flags[usable].sum()),
+        'unusable_frames': int((quality >= 0).sum()),
+        'unusable_freq': [int((quality == q).sum()) for q in range(len(fds.QUALITY_REASONS))],
+    }
+
+
+def assert_counters_match(ring):
+    expected = recount(ring)
+    assert ring.face_count_freq == expected['face_count_freq']
+    assert ring.class_freq == pytest.approx(expected['class_freq'], abs=1e-6)
+    assert ring.class_weight == pytest.approx(expected['class_weight'], abs=1e-6)
+    for name in ('degraded_frames', 'multi_face_frames', 'no_face_frames', 'phone_frames',
+                 'gaze_away_frames', 'unusable_frames', 'unusable_freq'):
+        assert getattr(ring, name) == expected[name], name
+
+
+def test_counters_match_recount_through_evictions():
+    rng = np.random.default_rng(0)
+    ring = fds.FrameSampleRing(capacity=25)
+    for i in range(400):  # Wraps the ring many times, every push past 25 evicts
+        ring.push(random_sample(rng, 1000.0 + i * 0.1))
+        assert len(ring) == min(i + 1, 25)
+        assert_counters_match(ring)
+    assert ring.first_timestamp() == pytest.approx(1000.0 + 375 * 0.1)
+    assert ring.last_timestamp() == pytest.approx(1000.0 + 399 * 0.1)
+
+
+def test_clear_resets_counters():
+    rng = np.random.default_rng(1)
+    ring = fds.FrameSampleRing(capacity=10)
+    for i in range(15):
+        ring.push(random_sample(rng, float(i)))
+    ring.clear()
+    assert len(ring) == 0
+    assert_counters_match(ring)
+    for i in range(5):
+        ring.push(random_sample(rng, float(i)))
+    assert_counters_match(ring)
+
+
+def test_deferred_frames_tracked_on_evict():
+    rng = np.random.default_rng(2)
+    ring = fds.FrameSampleRing(capacity=8)
+    behavior_input = np.zeros((4, 4, 3), dtype=np.uint8)
+    for i in range(20):
+        ring.push(random_sample(rng, float(i)), behavior_input if i % 2 else None)
+        live = (ring.head + np.arange(ring.size)) % ring.capacity
+        assert ring.deferred_frames == int(ring.deferred[live].sum())
@@ -0,0 +1,38 @@
+"""Model registry: version ids are never reused and failed uploads leave nothing behind."""
+
+import io
+import os
+
+import pytest
+
+import face_detection_service as fds
+
+
+def register(registry, data=b'weights'):
+    return registry.register('Proctor CNN', io.BytesIO(data), 'model.h5')
+
+
+def test_versions_follow_the_highest_on_disk(tmp_path):
+    registry = fds.ModelRegistry(root=str(tmp_path))
+    assert [register(registry)['id'] for _ in range(3)] == ['proctor-cnn-v1', 'proctor-cnn-v2', 'proctor-cnn-v3']
+    registry.delete('proctor-cnn-v1')
+    assert register(registry)['id'] == 'proctor-cnn-v4'
+
+
+def test_claimed_directory_is_skipped(tmp_path):
+    registry = fds.ModelRegistry(root=str(tmp_path))
+    register(registry)
+    os.mkdir(tmp_path / 'proctor-cnn-v2')  # Claimed by another worker, metadata not written yet
+    assert register(registry)['id'] == 'proctor-cnn-v3'
+
+
+def test_failed_upload_removes_its_directory(tmp_path):
+    class BrokenStream:
+        def read(self, size):
+            raise OSError('connection reset')
+
+    registry = fds.ModelRegistry(root=str(tmp_path))
+    with pytest.raises(OSError):
+        registry.register('Proctor CNN', BrokenStream(), 'model.h5')
+    assert os.listdir(tmp_path) == []
+    assert register(registry)['id'] == 'proctor-cnn-v1'
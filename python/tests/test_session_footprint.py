@@ -0,0 +1,97 @@
+"""Per-session memory budget of the hot per-frame state (tracemalloc)."""
+
+import gc
+import tracemalloc
+
+import numpy as np
+import pytest
+
+import face_detection_service as fds
+
+SESSION_BUDGET_BYTES = 8 * 1024  # Two tracked faces, batch buffer one frame short of closing
+TRACK_BUDGET_BYTES = 1536
+
+
+def drive_session(session, frames: int = 60):
+    """Two steady faces through the tracker, and a batch buffer that has not closed yet"""
+    tracker = session['face_tracker']
+    for i in range(frames):
+        tracker.update([(100 + i % 3, 80, 120, 140), (400, 90, 110, 130)], [0.9, 0.8],
+                       np.array([[5.0, 2.0], [1.0, 1.0]]))
+    processor = session['batch_processor']
+    for i in range(fds.BATCH_MAX_FRAMES - 1):
+        assert processor.add_frame(fds.FrameSample(
+            1000.0 + i * 0.01, 2, [0.9, 0.8], 'normal', 0.9, {'normal': 0.9}, False,
+            'ab' * 8, False, None, 1.0)) is None
+
+
+def traced_bytes(build):
+    """Bytes still allocated after build() (tracemalloc), with the result kept alive"""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        kept = build()
+        gc.collect()
+        return tracemalloc.get_traced_memory()[0] - before, kept
+    finally:
+        tracemalloc.stop()
+
+
+@pytest.fixture(autouse=True)
+def quiet_batches(monkeypatch):
+    monkeypatch.setattr(fds, 'DEBUG_BATCH_PROCESSING', False)
+
+
+def test_session_byte_budget():
+    manager = fds.SessionManager()
+    drive_session(manager.get_session('warm-up'))  # One-off lazy imports and caches
+    count = 200
+
+    def build():
+        for i in range(count):
+            drive_session(manager.get_session(f'session-{i}'))
+        return manager
+
+    used, _ = traced_bytes(build)
+    per_session = used / count
+    assert per_session < SESSION_BUDGET_BYTES, f'{per_session:.0f} bytes per session'
+
+
+def test_per_frame_state_does_not_grow_with_frames():
+    """Center history and the frame buffer are fixed-size rings"""
+    tracker = fds.FaceTracker()
+    ring = fds.FrameSampleRing()
+    sample = fds.FrameSample(0.0, 2, [0.9, 0.8], 'normal', 0.9, {}, False, 'ab' * 8, False, None, 1.0)
+
+    def run(frames):
+        for _ in range(frames):
+            tracker.update([(100, 80, 120, 140), (400, 90, 110, 130)], [0.9, 0.8],
+                           np.array([[5.0, 2.0], [1.0, 1.0]]))
+            ring.push(sample)
+
+    run(fds.TRACK_CENTER_HISTORY_SIZE + ring.capacity)  # Fill both rings
+    used, _ = traced_bytes(lambda: run(2000))
+    assert used < 1024, f'{used} bytes retained by 2000 more frames'
+
+
+def test_track_byte_budget():
+    count = 200
+
+    def build():
+        trackers = [fds.FaceTracker() for _ in range(count)]
+        for tracker in trackers:
+            for _ in range(fds.TRACK_CENTER_HISTORY_SIZE):
+                tracker.update([(100, 80, 120, 140)], [0.9], np.array([[5.0, 2.0]]))
+        return trackers
+
+    used_with_tracks, _ = traced_bytes(build)
+    used_empty, _ = traced_bytes(lambda: [fds.FaceTracker() for _ in range(count)])
+    per_track = (used_with_tracks - used_empty) / count
+    assert per_track < TRACK_BUDGET_BYTES, f'{per_track:.0f} bytes per track'
+
+
+@pytest.mark.parametrize('cls', [fds.TrackedFace, fds.FrameSample, fds.FrameAnalysisResult,
+                                 fds.ClassificationResult])
+def test_hot_records_are_slotted(cls):
+    assert cls.__dictoffset__ == 0, f'{cls.__name__} instances carry a __dict__'
@@ -0,0 +1,38 @@
+"""Session snapshot journal: record layout and per-session failure isolation."""
+
+import face_detection_service as fds
+
+
+def test_round_trip_keeps_long_state_streaks(tmp_path):
+    manager = fds.SessionManager()
+    session = manager.get_session('long-exam')
+    session['frame_count'] = 10
+    processor = session['batch_processor']
+    processor.consecutive_state_batches = 70000  # Past uint16 on a multi-hour steady session
+    processor.credibility_score = 0.75
+    processor.batch_count = 70000
+
+    snapshotter = fds.SessionSnapshotter(manager, path=str(tmp_path / 'snapshots.bin'))
+    assert snapshotter.snapshot() == 1
+
+    restored = fds.SessionManager()
+    assert fds.SessionSnapshotter(restored, path=snapshotter.path).restore() == 1
+    copy = restored.get_session('long-exam')['batch_processor']
+    assert copy.consecutive_state_batches == 70000
+    assert copy.batch_count == 70000
+    assert abs(copy.credibility_score - 0.75) < 1e-6
+
+
+def test_encode_failure_skips_only_that_session(tmp_path):
+    manager = fds.SessionManager()
+    for sid in ('good', 'bad'):
+        manager.get_session(sid)['frame_count'] = 5
+    manager.get_session('bad')['batch_processor'].consecutive_state_batches = -1  # Not packable
+
+    snapshotter = fds.SessionSnapshotter(manager, path=str(tmp_path / 'snapshots.bin'))
+    assert snapshotter.snapshot() == 1
+    assert snapshotter.get_stats()['encode_errors'] == 1
+
+    restored = fds.SessionManager()
+    assert fds.SessionSnapshotter(restored, path=snapshotter.path).restore() == 1
+    assert set(restored.restored) == {'good'}
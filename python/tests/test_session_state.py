@@ -0,0 +1,78 @@
+"""Bulk session state served by the event hub: one version space for all workers, owner-only."""
+
+import json
+import urllib.error
+import urllib.request
+
+import jwt
+import pytest
+
+import face_detection_service as fds
+from conftest import JWT_TEST_SECRET, wait_for
+
+
+def token(user_id, user_type='student'):
+    return jwt.encode({'userId': user_id, 'userType': user_type}, JWT_TEST_SECRET, algorithm='HS256')
+
+
+def fetch(hub, session_ids, user_token, since=0, etag=None):
+    headers = {'Authorization': f'Bearer {user_token}', 'Content-Type': 'application/json'}
+    if etag:
+        headers['If-None-Match'] = etag
+    request = urllib.request.Request(f'http://127.0.0.1:{hub.port}{fds.SESSION_STATE_PATH}', method='POST',
+                                     data=json.dumps({'session_ids': session_ids, 'since': since}).encode(),
+                                     headers=headers)
+    try:
+        with urllib.request.urlopen(request, timeout=3) as response:
+            return response.status, json.load(response), response.headers['ETag']
+    except urllib.error.HTTPError as e:
+        return e.code, None, e.headers['ETag']
+
+
+class Worker:
+    def __init__(self, hub):
+        self.hub = hub
+        self.manager = fds.SessionManager()
+        self.channel = fds.EventChannel(hub.socket_path, enabled=True)
+
+    def report(self, sid, session):
+        received = self.hub.received
+        self.channel.send(fds.session_update(sid, session))
+        assert wait_for(lambda: self.hub.received > received)
+
+
+@pytest.fixture(autouse=True)
+def quiet_batches(monkeypatch):
+    monkeypatch.setattr(fds, 'DEBUG_BATCH_PROCESSING', False)
+
+
+def test_owner_sees_only_own_sessions(hub):
+    first, second = Worker(hub), Worker(hub)
+    first.report('s1', first.manager.get_session('s1', owner='u1'))
+    second.report('s2', second.manager.get_session('s2', owner='u2'))
+
+    status, body, _ = fetch(hub, ['s1', 's2'], token('u1'))
+    assert status == 200
+    assert set(body['sessions']) == {'s1'} and body['missing'] == ['s2']
+    status, body, _ = fetch(hub, ['s1', 's2', 'unknown'], token('admin', 'organization_admin'))
+    assert set(body['sessions']) == {'s1', 's2'} and body['missing'] == ['unknown']
+
+
+def test_versions_are_hub_wide_and_stable(hub):
+    first, second = Worker(hub), Worker(hub)
+    admin = token('admin', 'organization_admin')
+    session = first.manager.get_session('s1', owner='u1')
+    first.report('s1', session)
+    second.report('s2', second.manager.get_session('s2', owner='u2'))
+    _, body, etag = fetch(hub, ['s1', 's2'], admin)
+    cursor = body['version']
+
+    first.report('s1', session)  # Same state again: same version, same ETag
+    assert fetch(hub, ['s1', 's2'], admin, etag=etag)[0] == 304
+
+    first.manager.reset_session('s1')
+    first.report('s1', session)
+    status, body, _ = fetch(hub, ['s1', 's2'], admin, since=cursor)
+    assert status == 200
+    assert set(body['sessions']) == {'s1'} and body['unchanged'] == 1
+    assert body['sessions']['s1']['version'] == body['version'] > cursor
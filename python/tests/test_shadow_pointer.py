@@ -0,0 +1,57 @@
+"""Shadow runs started on one worker are followed by the others, and stats are summed."""
+
+import io
+
+import numpy as np
+
+import face_detection_service as fds
+from conftest import wait_for
+
+
+class FakeModel:
+    def predict(self, batch, **kwargs):
+        return np.tile([1.0, 0.0, 0.0], (len(batch), 1))
+
+
+def test_workers_follow_the_shadow_pointer(tmp_path, monkeypatch):
+    registry = fds.ModelRegistry(root=str(tmp_path), loader=lambda path: FakeModel())
+    monkeypatch.setattr(fds, 'model_registry', registry)
+    candidate = registry.register('Candidate', io.BytesIO(b'weights'), 'model.h5')
+    first = fds.ShadowEvaluator(root=str(tmp_path), slot=0)
+    second = fds.ShadowEvaluator(root=str(tmp_path), slot=1)
+
+    first.start(candidate, sample_rate=0.5)
+    second.follow()
+    assert second.run_id == first.run_id and second.sample_rate == 0.5
+    assert wait_for(lambda: first.state == second.state == 'running')
+
+    with second.lock:
+        second.scored = 4
+        second.frame_confusion[0, 0] = 3
+        second.frame_confusion[0, 1] = 1
+    second.follow()  # Publishes its counters
+    stats = first.get_stats()
+    assert stats['workers'] == 2 and stats['scored'] == 4
+    assert stats['frames']['agreement'] == 0.75
+
+    first.stop()
+    second.follow()
+    assert second.state == 'idle' and second.run_id is None
+
+
+def test_restart_resets_followers(tmp_path, monkeypatch):
+    registry = fds.ModelRegistry(root=str(tmp_path), loader=lambda path: FakeModel())
+    monkeypatch.setattr(fds, 'model_registry', registry)
+    candidate = registry.register('Candidate', io.BytesIO(b'weights'), 'model.h5')
+    first = fds.ShadowEvaluator(root=str(tmp_path), slot=0)
+    second = fds.ShadowEvaluator(root=str(tmp_path), slot=1)
+    first.start(candidate)
+    second.follow()
+    assert wait_for(lambda: first.state == second.state == 'running')
+    second.scored = 7
+    second.follow()
+
+    first.start(candidate)  # Same candidate, new run
+    assert first.get_stats()['scored'] == 0  # Old run's counters no longer match
+    second.follow()
+    assert second.run_id == first.run_id and second.scored == 0
@@ -0,0 +1,55 @@
+"""Request traces: unsampled requests record timings only until they turn slow."""
+
+import json
+import time
+
+import face_detection_service as fds
+
+
+def run_request(tracer, stages):
+    trace = tracer.start_request('POST /x', None)
+    token = fds._current_trace.set(trace)
+    try:
+        for name, seconds in stages:
+            with fds.trace_span(name, stage=name) as span:
+                span.set_attribute('seen', True)
+                time.sleep(seconds)
+    finally:
+        fds._current_trace.reset(token)
+    tracer.finish_request(trace)
+    return trace
+
+
+def test_fast_unsampled_request_is_discarded_without_span_ids(tmp_path):
+    tracer = fds.Tracer(exporter='file', sample_rate=0.0, slow_threshold_ms=10_000,
+                        file_path=str(tmp_path / 'traces.jsonl'))
+    trace = run_request(tracer, [('decode', 0), ('detect', 0)])
+    assert tracer.get_stats()['discarded'] == 1
+    assert tracer.queue.empty()
+    assert [span.span_id for span in trace.spans[:2]] == [None, None]
+    assert all(span.attributes is None for span in trace.spans[:2])
+
+
+def test_slow_request_keeps_early_timings_and_later_detail(tmp_path):
+    tracer = fds.Tracer(exporter='file', sample_rate=0.0, slow_threshold_ms=30,
+                        file_path=str(tmp_path / 'traces.jsonl'))
+    run_request(tracer, [('decode', 0.05), ('detect', 0)])
+    assert tracer.get_stats()['kept_slow'] == 1
+
+    trace = tracer.queue.get_nowait()
+    spans = {span['name']: span for span in json.loads(tracer.encode([trace]))['resourceSpans'][0]
+             ['scopeSpans'][0]['spans']}
+    root = spans['POST /x']
+    assert {'key': 'evalon.trace.slow', 'value': {'boolValue': True}} in root['attributes']
+    assert spans['decode']['attributes'] == []  # Started before the threshold: timings only
+    assert {'key': 'stage', 'value': {'stringValue': 'detect'}} in spans['detect']['attributes']
+    assert spans['decode']['parentSpanId'] == spans['detect']['parentSpanId'] == root['spanId']
+    assert int(spans['decode']['endTimeUnixNano']) - int(spans['decode']['startTimeUnixNano']) >= 50_000_000
+
+
+def test_sampled_request_records_everything(tmp_path):
+    tracer = fds.Tracer(exporter='file', sample_rate=1.0, slow_threshold_ms=500,
+                        file_path=str(tmp_path / 'traces.jsonl'))
+    trace = run_request(tracer, [('decode', 0)])
+    assert tracer.get_stats()['kept_sampled'] == 1
+    assert trace.spans[0].attributes == {'stage': 'decode', 'seen': True}
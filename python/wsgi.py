@@ -0,0 +1,15 @@
+"""
+WSGI entry point for the Evalon AI service.
+
+    gunicorn -c gunicorn.conf.py          # uses wsgi:app
+    gunicorn wsgi:app                     # any other WSGI server / custom config
+
+Deployments that pointed at face_detection_service:app keep working by
+switching to wsgi:app. The module-level app is built with create_app();
+init_worker() still runs per worker (gunicorn.conf.py post_fork), or on
+the first request when the server has no post-fork hook.
+"""
+
+from face_detection_service import create_app
+
+app = create_app()